@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+"""Compare werkzeug rule matching with the RouteIndex.
+
+Register 10, 100 and 1000 parameterized resources and time matching the
+first, middle and last registered urls with and without `fast_routing`.
+
+    $ python benchmarks/bench_routing.py [repeat]
+"""
+from __future__ import print_function
+import sys
+import timeit
+from flask import Flask
+from werkzeug.test import create_environ
+from flask_resteasy import Api, Resource
+
+
+def make_app(count, fast_routing):
+    """App with `count` resources under an Api prefix."""
+    app = Flask(__name__, static_folder=None)
+    api = Api(app, prefix='/api', fast_routing=fast_routing)
+    for i in range(count):
+        class Item(Resource):
+            def get(self, item_id):
+                return item_id
+        api.add_resource(Item, '/items%d/<int:item_id>' % i,
+                         '/items%d/<int:item_id>/detail' % i,
+                         endpoint='item%d' % i)
+    return app
+
+
+def time_match(app, path, number):
+    """Seconds per match of `path` including adapter creation."""
+    request = app.request_class(create_environ(path))
+
+    def match():
+        app.create_url_adapter(request).match(return_rule=True)
+    match()
+    return min(timeit.repeat(match, number=number, repeat=3)) / number
+
+
+def main(number=2000):
+    print('{:>6} {:>8} {:>12} {:>12} {:>8}'.format(
+        'routes', 'target', 'werkzeug us', 'index us', 'speedup'))
+    for count in (10, 100, 1000):
+        apps = make_app(count, False), make_app(count, True)
+        for target in (0, count // 2, count - 1):
+            path = '/api/items%d/42/detail' % target
+            slow, fast = [time_match(_, path, number) for _ in apps]
+            print('{:>6} {:>8} {:>12.2f} {:>12.2f} {:>7.1f}x'.format(
+                count * 2, target, slow * 1e6, fast * 1e6, slow / fast))
+
+
+if __name__ == '__main__':
+    main(*[int(_) for _ in sys.argv[1:2]])
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""Compare a `default=` hook with the compiled Serializer.
+
+Encode lists of 10, 1000 and 10000 model objects, namedtuples and
+`__slots__` classes holding datetimes and Decimals, with flask's `dumps`.
+
+    $ python benchmarks/bench_serializer.py [repeat]
+"""
+from __future__ import print_function
+import datetime
+import sys
+import timeit
+from collections import namedtuple
+from decimal import Decimal
+from flask import Flask
+from flask.json import dumps
+from flask_resteasy import Serializer
+
+Row = namedtuple('Row', 'id name created price')
+
+
+class Item(object):
+    __slots__ = ('id', 'name', 'created', 'price')
+
+    def __init__(self, id, name, created, price):
+        self.id = id
+        self.name = name
+        self.created = created
+        self.price = price
+
+
+def default(obj):
+    """The usual hook, reflecting on each object."""
+    if isinstance(obj, (datetime.datetime, datetime.date)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if hasattr(obj, '_asdict'):
+        return obj._asdict()
+    if hasattr(obj, '__slots__'):
+        return dict((_, getattr(obj, _)) for _ in obj.__slots__)
+    raise TypeError(repr(obj))
+
+
+def make_data(cls, count):
+    now = datetime.datetime(2015, 1, 1)
+    return [cls(i, 'item %d' % i, now, Decimal('9.99')) for i in range(count)]
+
+
+def main(number=5):
+    app = Flask(__name__)
+    serialize = Serializer()
+    print('{:>10} {:>6} {:>12} {:>12} {:>8}'.format(
+        'class', 'count', 'default ms', 'compiled ms', 'speedup'))
+    with app.app_context():
+        for cls in (Row, Item):
+            for count in (10, 1000, 10000):
+                data = make_data(cls, count)
+                # namedtuples are tuples to the encoder, convert them first
+                hook = ((lambda: dumps([default(_) for _ in data], default=default))
+                        if cls is Row else (lambda: dumps(data, default=default)))
+                fast = lambda: dumps(serialize(data))
+                assert hook() == fast()
+                slow, quick = [min(timeit.repeat(_, number=number, repeat=3)) / number
+                               for _ in (hook, fast)]
+                print('{:>10} {:>6} {:>12.2f} {:>12.2f} {:>7.1f}x'.format(
+                    cls.__name__, count, slow * 1e3, quick * 1e3, slow / quick))
+
+
+if __name__ == '__main__':
+    main(*[int(_) for _ in sys.argv[1:2]])
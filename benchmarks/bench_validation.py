@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""Compare compiled schemas with ad hoc validation in the resource.
+
+Time the validator alone, then whole POST requests through the test client
+for a valid body and for an invalid one, which the compiled schema rejects
+before the resource is created.
+
+    $ python benchmarks/bench_validation.py [repeat]
+"""
+from __future__ import print_function
+import sys
+import timeit
+from flask import Flask, request
+from flask.json import dumps
+from flask_resteasy import Api, Resource, compile_schema
+
+ORDER = {
+    'type': 'object',
+    'required': ['customer', 'lines'],
+    'properties': {
+        'customer': {'type': 'string', 'minLength': 1},
+        'note': {'type': ['string', 'null'], 'maxLength': 200},
+        'lines': {'type': 'array', 'minItems': 1, 'maxItems': 100, 'items': {
+            'type': 'object',
+            'required': ['sku', 'qty'],
+            'properties': {'sku': {'type': 'string', 'pattern': '^[A-Z0-9-]+$'},
+                           'qty': {'type': 'integer', 'minimum': 1}},
+        }},
+    },
+}
+VALID = {'customer': 'c1', 'note': None,
+         'lines': [{'sku': 'SKU-%d' % i, 'qty': i + 1} for i in range(20)]}
+INVALID = dict(VALID, lines=VALID['lines'][:-1] + [{'sku': 'bad sku', 'qty': 0}])
+
+
+def adhoc(data):
+    """Validation as usually written by hand in a resource."""
+    import re
+    if not isinstance(data, dict):
+        return 'body must be object'
+    for name in ('customer', 'lines'):
+        if name not in data:
+            return '/%s is required' % name
+    if not isinstance(data['customer'], str) or not data['customer']:
+        return '/customer must be a string'
+    note = data.get('note')
+    if note is not None and (not isinstance(note, str) or len(note) > 200):
+        return '/note is invalid'
+    lines = data['lines']
+    if not isinstance(lines, list) or not 1 <= len(lines) <= 100:
+        return '/lines is invalid'
+    for i, line in enumerate(lines):
+        if not isinstance(line, dict) or 'sku' not in line or 'qty' not in line:
+            return '/lines/%d is invalid' % i
+        if not isinstance(line['sku'], str) or not re.search('^[A-Z0-9-]+$', line['sku']):
+            return '/lines/%d/sku is invalid' % i
+        if (not isinstance(line['qty'], int) or isinstance(line['qty'], bool)
+                or line['qty'] < 1):
+            return '/lines/%d/qty is invalid' % i
+
+
+def make_app():
+    app = Flask(__name__)
+    api = Api(app)
+
+    @api.resource('/compiled', schemas={'post': ORDER})
+    class Compiled(Resource):
+        def post(self):
+            return {'ok': True}, 201
+
+    @api.resource('/adhoc')
+    class AdHoc(Resource):
+        def post(self):
+            error = adhoc(request.get_json(force=True, silent=True))
+            if error is not None:
+                return {'error': error}, 400
+            return {'ok': True}, 201
+    return app
+
+
+def best(func, number):
+    return min(timeit.repeat(func, number=number, repeat=3)) / number
+
+
+def main(number=2000):
+    validate = compile_schema(ORDER)
+    assert validate(VALID) is None and adhoc(VALID) is None
+    assert validate(INVALID) and adhoc(INVALID)
+    client = make_app().test_client()
+    bodies = {'valid': dumps(VALID), 'invalid': dumps(INVALID)}
+    print('{:>22} {:>12} {:>12} {:>8}'.format('', 'ad hoc us', 'compiled us', 'speedup'))
+    for name, data in (('valid', VALID), ('invalid', INVALID)):
+        slow = best(lambda: adhoc(data), number)
+        fast = best(lambda: validate(data), number)
+        print('{:>22} {:>12.2f} {:>12.2f} {:>7.1f}x'.format(
+            'validator ' + name, slow * 1e6, fast * 1e6, slow / fast))
+    for name, body in sorted(bodies.items()):
+        slow = best(lambda: client.post('/adhoc', data=body), number // 10)
+        fast = best(lambda: client.post('/compiled', data=body), number // 10)
+        print('{:>22} {:>12.2f} {:>12.2f} {:>7.1f}x'.format(
+            'request ' + name, slow * 1e6, fast * 1e6, slow / fast))
+
+
+if __name__ == '__main__':
+    main(*[int(_) for _ in sys.argv[1:2]])
@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+"""Drive a sample flask_resteasy app with concurrent load.
+
+The sample app registers resources on an app level Api and on a blueprint
+Api, behind decorators, returning small to large payloads.  It is served
+by werkzeug in forked worker processes sharing one listening socket, each
+threaded or not, and loaded by client threads from this process.  Nothing
+beyond flask is needed and only the loopback interface is used.
+
+    $ python benchmarks/loadtest.py --workers 4 --concurrency 16 --duration 10
+    $ python benchmarks/loadtest.py --workers 1 --threads 8
+
+Reports requests per second, p50 and p99 latency per url and overall, and
+the resident memory of every worker from /proc after the run.
+"""
+from __future__ import print_function
+import argparse
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from functools import wraps
+from flask import Blueprint, Flask, g, request
+from flask.json import dumps
+from werkzeug.serving import make_server
+from flask_resteasy import Api, Resource, memoize
+try:
+    from http.client import HTTPConnection
+except ImportError:  # python2
+    from httplib import HTTPConnection
+
+WORKLOAD = [
+    # (weight, method, path, body)
+    (5, 'GET', '/api/ping', None),
+    (3, 'GET', '/api/items/7', None),
+    (2, 'GET', '/api/items?count=100', None),
+    (1, 'GET', '/api/items?count=2000', None),
+    (2, 'GET', '/v1/users/42', None),
+    (1, 'POST', '/v1/users', dumps({'name': 'load', 'tags': ['a'] * 20})),
+]
+
+
+@memoize
+def load_user(user_id):
+    """Stand in for a database lookup shared by decorator and resource."""
+    return {'id': user_id, 'name': 'user %s' % user_id}
+
+
+def authenticate(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        g.user = load_user(request.headers.get('X-User', '1'))
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def no_store(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        rv = func(*args, **kwargs)
+        rv.headers['Cache-Control'] = 'no-store'
+        return rv
+    return wrapper
+
+
+def make_app():
+    """The app under test, an app level and a blueprint Api."""
+    app = Flask(__name__)
+    api = Api(app, prefix='/api', decorators=[authenticate])
+
+    @api.resource('/ping')
+    class Ping(Resource):
+        def get(self):
+            return {'pong': True}
+
+    @api.resource('/items/<int:item_id>')
+    class Item(Resource):
+        def get(self, item_id):
+            return {'id': item_id, 'name': 'item %d' % item_id,
+                    'owner': g.user['id']}
+
+    @api.resource('/items')
+    class Items(Resource):
+        def get(self):
+            count = request.args.get('count', 10, type=int)
+            return [{'id': i, 'name': 'item %d' % i, 'price': i * 1.5,
+                     'tags': ['x', 'y']} for i in range(count)]
+
+    blueprint = Blueprint('v1', __name__)
+    bp_api = Api(blueprint, decorators=[authenticate, no_store])
+
+    @bp_api.resource('/users/<user_id>')
+    class User(Resource):
+        def get(self, user_id):
+            return load_user(user_id)
+
+    @bp_api.resource('/users')
+    class Users(Resource):
+        def post(self):
+            return request.get_json(force=True), 201
+
+    app.register_blueprint(blueprint, url_prefix='/v1')
+    return app
+
+
+def start_workers(workers, threads):
+    """Fork `workers` servers sharing a listening socket.
+
+    :return: (port, pids)
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(128)
+    port = sock.getsockname()[1]
+    app = make_app()
+    pids = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            server = make_server('127.0.0.1', port, app, threaded=threads > 1,
+                                 fd=sock.fileno())
+            server.RequestHandlerClass.log_request = lambda *args: None
+            try:
+                server.serve_forever()
+            finally:
+                os._exit(0)
+        pids.append(pid)
+    sock.close()
+    return port, pids
+
+
+def rss(pid):
+    """Resident memory in kB of `pid` from /proc, None elsewhere."""
+    try:
+        with open('/proc/%d/status' % pid) as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except (IOError, OSError):
+        return None
+
+
+def client(port, schedule, deadline, results, errors):
+    """Send requests from `schedule` in turn until `deadline`."""
+    headers = {'Content-Type': 'application/json', 'X-User': '7'}
+    i = 0
+    while time.time() < deadline:
+        method, path, body = schedule[i % len(schedule)]
+        i += 1
+        start = time.time()
+        try:
+            conn = HTTPConnection('127.0.0.1', port, timeout=30)
+            conn.request(method, path, body, headers)
+            response = conn.getresponse()
+            response.read()
+            conn.close()
+        except (IOError, OSError, socket.error):
+            errors.append(path)
+            continue
+        if response.status >= 400:
+            errors.append(path)
+        results.append((path, time.time() - start))
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(workers=2, threads=1, concurrency=8, duration=5.0):
+    """Load the sample app and print the report."""
+    port, pids = start_workers(workers, threads)
+    time.sleep(0.2)
+    schedule = [(method, path, body) for weight, method, path, body in WORKLOAD
+                for _ in range(weight)]
+    results, errors = [], []
+    deadline = time.time() + duration
+    clients = [threading.Thread(target=client, args=(
+        port, schedule[i:] + schedule[:i], deadline, results, errors))
+        for i in range(concurrency)]
+    started = time.time()
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.time() - started
+    memory = [(pid, rss(pid)) for pid in pids]
+    for pid in pids:
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+
+    print('{} workers x {} threads, {} clients, {:.1f}s'.format(
+        workers, threads, concurrency, elapsed))
+    print('{:<24} {:>8} {:>10} {:>10}'.format('url', 'requests', 'p50 ms', 'p99 ms'))
+    by_path = {}
+    for path, latency in results:
+        by_path.setdefault(path, []).append(latency)
+    by_path['all'] = [latency for path, latency in results]
+    for path in sorted(by_path, key=lambda _: (_ == 'all', _)):
+        latencies = sorted(by_path[path])
+        print('{:<24} {:>8} {:>10.2f} {:>10.2f}'.format(
+            path, len(latencies), percentile(latencies, 0.5) * 1e3,
+            percentile(latencies, 0.99) * 1e3))
+    print('throughput {:.0f} req/s, {} errors'.format(len(results) / elapsed,
+                                                   len(errors)))
+    for pid, kb in memory:
+        print('worker {} rss {}'.format(
+            pid, '%.1f MB' % (kb / 1024.0) if kb is not None else 'n/a'))
+    return len(results), len(errors)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--workers', type=int, default=2,
+                        help='forked server processes')
+    parser.add_argument('--threads', type=int, default=1,
+                        help='more than 1 serves each worker threaded')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='client threads')
+    parser.add_argument('--duration', type=float, default=5.0,
+                        help='seconds of load')
+    args = parser.parse_args(argv)
+    run(args.workers, args.threads, args.concurrency, args.duration)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
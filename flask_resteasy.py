@@ -3,9 +3,12 @@
 Specifically :class:`flask.views.MethodView` for use in creating JSON
 REST APIs. Other response types could also be create from ApiResponse.
 
-Unlike Flask-RESTful, this does not marshal values or validate input or
-catch and process error messages.  There are other existing tools that
-solve the problem better and Flask really is about flexibility.
+Marshalling, input validation and error handling are all opt-in: a
+:class:`Serializer` turns model objects into JSON values, request bodies
+are checked against JSON Schemas given as `schemas` (see
+:func:`compile_schema`), and ``Api(handle_errors=True)`` encodes HTTP
+errors as JSON.  Without them views return plain values, other tools can
+be used instead and Flask really is about flexibility.
 
 EXAMPLE
     from flask import Flask
@@ -26,14 +29,74 @@ EXAMPLE
         app.run(debug=True)
 """
 
-from types import MethodType
-from itertools import chain
+import io
+import os
+import sys
+import mmap
+import time
+import codecs
+import struct
+import zlib
+import hashlib
+import uuid
+import pstats
+import cProfile
+import marshal
+import logging
+import threading
+import random
+import re
+import datetime
+from decimal import Decimal
+from types import FunctionType, MethodType, ModuleType
+from itertools import chain, islice
 from functools import partial, wraps
+from collections import OrderedDict, deque, namedtuple
+from json import JSONDecoder, JSONEncoder
 import flask
-from flask.json import dumps
+from flask.json import dumps, loads
 from flask.views import MethodView as Resource
 from flask.helpers import _endpoint_from_view_func
+from werkzeug.exceptions import HTTPException, GatewayTimeout, MethodNotAllowed
+from werkzeug.http import HTTP_STATUS_CODES
+from werkzeug.routing import Rule, RoutingException
 from werkzeug.wrappers import Response as ResponseBase
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+try:
+    from urllib.request import Request, urlopen
+except ImportError:  # python2
+    from urllib2 import Request, urlopen
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+try:
+    import fcntl
+except ImportError:  # pragma: no cover  not POSIX, only threads are locked out
+    fcntl = None
+try:
+    import brotli
+except ImportError:  # optional, gzip only
+    brotli = None
+try:
+    import dataclasses
+except ImportError:  # pragma: no cover  before python 3.7
+    dataclasses = None
+try:
+    from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+except ImportError:  # pragma: no cover  python2 without futures
+    ThreadPoolExecutor = FutureTimeout = None
+try:
+    import asyncio
+    from inspect import iscoroutinefunction
+except ImportError:  # pragma: no cover  python2, no coroutine resources
+    asyncio = None
+
+    def iscoroutinefunction(func):
+        return False
 
 
 __version__ = "0.0.8"
@@ -62,6 +125,2054 @@ def unpack(rv):
     return rv, status, headers or {}
 
 
+_missing = object()
+_monotonic = getattr(time, 'monotonic', time.time)
+_perf_counter = getattr(time, 'perf_counter', time.time)
+_timing = threading.local()
+
+
+def _copy_context(func):
+    """Make `func` runnable in another thread with the current request.
+
+    Both the request context and the values stored on :data:`flask.g`
+    are carried over; the request body is read first as the original
+    request may be finished before `func` runs.
+    """
+    flask.request.get_data()
+    state = dict(flask.g.__dict__)
+
+    @flask.copy_current_request_context
+    def run(*args, **kwargs):
+        flask.g.__dict__.update(state)
+        return func(*args, **kwargs)
+
+    return run
+
+
+def _run_coroutine(coro, timeout=None):
+    """Run `coro` to completion in a new event loop.
+
+    With a `timeout` it is cancelled when the time is up and
+    :class:`asyncio.TimeoutError` is raised.
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        if timeout is not None:
+            coro = asyncio.wait_for(coro, timeout)
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def current_deadline():
+    """Return the deadline of the current request as epoch seconds or None.
+
+    Set from the resource's `timeout` and the :attr:`Api.deadline_header`.
+    Pass it on to the services a resource calls.
+    """
+    return getattr(flask.g, '_resteasy_deadline', None) if flask.g else None
+
+
+def deadline_remaining():
+    """Return the seconds left before the deadline or None without one."""
+    deadline = current_deadline()
+    return None if deadline is None else deadline - time.time()
+
+
+def check_deadline():
+    """Abort with 504 Gateway Timeout when the deadline has passed.
+
+    Call it between steps of long running work, the response of a timed
+    out request is already sent but the thread running it is only freed
+    when the resource returns.
+    """
+    remaining = deadline_remaining()
+    if remaining is not None and remaining <= 0:
+        raise GatewayTimeout()
+
+
+class LocalStore(object):
+    """Thread safe in-process key/value store with TTL eviction.
+
+    Entries expire `ttl` seconds after they are set and the least recently
+    used entries are dropped once there are more than `maxsize`, or once
+    their values take more than `maxbytes`.  Anything with the same `get`,
+    `set` and `delete` methods can be used instead.
+    """
+
+    def __init__(self, ttl=300, maxsize=1024, maxbytes=None):
+        """Create the store.
+
+        :param ttl: default seconds an entry lives
+        :type ttl: float
+        :param maxsize: maximum number of entries kept
+        :type maxsize: int
+        :param maxbytes: maximum total length of the values kept, which
+            must then be bytes
+        :type maxbytes: int
+        """
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.nbytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def _pop(self, key):
+        """Remove `key` and return its (expires, value), under the lock."""
+        entry = self._data.pop(key)
+        if self.maxbytes is not None:
+            self.nbytes -= len(entry[1])
+        return entry
+
+    def get(self, key, default=None):
+        """Return the value for `key` or `default` if missing or expired."""
+        with self._lock:
+            try:
+                expires, value = self._data.pop(key)
+            except KeyError:
+                return default
+            if expires < _monotonic():
+                if self.maxbytes is not None:
+                    self.nbytes -= len(value)
+                return default
+            self._data[key] = (expires, value)
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store `value` under `key` for `ttl` seconds, default `self.ttl`."""
+        expires = _monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            self._data[key] = (expires, value)
+            if self.maxbytes is not None:
+                self.nbytes += len(value)
+            while self._data and (len(self._data) > self.maxsize or (
+                    self.maxbytes is not None and self.nbytes > self.maxbytes)):
+                self._pop(next(iter(self._data)))
+
+    def delete(self, key):
+        """Remove `key` from the store."""
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+
+    def items(self):
+        """Return a list of the (key, value) pairs not yet expired."""
+        now = _monotonic()
+        with self._lock:
+            return [(k, v) for k, (expires, v) in self._data.items()
+                    if expires >= now]
+
+
+class MMapStore(object):
+    """Key/value store in a memory mapped file shared by processes.
+
+    Every worker on a host opening the same `path` shares the entries, so
+    a response cached by one worker is a hit for all of them.  The file
+    holds a fixed number of slots of `slot_size` bytes grouped in sets of
+    `ways`; a key hashes to one set and replaces the expired or least
+    recently used slot of it.  Values larger than a slot are not stored.
+
+    Writers lock the slot's set with :func:`fcntl.lockf` across processes
+    and a sequence counter around each write lets readers detect and skip
+    torn reads without locking.  A hit is served with a single copy out
+    of the map.  Bytes are stored as is, and so are the bodies of the
+    `(status, headers, body)` entries of a response cache, after their
+    status and header lines.  Other values are pickled.
+    """
+
+    magic = b'RESTEASY'
+    header = struct.Struct('<8sIII')
+    slot_header = struct.Struct('<QQddIIB')
+    response_header = struct.Struct('<HI')
+    slot_offset = 64
+
+    def __init__(self, path, slots=4096, slot_size=16384, ways=4, ttl=300):
+        """Open or create the shared file.
+
+        :param path: file name, all workers must use the same
+        :param slots: number of entries, a multiple of `ways`
+        :param slot_size: bytes per entry including key and header
+        :param ways: slots a key may use, more means better eviction
+            choices but slower misses
+        :param ttl: default seconds an entry lives
+        """
+        if slots % ways:
+            raise ValueError('slots must be a multiple of ways')
+        self.path = path
+        self.slots = slots
+        self.slot_size = slot_size
+        self.ways = ways
+        self.ttl = ttl
+        self.sets = slots // ways
+        self.size = self.slot_offset + slots * slot_size
+        self._lock = threading.Lock()
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            self._flock(fd, 0, 0, True)
+            try:
+                self._init_file(fd)
+                self.map = mmap.mmap(fd, self.size)
+            finally:
+                self._flock(fd, 0, 0, False)
+        except Exception:
+            os.close(fd)
+            raise
+        self.fd = fd
+
+    def _init_file(self, fd):
+        """Size a new file or check an existing one has our layout."""
+        expected = self.header.pack(self.magic, self.slots, self.slot_size,
+                                    self.ways)
+        os.lseek(fd, 0, os.SEEK_SET)
+        if os.fstat(fd).st_size == 0:
+            os.ftruncate(fd, self.size)
+            os.write(fd, expected)
+        elif os.read(fd, self.header.size) != expected:
+            raise ValueError('{} has a different layout.'.format(self.path))
+
+    @staticmethod
+    def _flock(fd, offset, length, lock):
+        """Lock or unlock a byte range of the file across processes."""
+        if fcntl is not None:
+            fcntl.lockf(fd, fcntl.LOCK_EX if lock else fcntl.LOCK_UN,
+                        length, offset)
+
+    def close(self):
+        """Unmap and close the file."""
+        self.map.close()
+        os.close(self.fd)
+
+    @staticmethod
+    def _hash(key):
+        """Hash of the key bytes, the same in every process."""
+        return struct.unpack('<Q', hashlib.md5(key).digest()[:8])[0] or 1
+
+    def _set_slots(self, key_hash):
+        """Offsets of the slots in the set of `key_hash`."""
+        first = (key_hash % self.sets) * self.ways
+        return [self.slot_offset + (first + _) * self.slot_size
+                for _ in range(self.ways)]
+
+    def _read(self, offset, key=None):
+        """Return the `(header, key, value bytes)` at `offset` or None.
+
+        The slot's sequence number must be even and unchanged after the
+        copy, otherwise a writer was busy with it.
+        """
+        for _ in range(3):
+            header = self.slot_header.unpack_from(self.map, offset)
+            seq, key_hash, expires, used, key_len, value_len, flags = header
+            if seq & 1:
+                continue
+            if key_len == 0:
+                return None
+            start = offset + self.slot_header.size
+            found = self.map[start:start + key_len]
+            if key is not None and found != key:
+                return None
+            start += key_len
+            end = start + value_len
+            if flags == 2:
+                status, size = self.response_header.unpack_from(self.map, start)
+                start += self.response_header.size
+                value = (status, self.map[start:start + size], self.map[start + size:end])
+            else:
+                value = self.map[start:end]
+            if self.slot_header.unpack_from(self.map, offset)[0] == seq:
+                return header, found, value
+        return None
+
+    def get(self, key, default=None):
+        """Return the value for `key` or `default` if missing or expired."""
+        key = key.encode('utf-8')
+        key_hash = self._hash(key)
+        now = time.time()
+        for offset in self._set_slots(key_hash):
+            if struct.unpack_from('<Q', self.map, offset + 8)[0] != key_hash:
+                continue
+            found = self._read(offset, key)
+            if found is None:
+                continue
+            header, key, value = found
+            if header[2] < now:
+                return default
+            # Racy by design, the access time only guides eviction
+            struct.pack_into('<d', self.map, offset + 24, now)
+            return self._load(header[6], value)
+        return default
+
+    def _dump(self, value):
+        """Return the bytes stored for `value` and their flags."""
+        if isinstance(value, bytes):
+            return value, 0
+        if (isinstance(value, tuple) and len(value) == 3 and isinstance(value[2], bytes)
+                and isinstance(value[0], int)):
+            status, headers, body = value
+            try:
+                lines = '\n'.join('%s\0%s' % _ for _ in headers).encode('latin-1')
+            except UnicodeError:
+                pass
+            else:
+                return self.response_header.pack(status, len(lines)) + lines + body, 2
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL), 1
+
+    @staticmethod
+    def _load(flags, value):
+        """Return the value stored as `value` with `flags`."""
+        if flags == 0:
+            return value
+        if flags == 2:
+            status, lines, body = value
+            headers = [tuple(_.split('\0', 1)) for _ in lines.decode('latin-1').split('\n')]
+            return status, headers if lines else [], body
+        return pickle.loads(value)
+
+    def set(self, key, value, ttl=None):
+        """Store `value` under `key` for `ttl` seconds, default `self.ttl`.
+
+        :return: False if the value is too large for a slot
+        """
+        key = key.encode('utf-8')
+        value, flags = self._dump(value)
+        if self.slot_header.size + len(key) + len(value) > self.slot_size:
+            return False
+        key_hash = self._hash(key)
+        now = time.time()
+        expires = now + (self.ttl if ttl is None else ttl)
+        slots = self._set_slots(key_hash)
+        with self._lock:
+            self._flock(self.fd, slots[0], self.ways * self.slot_size, True)
+            try:
+                offset = self._victim(slots, key_hash, key, now)
+                seq = struct.unpack_from('<Q', self.map, offset)[0]
+                struct.pack_into('<Q', self.map, offset, seq | 1)
+                start = offset + self.slot_header.size
+                self.map[start:start + len(key) + len(value)] = key + value
+                self.slot_header.pack_into(self.map, offset, seq | 1,
+                                           key_hash, expires, now, len(key),
+                                           len(value), flags)
+                struct.pack_into('<Q', self.map, offset, (seq | 1) + 1)
+            finally:
+                self._flock(self.fd, slots[0], self.ways * self.slot_size, False)
+        return True
+
+    def _victim(self, slots, key_hash, key, now):
+        """Slot for `key`: its own, an empty or expired one, else the LRU."""
+        best, best_used = None, None
+        for offset in slots:
+            header = self.slot_header.unpack_from(self.map, offset)
+            if header[4] == 0 or header[2] < now:
+                used = -1.0
+            elif header[1] == key_hash and self._read(offset, key) is not None:
+                return offset
+            else:
+                used = header[3]
+            if best is None or used < best_used:
+                best, best_used = offset, used
+        return best
+
+    def delete(self, key):
+        """Remove `key` from the store."""
+        key = key.encode('utf-8')
+        key_hash = self._hash(key)
+        slots = self._set_slots(key_hash)
+        with self._lock:
+            self._flock(self.fd, slots[0], self.ways * self.slot_size, True)
+            try:
+                for offset in slots:
+                    header = self.slot_header.unpack_from(self.map, offset)
+                    if header[1] == key_hash and self._read(offset, key):
+                        self.slot_header.pack_into(self.map, offset,
+                                                   header[0] | 1,
+                                                   0, 0.0, 0.0, 0, 0, 0)
+                        struct.pack_into('<Q', self.map, offset,
+                                         (header[0] | 1) + 1)
+            finally:
+                self._flock(self.fd, slots[0], self.ways * self.slot_size, False)
+
+    def items(self):
+        """Return a list of the (key, value) pairs not yet expired."""
+        now, found = time.time(), []
+        for index in range(self.slots):
+            entry = self._read(self.slot_offset + index * self.slot_size)
+            if entry is not None and entry[0][2] >= now:
+                header, key, value = entry
+                found.append((key.decode('utf-8'), self._load(header[6], value)))
+        return found
+
+    def __len__(self):
+        return len(self.items())
+
+
+JOB_PENDING, JOB_DONE, JOB_FAILED = 'pending', 'done', 'failed'
+
+
+class _KeyLocks(object):
+    """A lock per key, kept only while it is held or waited for."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks = {}
+
+    def acquire(self, key):
+        with self._lock:
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+        entry[0].acquire()
+        return entry
+
+    def release(self, key, entry):
+        entry[0].release()
+        with self._lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+
+def _pointer(path, key):
+    """Extend a JSON Pointer with `key`."""
+    return '%s/%s' % (path, str(key).replace('~', '~0').replace('/', '~1'))
+
+
+def json_patch(old, new, path=''):
+    """Return the RFC 6902 JSON Patch turning `old` into `new`.
+
+    Objects are compared key by key and arrays item by item after their
+    common head and tail, anything else is replaced.
+
+    :param old: decoded JSON document
+    :param new: decoded JSON document
+    :return: list of operations
+    """
+    if type(old) is not type(new) or not isinstance(old, (dict, list)):
+        if old == new and type(old) is type(new):
+            return []
+        return [{'op': 'replace', 'path': path, 'value': new}]
+    ops = []
+    if isinstance(old, dict):
+        for key in old:
+            if key not in new:
+                ops.append({'op': 'remove', 'path': _pointer(path, key)})
+        for key, value in new.items():
+            if key in old:
+                ops.extend(json_patch(old[key], value, _pointer(path, key)))
+            else:
+                ops.append({'op': 'add', 'path': _pointer(path, key), 'value': value})
+        return ops
+    head = 0
+    while head < min(len(old), len(new)) and old[head] == new[head]:
+        head += 1
+    tail = 0
+    while (tail < min(len(old), len(new)) - head and
+           old[-1 - tail] == new[-1 - tail]):
+        tail += 1
+    old_middle = len(old) - head - tail
+    new_middle = len(new) - head - tail
+    for i in range(head, head + min(old_middle, new_middle)):
+        ops.extend(json_patch(old[i], new[i], _pointer(path, i)))
+    if old_middle > new_middle:
+        for i in reversed(range(head + new_middle, head + old_middle)):
+            ops.append({'op': 'remove', 'path': _pointer(path, i)})
+    for i in range(head + old_middle, head + new_middle):
+        ops.append({'op': 'add', 'path': _pointer(path, i), 'value': new[i]})
+    return ops
+
+
+class JobStatus(Resource):
+    """Report on a deferred job, see :meth:`Api.add_resource`.
+
+    A subclass bound to an :class:`Api` is registered automatically
+    the first time a resource with `deferred` methods is added.
+    """
+
+    api = None
+
+    def get(self, job_id):
+        job = self.api.jobs.get(job_id)
+        if job is None:
+            return {'job': job_id, 'status': 'unknown'}, 404
+        state, rv = job
+        if state == JOB_PENDING:
+            return {'job': job_id, 'status': state}, 202, {'Retry-After': '1'}
+        if state == JOB_FAILED:
+            return {'job': job_id, 'status': state, 'error': rv}, 500
+        return rv
+
+
+class OpenAPISpec(Resource):
+    """Serve the OpenAPI document of an :class:`Api`, see `openapi_url`.
+
+    The document is encoded once and sent with an ETag.
+    """
+
+    api = None
+
+    def get(self):
+        body, etag = self.api.openapi_body()
+        if etag in flask.request.if_none_match:
+            rv = flask.current_app.response_class(status=304)
+        else:
+            rv = flask.current_app.response_class(
+                body, 200, {'Content-Type': 'application/json'})
+        rv.set_etag(etag)
+        return rv
+
+
+_RULE_VARIABLE = re.compile(r'<(?:(\w+)(?:\((.*?)\))?:)?(\w+)>')
+_OPENAPI_TYPES = {
+    'int': {'type': 'integer'},
+    'float': {'type': 'number'},
+    'uuid': {'type': 'string', 'format': 'uuid'},
+}
+
+
+def _openapi_path(rule):
+    """Return the OpenAPI path and parameters of a werkzeug url rule."""
+    parameters = []
+
+    def variable(match):
+        converter, arguments, name = match.groups()
+        schema = dict(_OPENAPI_TYPES.get(converter, {'type': 'string'}))
+        if converter == 'any':
+            schema['enum'] = [_.strip().strip('\'"') for _ in arguments.split(',')]
+        parameters.append({'name': name, 'in': 'path', 'required': True,
+                           'schema': schema})
+        return '{%s}' % name
+
+    return _RULE_VARIABLE.sub(variable, rule), parameters
+
+
+_STRING_TYPES = tuple(set((str, type(u''))))
+_NUMBER_TYPES = frozenset((int, type(2 ** 64), float))
+_SCHEMA_TYPES = {
+    'object': 'isinstance(%s, dict)',
+    'array': 'isinstance(%s, list)',
+    'string': 'isinstance(%s, strings)',
+    'integer': '%s.__class__ in integers',
+    'number': '%s.__class__ in numbers',
+    'boolean': '%s.__class__ is bool',
+    'null': '%s is None',
+}
+_SCHEMA_BOUNDS = {
+    'minimum': ('%s.__class__ in numbers and %s < %r', 'at least %s'),
+    'maximum': ('%s.__class__ in numbers and %s > %r', 'at most %s'),
+    'minLength': ('isinstance(%s, strings) and len(%s) < %r', 'at least %s characters'),
+    'maxLength': ('isinstance(%s, strings) and len(%s) > %r', 'at most %s characters'),
+    'minItems': ('isinstance(%s, list) and len(%s) < %r', 'at least %s items'),
+    'maxItems': ('isinstance(%s, list) and len(%s) > %r', 'at most %s items'),
+}
+_SCHEMA_KEYWORDS = frozenset(['type', 'enum', 'properties', 'required',
+                              'additionalProperties', 'items', 'pattern',
+                              'title', 'description', 'default']) | frozenset(_SCHEMA_BOUNDS)
+
+
+class _SchemaCompiler(object):
+    """Generate the source of a validator function, see :func:`compile_schema`."""
+
+    def __init__(self):
+        self.lines = ['def validate(v0):']
+        self.namespace = {'strings': _STRING_TYPES, 'numbers': _NUMBER_TYPES,
+                          'integers': _NUMBER_TYPES - set([float])}
+        self.count = 0
+
+    def name(self, prefix):
+        self.count += 1
+        return '%s%d' % (prefix, self.count)
+
+    def constant(self, value):
+        name = self.name('c')
+        self.namespace[name] = value
+        return name
+
+    def fail(self, indent, path, message):
+        if path == "''":
+            self.lines.append(indent + 'return %r' % ('body ' + message))
+        else:
+            self.lines.append(indent + 'return %s + %r' % (path, ' ' + message))
+
+    def node(self, schema, var, path, indent):
+        """Add the checks of `schema` for the value in `var`.
+
+        `path` is an expression of the value's JSON Pointer, only
+        evaluated when reporting an error.
+        """
+        unknown = set(schema) - _SCHEMA_KEYWORDS
+        if unknown:
+            raise ValueError('Unsupported schema keywords: %s' % ', '.join(sorted(unknown)))
+        if not isinstance(schema.get('additionalProperties', True), bool):
+            raise ValueError('additionalProperties must be a boolean')
+        lines = self.lines
+        if 'type' in schema:
+            names = schema['type'] if isinstance(schema['type'], list) else [schema['type']]
+            unknown = [_ for _ in names if _ not in _SCHEMA_TYPES]
+            if unknown:
+                raise ValueError('Unsupported schema types: %s' % ', '.join(unknown))
+            test = ' or '.join(_SCHEMA_TYPES[_] % var for _ in names)
+            lines.append(indent + 'if not (%s):' % test)
+            self.fail(indent + '    ', path, 'must be ' + ' or '.join(names))
+        if 'enum' in schema:
+            lines.append(indent + 'if %s not in %s:' % (var, self.constant(list(schema['enum']))))
+            self.fail(indent + '    ', path, 'must be one of ' + dumps(list(schema['enum'])))
+        for key in sorted(_SCHEMA_BOUNDS):
+            if key in schema:
+                test, message = _SCHEMA_BOUNDS[key]
+                lines.append(indent + 'if ' + test % (var, var, schema[key]) + ':')
+                self.fail(indent + '    ', path, 'must be ' + message % schema[key])
+        if 'pattern' in schema:
+            search = self.constant(re.compile(schema['pattern']).search)
+            lines.append(indent + 'if isinstance(%s, strings) and not %s(%s):'
+                         % (var, search, var))
+            self.fail(indent + '    ', path, 'must match ' + schema['pattern'])
+        properties = schema.get('properties', {})
+        closed = schema.get('additionalProperties') is False
+        if properties or schema.get('required') or closed:
+            lines.append(indent + 'if isinstance(%s, dict):' % var)
+            inner = indent + '    '
+            for name in schema.get('required', ()):
+                lines.append(inner + 'if %r not in %s:' % (name, var))
+                self.fail(inner + '    ', '%s + %r' % (path, _pointer('', name)),
+                          'is required')
+            for name in sorted(properties):
+                value = self.name('v')
+                lines.append(inner + 'if %r in %s:' % (name, var))
+                lines.append(inner + '    %s = %s[%r]' % (value, var, name))
+                self.node(properties[name], value, '%s + %r' % (path, _pointer('', name)),
+                          inner + '    ')
+            if closed:
+                key = self.name('k')
+                lines.append(inner + 'for %s in %s:' % (key, var))
+                lines.append(inner + '    if %s not in %s:' % (key, self.constant(frozenset(properties))))
+                self.fail(inner + '        ', "%s + '/' + %s" % (path, key), 'is not allowed')
+        if 'items' in schema:
+            index, item = self.name('i'), self.name('v')
+            lines.append(indent + 'if isinstance(%s, list):' % var)
+            lines.append(indent + '    for %s, %s in enumerate(%s):' % (index, item, var))
+            start = len(lines)
+            self.node(schema['items'], item, "%s + '/' + str(%s)" % (path, index),
+                      indent + '        ')
+            if len(lines) == start:
+                lines.append(indent + '        pass')
+
+
+def compile_schema(schema):
+    """Compile a JSON Schema into a validator function.
+
+    The validator takes a decoded JSON value and returns None when it is
+    valid or the first error as a message.  The checks are generated as
+    the source of one function, so validating costs no more than checks
+    written by hand.  Supported keywords: `type`, `enum`, `properties`,
+    `required`, `additionalProperties` as a boolean, `items`, `minimum`,
+    `maximum`, `minLength`, `maxLength`, `pattern`, `minItems` and
+    `maxItems`.  Others raise ValueError, so a schema is never silently
+    half checked.
+
+    :param schema: the schema as a dict
+    :return: function(value)
+    """
+    compiler = _SchemaCompiler()
+    compiler.node(schema, 'v0', "''", '    ')
+    compiler.lines.append('    return None')
+    code = compile('\n'.join(compiler.lines), '<schema>', 'exec')
+    exec(code, compiler.namespace)
+    return compiler.namespace['validate']
+
+
+class RouteIndex(object):
+    """Prefix tree over the url rules of a :class:`flask.Flask` app.
+
+    Each rule is filed under the complete path segments leading up to its
+    first variable part, so matching a path only tries the rules found
+    while walking its segments instead of every rule in the map.  Only
+    paths under one of `prefixes` use the tree.  Anything unusual, such as
+    redirects or method mismatches, falls back to werkzeug.
+    """
+
+    extension = 'resteasy.routes'
+
+    def __init__(self, url_map):
+        """Create an index for `url_map`.
+
+        :param url_map: :attr:`flask.Flask.url_map`
+        :type url_map: :class:`werkzeug.routing.Map`
+        """
+        self.url_map = url_map
+        self.prefixes = set()
+        self._size = -1
+        self._root = None
+
+    @classmethod
+    def install(cls, app):
+        """Return the index for `app`, creating and hooking it up once.
+
+        The app's :meth:`~flask.Flask.create_url_adapter` is wrapped so
+        request matching goes through :meth:`match`.
+        """
+        index = app.extensions.get(cls.extension)
+        if index is None:
+            index = app.extensions[cls.extension] = cls(app.url_map)
+            create_url_adapter = app.create_url_adapter
+
+            def indexed_url_adapter(request):
+                adapter = create_url_adapter(request)
+                if request is None or adapter is None:
+                    return adapter
+                return _IndexedAdapter(adapter, index)
+
+            app.create_url_adapter = indexed_url_adapter
+        return index
+
+    @staticmethod
+    def _segments(rule):
+        """Complete static path segments before the first variable."""
+        trace = rule._trace
+        static = []
+        for is_dynamic, data in trace[trace.index((False, '|')) + 1:]:
+            if is_dynamic:
+                break
+            static.append(data)
+        return ''.join(static).split('/')[:-1]
+
+    def build(self):
+        """Rebuild the tree from the rules currently in the map."""
+        self.url_map.update()
+        rules = self.url_map._rules
+        root = ({}, [])
+        for order, rule in enumerate(rules):
+            node = root
+            for segment in self._segments(rule):
+                node = node[0].setdefault(segment, ({}, []))
+            node[1].append((order, rule))
+        self._root = root
+        self._size = len(rules)
+
+    def candidates(self, path):
+        """Rules that may match `path` in url map order."""
+        if self._size != len(self.url_map._rules):
+            self.build()
+        node = self._root
+        groups = [node[1]] if node[1] else []
+        for segment in path.split('/'):
+            node = node[0].get(segment)
+            if node is None:
+                break
+            if node[1]:
+                groups.append(node[1])
+        if len(groups) == 1:
+            return [rule for order, rule in groups[0]]
+        found = sorted(chain.from_iterable(groups), key=lambda _: _[0])
+        return [rule for order, rule in found]
+
+    def match(self, adapter, path_info=None, method=None, query_args=None):
+        """Find the `(rule, values)` for a request or None for fallback.
+
+        :param adapter: the werkzeug adapter bound to the request
+        :type adapter: :class:`werkzeug.routing.MapAdapter`
+        """
+        if self.url_map.host_matching:
+            return None
+        path = '/' + (adapter.path_info if path_info is None
+                      else path_info).lstrip('/')
+        for prefix in self.prefixes:
+            if path.startswith(prefix):
+                break
+        else:
+            return None
+        method = (method or adapter.default_method).upper()
+        query_args = adapter.query_args if query_args is None else query_args
+        full_path = u'%s|%s' % (adapter.subdomain, path)
+        for rule in self.candidates(path):
+            try:
+                rv = rule.match(full_path, method)
+            except RoutingException:
+                return None
+            if rv is None:
+                continue
+            if rule.methods is not None and method not in rule.methods:
+                continue
+            if rule.redirect_to is not None:
+                return None
+            if self.url_map.redirect_defaults and adapter.get_default_redirect(
+                    rule, method, rv, query_args) is not None:
+                return None
+            return rule, rv
+        return None
+
+
+class _IndexedAdapter(object):
+    """Url adapter proxy matching through a :class:`RouteIndex` first."""
+
+    def __init__(self, adapter, index):
+        self._adapter = adapter
+        self._index = index
+
+    def __getattr__(self, name):
+        return getattr(self._adapter, name)
+
+    def match(self, path_info=None, method=None, return_rule=False,
+              query_args=None):
+        found = self._index.match(self._adapter, path_info, method, query_args)
+        if found is None:
+            return self._adapter.match(path_info, method, return_rule,
+                                       query_args)
+        rule, rv = found
+        return (rule if return_rule else rule.endpoint), rv
+
+
+def _collapse(frame):
+    """Collapsed stack for a frame, root first, in flamegraph format."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append('{} ({}:{})'.format(code.co_name, code.co_filename,
+                                         code.co_firstlineno))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class _StackSampler(object):
+    """Periodically record the stacks of threads that asked for it."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = os.getpid()
+
+    def start(self, counts):
+        """Record the current thread's stacks into the `counts` dict."""
+        if self._pid != os.getpid():
+            # forked, the parent's threads and the sampler are gone
+            self._lock = threading.Lock()
+            self._active = {}
+            self._thread = None
+            self._pid = os.getpid()
+        with self._lock:
+            self._active[threading.current_thread().ident] = counts
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run,
+                                                name='resteasy-sampler')
+                self._thread.daemon = True
+                self._thread.start()
+
+    def stop(self):
+        """Stop recording the current thread."""
+        with self._lock:
+            self._active.pop(threading.current_thread().ident, None)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                active = list(self._active.items())
+            frames = sys._current_frames()
+            for ident, counts in active:
+                frame = frames.get(ident)
+                if frame is not None:
+                    stack = _collapse(frame)
+                    counts[stack] = counts.get(stack, 0) + 1
+            del frames
+            time.sleep(self.interval)
+
+
+class Profiler(object):
+    """Sampled profiling of selected endpoints.
+
+    Profiling is switched on and off per endpoint at runtime with
+    :meth:`enable` and :meth:`disable`.  One in every `every` requests is
+    run with :mod:`cProfile` or, for mode 'sample', watched by a stack
+    sampler.  Results are aggregated in memory per endpoint and can be
+    exposed by registering :meth:`resource` on an :class:`Api`.
+    """
+
+    modes = ('cprofile', 'sample')
+
+    def __init__(self, interval=0.005):
+        """Create the profiler.
+
+        :param interval: seconds between stack samples
+        :type interval: float
+        """
+        self.targets = {}
+        self.stats = {}
+        self.stacks = {}
+        self._sampler = _StackSampler(interval)
+        self._lock = threading.Lock()
+        self._profiling = threading.Lock()
+
+    def enable(self, endpoint, every=1, mode='cprofile'):
+        """Profile one in `every` requests to `endpoint`.
+
+        :param endpoint: the resource endpoint
+        :param every: sampling rate, 1 profiles every request
+        :param mode: 'cprofile' or 'sample'
+        """
+        if mode not in self.modes:
+            raise ValueError('Unknown profiling mode {!r}.'.format(mode))
+        every = int(every)
+        if every < 1:
+            raise ValueError('Profile one in every 1 or more requests.')
+        self.targets[endpoint] = [every, mode, 0, 0]
+
+    def disable(self, endpoint):
+        """Stop profiling `endpoint`, keeping what was collected."""
+        self.targets.pop(endpoint, None)
+
+    def clear(self, endpoint):
+        """Drop everything collected for `endpoint`."""
+        with self._lock:
+            self.stats.pop(endpoint, None)
+            self.stacks.pop(endpoint, None)
+
+    def status(self):
+        """Return the sampling settings and sample count per endpoint."""
+        return dict((endpoint, {'every': every, 'mode': mode, 'seen': seen,
+                                'samples': samples})
+                    for endpoint, (every, mode, seen, samples)
+                    in self.targets.items())
+
+    def call(self, endpoint, func, args=(), kwargs=None):
+        """Call `func(*args, **kwargs)`, profiled if this call is sampled."""
+        kwargs = kwargs or {}
+        target = self.targets.get(endpoint)
+        if target is None:
+            return func(*args, **kwargs)
+        with self._lock:
+            target[2] += 1
+            sampled = not target[2] % target[0]
+            if sampled and target[1] == 'sample':
+                target[3] += 1
+        if not sampled:
+            return func(*args, **kwargs)
+        if target[1] == 'sample':
+            return self._sample(endpoint, func, args, kwargs)
+        return self._profile(endpoint, target, func, args, kwargs)
+
+    def _profile(self, endpoint, target, func, args, kwargs):
+        """Run `func` with cProfile, or plainly while another run is active.
+
+        Only one cProfile may be active per process since python 3.12, so
+        concurrent sampled calls are not profiled rather than failing.
+        """
+        if not self._profiling.acquire(False):
+            return func(*args, **kwargs)
+        try:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:  # another profiling tool is active
+                return func(*args, **kwargs)
+            with self._lock:
+                target[3] += 1
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+                stats = pstats.Stats(profile)
+                with self._lock:
+                    if endpoint in self.stats:
+                        self.stats[endpoint].add(stats)
+                    else:
+                        self.stats[endpoint] = stats
+        finally:
+            self._profiling.release()
+
+    def _sample(self, endpoint, func, args, kwargs):
+        counts = {}
+        self._sampler.start(counts)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self._sampler.stop()
+            with self._lock:
+                stacks = self.stacks.setdefault(endpoint, {})
+                for stack, count in counts.items():
+                    stacks[stack] = stacks.get(stack, 0) + count
+
+    def dump(self, endpoint):
+        """Return the stats as :meth:`pstats.Stats.dump_stats` writes them."""
+        with self._lock:
+            stats = self.stats.get(endpoint)
+            return marshal.dumps(stats.stats if stats else {})
+
+    def text(self, endpoint, sort='cumulative', limit=40):
+        """Return the printed stats of `endpoint`."""
+        stream = StringIO()
+        with self._lock:
+            stats = self.stats.get(endpoint)
+            if stats is not None:
+                stats.stream = stream
+                stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def collapsed(self, endpoint):
+        """Return the sampled stacks of `endpoint` for flamegraph tools."""
+        with self._lock:
+            stacks = sorted(self.stacks.get(endpoint, {}).items())
+        return ''.join('{} {}\n'.format(*_) for _ in stacks)
+
+    def resource(self):
+        """Return an admin :class:`ProfilerResource` bound to this profiler.
+
+        Register it on an api, protected as needed, e.g.::
+
+            api.add_resource(api.profiler.resource(), '/_profile',
+                             '/_profile/<endpoint>', decorators=[admin])
+        """
+        return type('ProfilerResource', (ProfilerResource,), {'profiler': self})
+
+
+class ProfilerResource(Resource):
+    """Control a :class:`Profiler` and fetch its results.
+
+    GET without an endpoint lists what is profiled.  GET with an endpoint
+    returns the results, with `?format=` 'text' (default), 'pstats' or
+    'collapsed'.  PUT with a JSON body of `every` and `mode` enables
+    profiling and DELETE disables it and drops the results.
+    """
+
+    profiler = None
+    formats = {
+        'text': ('text', 'text/plain'),
+        'pstats': ('dump', 'application/octet-stream'),
+        'collapsed': ('collapsed', 'text/plain'),
+    }
+
+    def get(self, endpoint=None):
+        if endpoint is None:
+            return self.profiler.status()
+        fmt = flask.request.args.get('format', 'text')
+        if fmt not in self.formats:
+            return {'error': 'Unknown format {!r}.'.format(fmt)}, 400
+        method, mimetype = self.formats[fmt]
+        body = getattr(self.profiler, method)(endpoint)
+        return flask.Response(body, mimetype=mimetype)
+
+    def put(self, endpoint=None):
+        if endpoint is None:
+            return {'error': 'Which endpoint to profile?'}, 400
+        settings = flask.request.get_json(force=True, silent=True) or {}
+        try:
+            self.profiler.enable(endpoint, settings.get('every', 1),
+                                 settings.get('mode', 'cprofile'))
+        except (TypeError, ValueError) as err:
+            return {'error': str(err)}, 400
+        return self.profiler.status()[endpoint]
+
+    def delete(self, endpoint=None):
+        self.profiler.disable(endpoint)
+        self.profiler.clear(endpoint)
+        return flask.Response(status=204)
+
+
+class CachePolicy(object):
+    """HTTP caching headers for successful responses.
+
+    The `Cache-Control` and `Vary` values are built once.  They are added
+    by :meth:`ApiResponse.apply_cache_policy` to 2xx responses which do
+    not already have a `Cache-Control` header, so a view can still set
+    its own through the headers it returns or with :func:`set_cache_policy`.
+
+    >>> CachePolicy(max_age=60, stale_while_revalidate=30).cache_control
+    'public, max-age=60, stale-while-revalidate=30'
+    """
+
+    def __init__(self, max_age=None, s_maxage=None, stale_while_revalidate=None,
+                 stale_if_error=None, public=True, no_cache=False,
+                 no_store=False, must_revalidate=False, immutable=False,
+                 vary=()):
+        """Create the policy.
+
+        :param max_age: seconds any cache may use the response
+        :param s_maxage: seconds shared caches (CDN, proxies) may use it
+        :param stale_while_revalidate: seconds a stale response may be
+            served while it is refreshed in the background
+        :param stale_if_error: seconds a stale response may be served
+            when refreshing fails
+        :param public: True for public, False for private
+        :param no_cache: caches must revalidate before each use
+        :param no_store: nothing may be stored
+        :param must_revalidate: stale responses must not be used
+        :param immutable: the response never changes while fresh
+        :param vary: request headers which select the representation
+        :type vary: sequence
+        """
+        self.max_age = max_age
+        self.s_maxage = s_maxage
+        self.vary = ', '.join(vary)
+        self.vary_headers = tuple(vary)
+        # Seconds a shared cache, like :attr:`Api.response_cache`, keeps it
+        self.ttl = s_maxage if s_maxage is not None else max_age
+        if no_store or no_cache or not public:
+            self.ttl = None
+        directives = []
+        if no_store:
+            directives.append('no-store')
+        else:
+            directives.append('public' if public else 'private')
+            if no_cache:
+                directives.append('no-cache')
+            for name, value in (('max-age', max_age), ('s-maxage', s_maxage),
+                                ('stale-while-revalidate', stale_while_revalidate),
+                                ('stale-if-error', stale_if_error)):
+                if value is not None:
+                    directives.append('{}={}'.format(name, int(value)))
+            if must_revalidate:
+                directives.append('must-revalidate')
+            if immutable:
+                directives.append('immutable')
+        self.cache_control = ', '.join(directives)
+
+    def __repr__(self):
+        return '<CachePolicy {!r}>'.format(self.cache_control)
+
+
+def set_cache_policy(policy):
+    """Use `policy` for the response of the current request.
+
+    Overrides the policy given to :meth:`Api.add_resource`, None removes
+    it for this response.
+    """
+    flask.g._resteasy_cache_policy = policy
+
+
+class Timing(object):
+    """Phase durations of one request for the `Server-Timing` header.
+
+    Only the phase names and durations are sent, no descriptions, so a
+    resource cannot leak details by accident.  See :func:`timing_phase`.
+    """
+
+    __slots__ = ('phases',)
+
+    def __init__(self):
+        self.phases = []
+
+    def add(self, name, seconds):
+        """Add `seconds` to the phase called `name`."""
+        self.phases.append((name, seconds))
+
+    def header(self):
+        """Return the `Server-Timing` header value."""
+        totals = OrderedDict()
+        for name, seconds in self.phases:
+            totals[name] = totals.get(name, 0.0) + seconds
+        return ', '.join('{};dur={:.1f}'.format(name, seconds * 1000)
+                         for name, seconds in totals.items())
+
+
+def current_timing():
+    """Return the :class:`Timing` of the current request or None."""
+    return getattr(flask.g, '_resteasy_timing', None) if flask.g else None
+
+
+class timing_phase(object):
+    """Time a block as a phase of the `Server-Timing` header.
+
+    Does nothing unless the api's :class:`ApiResponse` sends the header.
+    Names must be HTTP tokens, such as 'db' or 'cache'::
+
+        def get(self):
+            with timing_phase('db'):
+                rows = query()
+    """
+
+    __slots__ = ('name', 'timing', 'start')
+
+    def __init__(self, name):
+        self.name = name
+        self.timing = current_timing()
+
+    def __enter__(self):
+        if self.timing is not None:
+            self.start = _perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.timing is not None:
+            self.timing.add(self.name, _perf_counter() - self.start)
+
+
+class RequestMemo(object):
+    """Results of :func:`memoize` functions for one request."""
+
+    __slots__ = ('request', 'values', 'hits', 'misses')
+
+    def __init__(self, request):
+        self.request = request
+        self.values = {}
+        self.hits = self.misses = 0
+
+    def stats(self):
+        """Return the hit and miss counters as a dict."""
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self.values)}
+
+
+def current_memo():
+    """Return the :class:`RequestMemo` of the current request or None."""
+    if not flask.has_request_context():
+        return None
+    memo = getattr(flask.g, '_resteasy_memo', None)
+    request = flask.request._get_current_object()
+    if memo is None or memo.request is not request:
+        memo = flask.g._resteasy_memo = RequestMemo(request)
+    return memo
+
+
+def memoize(func):
+    """Cache the results of `func` for the duration of the request.
+
+    Decorators and resources looking up the same records share a single
+    call per request and argument values::
+
+        @memoize
+        def load_user(user_id):
+            return db.users.get(user_id)
+
+    The arguments must be hashable, calls with unhashable arguments or
+    outside of a request are not cached.  Exceptions are not cached.
+    Hits and misses are counted on the :class:`RequestMemo`, which the
+    :class:`SlowRequestLog` reports.
+    """
+    @wraps(func)
+    def memoized(*args, **kwargs):
+        memo = current_memo()
+        if memo is None:
+            return func(*args, **kwargs)
+        try:
+            key = (func, args, frozenset(kwargs.items())) if kwargs else (func, args)
+            value = memo.values.get(key, _missing)
+        except TypeError:
+            memo.misses += 1
+            return func(*args, **kwargs)
+        if value is not _missing:
+            memo.hits += 1
+            return value
+        memo.misses += 1
+        value = memo.values[key] = func(*args, **kwargs)
+        return value
+
+    return memoized
+
+
+class SlowRequestLog(object):
+    """Log requests over their latency budget with a phase breakdown.
+
+    The :class:`Api` times the whole dispatch including decorators, the
+    view and the response encoding.  Nothing beyond the clock readings is
+    done unless the total is over the endpoint's threshold, in which case
+    one record is logged with the breakdown under the `resteasy` attribute.
+    """
+
+    def __init__(self, threshold=1.0, thresholds=None, logger=None,
+                 level=logging.WARNING):
+        """Create the slow request log.
+
+        :param threshold: default seconds a request may take
+        :type threshold: float
+        :param thresholds: seconds per endpoint, overriding `threshold`
+        :type thresholds: dict
+        :param logger: defaults to the 'flask_resteasy.slow' logger
+        :type logger: :class:`logging.Logger`
+        :param level: logging level of the records
+        :type level: int
+        """
+        self.threshold = threshold
+        self.thresholds = thresholds if thresholds is not None else {}
+        self.logger = logger or logging.getLogger('flask_resteasy.slow')
+        self.level = level
+
+    def report(self, endpoint, total, view, encode, response):
+        """Log a slow request.
+
+        :param endpoint: the resource endpoint
+        :param total: seconds for the whole dispatch
+        :param view: seconds spent in the resource
+        :param encode: seconds spent by the :class:`ApiResponse`
+        :param response: the response returned to flask
+        """
+        size = status = None
+        if isinstance(response, ResponseBase):
+            status = response.status_code
+            size = response.calculate_content_length()
+        record = {
+            'endpoint': endpoint,
+            'method': flask.request.method,
+            'path': flask.request.path,
+            'status': status,
+            'size': size,
+            'threshold': self.thresholds.get(endpoint, self.threshold),
+            'total': total,
+            'view': view,
+            'encode': encode,
+            'decorators': max(total - view - encode, 0.0),
+        }
+        tenant = current_tenant()
+        if tenant is not None:
+            record['tenant'] = tenant
+        memo = getattr(flask.g, '_resteasy_memo', None)
+        if memo is not None and memo.request is flask.request._get_current_object():
+            record['memo'] = memo.stats()
+        self.logger.log(self.level, 'Slow request %s %s %.1fms',
+                        record['method'], record['path'], total * 1000,
+                        extra={'resteasy': record})
+
+
+class _ViewAttribute(str):
+    """A class attribute, on instances the attribute of the wrapped view.
+
+    `__doc__` and `__module__` are set on every class, these replace them
+    so a :class:`_ViewProxy` answers with those of its view.
+    """
+
+    def __new__(cls, name, value):
+        self = str.__new__(cls, value)
+        self.name = name
+        return self
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        return getattr(obj.view, self.name, None)
+
+    def __set__(self, obj, value):
+        raise AttributeError(self.name)
+
+
+class _ViewProxy(object):
+    """Base of the objects standing for a view function in the url map.
+
+    They share the `__dict__` of the view they wrap, where flask finds
+    `view_class` and `methods`, and forward its name, qualified name and
+    docstring as :func:`functools.wraps` would copy them.
+    """
+    __slots__ = ()
+
+    def _wrap(self, view):
+        self.view = view
+        self.__dict__ = getattr(view, '__dict__', None)
+        if self.__dict__ is None:
+            self.__dict__ = {}
+
+    @property
+    def __name__(self):
+        return self.view.__name__
+
+    @property
+    def __wrapped__(self):
+        return self.view
+
+    def __getattr__(self, name):
+        if name == '__qualname__':
+            return getattr(self.view, name)
+        raise AttributeError(name)
+
+
+_TRACEPARENT = re.compile(r'^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+
+class Span(object):
+    """A timed operation of a trace.
+
+    Fields follow the Zipkin v2 span model so a local collector accepts
+    them as they are, see :meth:`to_dict`.
+    """
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'kind', 'start',
+                 'duration', 'tags', 'sampled', 'state')
+
+    def __init__(self, name, trace_id, parent_id=None, kind=None, sampled=True,
+                 state=None):
+        self.trace_id = trace_id
+        self.span_id = '%016x' % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start = None
+        self.duration = None
+        self.tags = {}
+        self.sampled = sampled
+        self.state = state
+
+    def traceparent(self):
+        """The W3C `traceparent` of calls made within this span."""
+        return '00-%s-%s-%s' % (self.trace_id, self.span_id,
+                                '01' if self.sampled else '00')
+
+    def to_dict(self, service=None):
+        """The span as a Zipkin v2 JSON object."""
+        span = {'traceId': self.trace_id, 'id': self.span_id, 'name': self.name,
+                'timestamp': int(self.start * 1e6),
+                'duration': max(int(self.duration * 1e6), 1)}
+        if self.parent_id is not None:
+            span['parentId'] = self.parent_id
+        if self.kind is not None:
+            span['kind'] = self.kind
+        if service is not None:
+            span['localEndpoint'] = {'serviceName': service}
+        if self.tags:
+            span['tags'] = self.tags
+        return span
+
+
+def current_span():
+    """Return the open :class:`Span` of the current request or None."""
+    return getattr(flask.g, '_resteasy_span', None) if flask.has_app_context() else None
+
+
+def trace_headers():
+    """Return the trace context headers for calls made by the current request.
+
+    Pass them on to downstream services so their spans join the trace.
+    Empty when the request is not traced.
+    """
+    span = current_span()
+    if span is None:
+        return {}
+    headers = {'traceparent': span.traceparent()}
+    if span.state:
+        headers['tracestate'] = span.state
+    return headers
+
+
+class FileExporter(object):
+    """Write spans as JSON lines to a file or stream, stdout by default."""
+
+    def __init__(self, path=None, stream=None):
+        """Create the exporter.
+
+        :param path: file the spans are appended to
+        :param stream: stream written when there is no `path`
+        """
+        self.path = path
+        self.stream = stream
+
+    def export(self, spans):
+        """Write a batch of span dicts."""
+        data = ''.join(dumps(span) + '\n' for span in spans)
+        if self.path is not None:
+            with codecs.open(self.path, 'a', 'utf-8') as output:
+                output.write(data)
+        else:
+            stream = self.stream or sys.stdout
+            stream.write(data)
+            stream.flush()
+
+
+class HTTPExporter(object):
+    """Post batches of spans to a Zipkin compatible collector."""
+
+    def __init__(self, url='http://127.0.0.1:9411/api/v2/spans', timeout=5.0):
+        self.url = url
+        self.timeout = timeout
+
+    def export(self, spans):
+        """Post a batch of span dicts as a JSON array."""
+        request = Request(self.url, dumps(spans).encode('utf-8'),
+                          {'Content-Type': 'application/json'})
+        urlopen(request, timeout=self.timeout).close()
+
+
+class Tracer(object):
+    """Lightweight request tracing for an :class:`Api`.
+
+    Each request gets a server span, joining the trace of an incoming
+    W3C `traceparent` header, with child spans for every decorator and
+    for the view and encoding phases.  Finished spans go to a ring buffer
+    of `capacity` spans, the oldest are dropped when it is full, and a
+    background thread hands them to the exporter in batches every
+    `interval` seconds.  Nothing is traced without a tracer, requests
+    arriving with an unsampled `traceparent` only propagate it.
+
+    An exporter is any object with an `export(spans)` method taking a
+    list of span dicts, see :class:`FileExporter` and :class:`HTTPExporter`.
+    """
+
+    def __init__(self, exporter=None, service='flask-resteasy', capacity=4096,
+                 interval=1.0):
+        """Create the tracer.
+
+        :param exporter: defaults to a :class:`FileExporter` on stdout
+        :param service: service name of the spans
+        :param capacity: finished spans kept until exported
+        :type capacity: int
+        :param interval: seconds between exports
+        :type interval: float
+        """
+        self.exporter = exporter if exporter is not None else FileExporter()
+        self.service = service
+        self.interval = interval
+        self.spans = deque(maxlen=capacity)
+        self.dropped = 0
+        self.logger = logging.getLogger('flask_resteasy.tracing')
+        self._offset = time.time() - _perf_counter()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = os.getpid()
+        self._closed = False
+
+    def start_request(self, name):
+        """Open the server span of the current request."""
+        request = flask.request
+        match = _TRACEPARENT.match(request.headers.get('traceparent', ''))
+        if match is not None and match.group(1) != 'ff':
+            span = Span(name, match.group(2), match.group(3), 'SERVER',
+                        int(match.group(4), 16) & 1 == 1,
+                        request.headers.get('tracestate'))
+        else:
+            span = Span(name, '%032x' % random.getrandbits(128), kind='SERVER')
+        span.tags['http.method'] = request.method
+        span.tags['http.path'] = request.path
+        span.start = _perf_counter()
+        return span
+
+    def start(self, name, parent):
+        """Open a child span of `parent`."""
+        span = Span(name, parent.trace_id, parent.span_id, state=parent.state)
+        span.start = _perf_counter()
+        return span
+
+    def finish(self, span):
+        """Close a span and keep it for the exporter when sampled."""
+        span.duration = _perf_counter() - span.start
+        span.start += self._offset
+        if span.sampled:
+            self._keep(span)
+
+    def record(self, name, start, end):
+        """Keep a span of the current one timed by :func:`_perf_counter`."""
+        parent = current_span()
+        if parent is not None and parent.sampled:
+            span = Span(name, parent.trace_id, parent.span_id, state=parent.state)
+            span.start = start + self._offset
+            span.duration = end - start
+            self._keep(span)
+
+    def _keep(self, span):
+        spans = self.spans
+        if len(spans) == spans.maxlen:
+            self.dropped += 1
+        spans.append(span)
+        thread = self._thread
+        if (thread is None or not thread.is_alive()) and not self._closed:
+            self._start_thread()
+
+    def _start_thread(self):
+        """Start the export thread, again in a forked child where it is gone."""
+        if self._pid != os.getpid():
+            # the lock and event may have been held by the parent's threads
+            self._lock = threading.Lock()
+            self._wake = threading.Event()
+            self._pid = os.getpid()
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run,
+                                                name='resteasy-tracer')
+                self._thread.daemon = True
+                self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Export the finished spans now."""
+        spans = self.spans
+        batch = []
+        try:
+            while True:
+                batch.append(spans.popleft().to_dict(self.service))
+        except IndexError:
+            pass
+        if batch:
+            try:
+                self.exporter.export(batch)
+            except Exception:
+                self.logger.exception('Exporting %d spans failed', len(batch))
+        return len(batch)
+
+    def close(self):
+        """Stop the background thread and export what is left."""
+        self._closed = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+
+class _Traced(_ViewProxy):
+    __doc__ = _ViewAttribute(
+        '__doc__', """A span around a view function, the request span when `root`.""")
+    __module__ = _ViewAttribute('__module__', __name__)
+    __slots__ = ('tracer', 'view', 'name', 'root', '__dict__')
+
+    def __init__(self, tracer, view, name, root=False):
+        self.tracer = tracer
+        self._wrap(view)
+        self.name = name
+        self.root = root
+
+    def __call__(self, *args, **kwargs):
+        g = flask.g
+        parent = getattr(g, '_resteasy_span', None)
+        if self.root:
+            span = self.tracer.start_request(self.name)
+        elif parent is None or not parent.sampled:
+            return self.view(*args, **kwargs)
+        else:
+            span = self.tracer.start(self.name, parent)
+        g._resteasy_span = span
+        status = None
+        try:
+            rv = self.view(*args, **kwargs)
+            status = getattr(rv, 'status_code', None)
+            return rv
+        except HTTPException as err:
+            status = err.code
+            raise
+        except Exception as err:
+            span.tags['error'] = '%s: %s' % (type(err).__name__, err)
+            raise
+        finally:
+            g._resteasy_span = parent
+            if self.root and status is not None:
+                span.tags['http.status_code'] = str(status)
+                if status >= 500:
+                    span.tags['error'] = str(status)
+            self.tracer.finish(span)
+
+
+def current_tenant():
+    """Return the tenant of the current request or None.
+
+    Set by the :class:`Tenants` of the Api dispatching the request.
+    """
+    return getattr(flask.g, '_resteasy_tenant', None) if flask.has_app_context() else None
+
+
+def _warmup_entry(entry):
+    """Return the endpoint, url values and headers of a warm-up entry."""
+    if not isinstance(entry, (tuple, list)):
+        entry = (entry,)
+    endpoint, values, headers = (tuple(entry) + (None, None))[:3]
+    return endpoint, dict(values or {}), dict(headers or {})
+
+
+class Tenants(object):
+    """Partition an :class:`Api` by tenant.
+
+    The tenant of a request is resolved from a url variable, a header or
+    the subdomain, in that order, see :func:`current_tenant`.  Requests
+    without a tenant are not partitioned.  For each tenant:
+
+    - response cache keys are prefixed with the tenant, and with
+      `cache_size` each tenant gets a :class:`LocalStore` of its own so
+      one tenant cannot evict the responses of another
+    - at most `max_concurrent` requests run at once
+    - at most `quota` requests, a tuple (requests, seconds), are served
+      per window; `quotas` overrides it for some tenants
+    - requests, rejections, errors, time and requests running are counted,
+      see :meth:`metrics`
+
+    Requests over a limit get a 429 with `Retry-After` before the
+    resource runs.  Tenants usually come from the client, `allow` limits
+    them to known ones and the state of at most `max_tenants` is kept,
+    the least recently seen idle tenant is forgotten first.
+    """
+
+    def __init__(self, view_arg=None, header=None, subdomain=False,
+                 max_concurrent=None, quota=None, quotas=None, cache_size=None,
+                 allow=None, max_tenants=1000):
+        """Create the tenant partitioning.
+
+        :param view_arg: url variable naming the tenant
+        :param header: request header naming the tenant
+        :param subdomain: the subdomain names the tenant, below the app's
+            `SERVER_NAME` or the last two labels of the host
+        :type subdomain: bool
+        :param max_concurrent: requests of a tenant running at once
+        :type max_concurrent: int
+        :param quota: (requests, seconds) a tenant may make per window
+        :type quota: tuple
+        :param quotas: tenant to (requests, seconds), overriding `quota`
+        :type quotas: dict
+        :param cache_size: entries of each tenant's response cache
+        :type cache_size: int
+        :param allow: the known tenants, or a function of the tenant
+            returning whether it is known.  Requests naming an unknown
+            tenant get a 400.
+        :type allow: container or callable
+        :param max_tenants: tenants whose counters, quota window and cache
+            are kept
+        :type max_tenants: int
+        """
+        self.view_arg = view_arg
+        self.header = header
+        self.subdomain = subdomain
+        self.max_concurrent = max_concurrent
+        self.quota = quota
+        self.quotas = dict(quotas or {})
+        self.cache_size = cache_size
+        self.allow = allow
+        self.max_tenants = max_tenants
+        self._lock = threading.Lock()
+        self._tenants = OrderedDict()
+
+    def resolve(self, view_args):
+        """Return the tenant of the current request or None."""
+        if self.view_arg is not None and view_args.get(self.view_arg):
+            return view_args[self.view_arg]
+        request = flask.request
+        if self.header is not None and request.headers.get(self.header):
+            return request.headers[self.header]
+        if self.subdomain:
+            host = request.host.split(':')[0]
+            server = flask.current_app.config.get('SERVER_NAME')
+            if server:
+                server = '.' + server.split(':')[0]
+                if host.endswith(server):
+                    return host[:-len(server)]
+            else:
+                labels = host.split('.')
+                if len(labels) > 2:
+                    return '.'.join(labels[:-2])
+        return None
+
+    def known(self, tenant):
+        """Whether `tenant` passes `allow`."""
+        allow = self.allow
+        if allow is None:
+            return True
+        return allow(tenant) if callable(allow) else tenant in allow
+
+    def _state(self, tenant):
+        """The kept state of `tenant`, called with the lock held."""
+        tenants = self._tenants
+        state = tenants.get(tenant)
+        if state is None:
+            if len(tenants) >= self.max_tenants:
+                for old, kept in tenants.items():
+                    if not kept.stats['active']:
+                        del tenants[old]
+                        break
+            state = tenants[tenant] = _TenantState()
+        else:
+            # move to the end, python2 has no move_to_end
+            del tenants[tenant]
+            tenants[tenant] = state
+        return state
+
+    def cache(self, tenant):
+        """Return the response cache of `tenant`."""
+        with self._lock:
+            state = self._state(tenant)
+            if state.cache is None:
+                state.cache = LocalStore(maxsize=self.cache_size)
+            return state.cache
+
+    def enter(self, tenant):
+        """Count a request of `tenant` starting.
+
+        :return: None when it may run, otherwise seconds to retry after
+        """
+        now = time.time()
+        with self._lock:
+            state = self._state(tenant)
+            stats = state.stats
+            if self.max_concurrent is not None and stats['active'] >= self.max_concurrent:
+                stats['rejected'] += 1
+                return 1
+            quota = self.quotas.get(tenant, self.quota)
+            if quota is not None:
+                limit, seconds = quota
+                window = state.window
+                if window is None or now - window[0] >= seconds:
+                    window = state.window = [now, 0]
+                if window[1] >= limit:
+                    stats['rejected'] += 1
+                    return max(1, int(window[0] + seconds - now + 0.999))
+                window[1] += 1
+            stats['active'] += 1
+            stats['requests'] += 1
+        return None
+
+    def leave(self, tenant, status, seconds):
+        """Count a request of `tenant` done with `status`."""
+        with self._lock:
+            stats = self._tenants[tenant].stats
+            stats['active'] -= 1
+            stats['seconds'] += seconds
+            if status is None or status >= 500:
+                stats['errors'] += 1
+
+    def metrics(self):
+        """Return the counters by tenant."""
+        with self._lock:
+            return dict((tenant, dict(state.stats))
+                        for tenant, state in self._tenants.items() if state.requests_seen())
+
+
+class _TenantState(object):
+    """Counters, quota window and response cache of a tenant."""
+    __slots__ = ('stats', 'window', 'cache')
+
+    def __init__(self):
+        self.stats = {'requests': 0, 'rejected': 0, 'errors': 0, 'active': 0,
+                      'seconds': 0.0}
+        self.window = None
+        self.cache = None
+
+    def requests_seen(self):
+        return bool(self.stats['requests'] or self.stats['rejected'])
+
+
+_NO_OPTIONS = {}
+
+
+class _Registration(namedtuple('_Registration', 'resource urls options')):
+    """A resource as given to :meth:`Api.add_resource`.
+
+    Kept in :attr:`Api.registry`, the options are never changed in place
+    so the registrations without any share one empty dict.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def of(cls, resource, urls, options):
+        return cls(resource, tuple(urls), dict(options) if options else _NO_OPTIONS)
+
+
+class _Dispatch(_ViewProxy):
+    __doc__ = _ViewAttribute(
+        '__doc__', """The view function of a resource made by :meth:`Api.output`.
+
+    The options of a resource are kept in slots and the dispatching code
+    is shared, where a closure would hold a cell per option and a copy of
+    the view's attributes.
+    """)
+    __module__ = _ViewAttribute('__module__', __name__)
+    __slots__ = ('api', 'view', 'deferred', 'cache', 'cached', 'timeouts',
+                 'coroutines', 'idempotent', 'response', 'delta', 'validators',
+                 '__dict__')
+
+    def __init__(self, api, view, deferred, cache, cached, timeouts, coroutines,
+                 idempotent, response, delta, validators):
+        self.api = api
+        self._wrap(view)
+        self.deferred = deferred
+        self.cache = cache
+        self.cached = cached
+        self.timeouts = timeouts
+        self.coroutines = coroutines
+        self.idempotent = idempotent
+        self.response = response
+        self.delta = delta
+        self.validators = validators
+
+    def __call__(self, *args, **kwargs):
+        tenants = self.api.tenants
+        if tenants is None:
+            if self.idempotent:
+                return self.once(args, kwargs)
+            return self.dispatch(*args, **kwargs)
+        tenant = tenants.resolve(kwargs)
+        if tenant is None:
+            return self.once(args, kwargs)
+        if not tenants.known(tenant):
+            return self.api.responder.pack({'error': 'Unknown tenant'}, 400)
+        flask.g._resteasy_tenant = tenant
+        retry = tenants.enter(tenant)
+        if retry is not None:
+            return self.api.responder.pack(
+                {'error': 'Too many requests for tenant'}, 429,
+                {'Retry-After': str(retry)})
+        start, status = _perf_counter(), None
+        try:
+            rv = self.once(args, kwargs)
+            status = getattr(rv, 'status_code', 200)
+            return rv
+        except HTTPException as err:
+            status = err.code
+            raise
+        finally:
+            tenants.leave(tenant, status, _perf_counter() - start)
+
+    def once(self, args, kwargs):
+        """Dispatch, once per `Idempotency-Key` for idempotent methods."""
+        method = flask.request.method
+        if self.idempotent and method in self.idempotent:
+            key = flask.request.headers.get('Idempotency-Key')
+            if key:
+                timeout = self.timeouts.get(method) if self.timeouts else None
+                return self.api._idempotent(key, self.dispatch, args, kwargs,
+                                            timeout)
+        return self.dispatch(*args, **kwargs)
+
+    def dispatch(self, *args, **kwargs):
+        """Call the view and make its response."""
+        api, resource, delta = self.api, self.view, self.delta
+        method = flask.request.method
+        responder = self.response or api.responder
+        if self.validators and method in self.validators:
+            error = api._validate(self.validators[method])
+            if error is not None:
+                return responder.pack({'error': error}, 400)
+        if method in self.deferred:
+            return api.defer(resource, *args, **kwargs)
+        timing = responder.start_timing() if responder.server_timing else None
+        key = None
+        if method in self.cached:
+            key = api.cache_key(self.cache[method])
+            rv = api._cached(key, timing)
+            if rv is not None:
+                return api._delta(rv) if delta and method == 'GET' else rv
+        timed = api.slow_log is not None
+        tracer = api.tracer
+        measured = timed or timing is not None or tracer is not None
+        if measured:
+            start = _perf_counter()
+        deadline = budget = None
+        if self.timeouts:
+            budget = self.timeouts.get(method)
+        if api.deadline_header is not None or budget is not None:
+            deadline = api._deadline(budget)
+        profiler = api.profiler
+        if deadline is not None and budget is None and deadline <= time.time():
+            rv = api._timeout()
+        elif budget is not None or method in self.coroutines:
+            if profiler.targets:
+                endpoint = resource.__name__
+
+                def view(*args, **kwargs):
+                    return profiler.call(endpoint, resource, args, kwargs)
+            else:
+                view = resource
+            rv = api._call(view, args, kwargs, deadline, method in self.coroutines)
+        elif profiler.targets:
+            rv = profiler.call(resource.__name__, resource, args, kwargs)
+        else:
+            rv = resource(*args, **kwargs)
+        if measured:
+            viewed = _perf_counter()
+            rv = responder(rv)
+            encoded = _perf_counter()
+            if tracer is not None:
+                tracer.record('view', start, viewed)
+                tracer.record('encode', viewed, encoded)
+            if timed:
+                _timing.view = viewed - start
+                _timing.encode = encoded - viewed
+            if timing is not None:
+                timing.add('view', viewed - start)
+                timing.add('encode', encoded - viewed)
+                responder.add_timing(rv, timing)
+        else:
+            rv = responder(rv)
+        policy = getattr(flask.g, '_resteasy_cache_policy', _missing)
+        if policy is _missing:
+            policy = self.cache.get(method) if self.cache else None
+        rv = responder.apply_cache_policy(rv, policy)
+        if key is not None and policy is not None and policy.ttl:
+            rv = api._cache(key, rv, policy.ttl)
+        if delta and method == 'GET':
+            rv = api._delta(rv)
+        return rv
+
+
+def _footprint(obj, seen):
+    """Bytes of `obj` and of what it holds, roughly.
+
+    Functions are followed into their closures and attributes, dispatch
+    objects into their slots, url rules into their attributes and
+    containers into their items.  Classes, modules and objects in `seen`
+    are not counted, objects counted are added to `seen`.
+    """
+    size = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if obj is None or id(obj) in seen or isinstance(obj, (type, ModuleType)):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, (_Dispatch, _Guard, _Traced)):
+            stack.extend(getattr(obj, name) for name in obj.__slots__)
+        elif isinstance(obj, FunctionType):
+            stack.append(obj.__dict__)
+            if obj.__closure__:
+                size += sys.getsizeof(obj.__closure__)
+                for cell in obj.__closure__:
+                    size += sys.getsizeof(cell)
+                    try:
+                        stack.append(cell.cell_contents)
+                    except ValueError:
+                        pass
+        elif isinstance(obj, Rule):
+            stack.append(obj.__dict__)
+        elif isinstance(obj, dict):
+            stack.extend(obj)
+            stack.extend(obj.values())
+        elif isinstance(obj, (tuple, list, set, frozenset)):
+            stack.extend(obj)
+    return size
+
+
+class _Guard(_ViewProxy):
+    __doc__ = _ViewAttribute(
+        '__doc__', """The outermost view function of a resource, around its decorators.
+
+    Answers exceptions with :meth:`Api.handle_error` when the Api handles
+    errors.  Unexpected exceptions are raised again when the app
+    propagates them, as in debug and testing, so they are not hidden.
+    Times the request for the :attr:`Api.slow_log` when there is one.
+    """)
+    __module__ = _ViewAttribute('__module__', __name__)
+    __slots__ = ('api', 'view', 'endpoint', '__dict__')
+
+    def __init__(self, api, view, endpoint):
+        self.api = api
+        self._wrap(view)
+        self.endpoint = endpoint
+
+    def __call__(self, *args, **kwargs):
+        slow_log = self.api.slow_log
+        if slow_log is None:
+            return self.catching(args, kwargs)
+        _timing.view = _timing.encode = 0.0
+        start = _perf_counter()
+        rv = self.catching(args, kwargs)
+        total = _perf_counter() - start
+        if total > slow_log.thresholds.get(self.endpoint, slow_log.threshold):
+            slow_log.report(self.endpoint, total, _timing.view, _timing.encode, rv)
+        return rv
+
+    def catching(self, args, kwargs):
+        api = self.api
+        if not api.handle_errors:
+            return self.view(*args, **kwargs)
+        try:
+            return self.view(*args, **kwargs)
+        except Exception as error:
+            if (not isinstance(error, HTTPException) and
+                    api._error_code(type(error)) is None and
+                    flask.current_app.propagate_exceptions):
+                raise
+            return api.handle_error(error)
+
+
 class Api(object):
     """The main entry point for the application.
 
@@ -76,7 +2187,14 @@ class Api(object):
     >>> api.init_app(app)
     """
 
-    def __init__(self, app=None, prefix='', decorators=None, response=None):
+    def __init__(self, app=None, prefix='', decorators=None, response=None,
+                 executor=None, jobs=None, jobs_url='/jobs/<job_id>',
+                 fast_routing=False, slow_log=None, cache_policy=None,
+                 response_cache=None, versions=None,
+                 deadline_header=None, idempotency=None,
+                 deltas=None, openapi_url=None, openapi_info=None,
+                 handle_errors=False, errors=None, tenants=None, warmup=None,
+                 tracer=None, idempotency_scope=None, timeout_executor=None):
         """Create and API consisting of one or more resources.
 
         :param app: the Flask application or blueprint object
@@ -87,6 +2205,68 @@ class Api(object):
         :type decorators: list
         :param response: `ApiResponse` object, default JSONResponse()
         :type response: `ApiResponse`
+        :param executor: runs deferred resource methods, defaults to a
+            :class:`concurrent.futures.ThreadPoolExecutor`
+        :type executor: :class:`concurrent.futures.Executor`
+        :param jobs: store for deferred results, default LocalStore()
+        :type jobs: :class:`LocalStore`
+        :param jobs_url: url rule of the deferred job status resource
+        :type jobs_url: str
+        :param fast_routing: match requests under this Api's prefix with a
+            :class:`RouteIndex` instead of trying every rule in the app
+        :type fast_routing: bool
+        :param slow_log: log requests over a latency budget
+        :type slow_log: :class:`SlowRequestLog`
+        :param cache_policy: default for GET requests of every resource
+        :type cache_policy: :class:`CachePolicy`
+        :param response_cache: store for encoded GET responses, kept as
+            long as their :class:`CachePolicy` allows shared caches to
+        :type response_cache: :class:`LocalStore` or :class:`MMapStore`
+        :param versions: serve every resource under each of these versions,
+            as a `/<version>` segment after the prefix.  The version of the
+            request is in `flask.g.api_version`, overrides per version are
+            given to :meth:`add_resource`.
+        :type versions: sequence of str
+        :param deadline_header: request header with the client's deadline
+            in epoch seconds, for example 'X-Request-Deadline', see the
+            `timeout` of :meth:`add_resource`.  Off by default, a client
+            deadline alone never moves a request to the
+            :attr:`timeout_executor`.
+        :type deadline_header: str
+        :param idempotency: store for the responses of `idempotent`
+            methods, default LocalStore(ttl=86400)
+        :type idempotency: :class:`LocalStore` or :class:`MMapStore`
+        :param deltas: store of recent bodies by ETag for `delta`
+            resources, default LocalStore(ttl=3600, maxsize=256) holding
+            up to 64 MB of bodies
+        :type deltas: :class:`LocalStore` or :class:`MMapStore`
+        :param openapi_url: url rule of a resource serving the OpenAPI
+            document of this Api, see :meth:`openapi`
+        :type openapi_url: str
+        :param openapi_info: the document's `info`, title and version
+        :type openapi_info: dict
+        :param handle_errors: turn exceptions raised by resources and their
+            decorators into responses of the Api's responder, see
+            :meth:`handle_error`
+        :type handle_errors: bool
+        :param errors: exception class to status code, or to a tuple of
+            status code and message, for :meth:`handle_error`
+        :type errors: dict
+        :param tenants: partition caches, limits and metrics by tenant
+        :type tenants: :class:`Tenants`
+        :param warmup: manifest of requests run by :meth:`warmup` as soon
+            as their endpoints are registered with the app
+        :type warmup: list
+        :param tracer: trace requests, their decorators and phases
+        :type tracer: :class:`Tracer`
+        :param idempotency_scope: returns who is making the request, for
+            example ``lambda: g.user.id``, so an `Idempotency-Key` only
+            replays responses to the caller that stored them
+        :type idempotency_scope: callable
+        :param timeout_executor: runs resource methods with a `timeout`,
+            apart from the deferred jobs of `executor`, defaults to a
+            :class:`concurrent.futures.ThreadPoolExecutor` of 32 threads
+        :type timeout_executor: :class:`concurrent.futures.Executor`
         """
         self.app = None
         self.blueprint = None
@@ -96,10 +2276,48 @@ class Api(object):
         self.endpoints = set()
         self.decorators = decorators if decorators else []
         self.responder = response if response else JSONResponse()
+        self._executor = executor
+        self._timeout_executor = timeout_executor
+        self.jobs = jobs if jobs is not None else LocalStore()
+        self.jobs_url = jobs_url
+        self.job_resource = None
+        self.fast_routing = fast_routing
+        self.profiler = Profiler()
+        self.slow_log = slow_log
+        self.cache_policy = cache_policy
+        self.response_cache = response_cache
+        self.deadline_header = deadline_header
+        self.idempotency = (idempotency if idempotency is not None
+                            else LocalStore(ttl=86400, maxsize=10000))
+        self.idempotency_scope = idempotency_scope
+        self.idempotency_pending = 60
+        self._idempotency_locks = _KeyLocks()
+        self.deltas = (deltas if deltas is not None
+                       else LocalStore(ttl=3600, maxsize=256, maxbytes=64 << 20))
+        self.openapi_info = openapi_info or {'title': 'API', 'version': '1.0'}
+        self.handle_errors = handle_errors
+        self.tenants = tenants
+        self.warmup_manifest = list(warmup or ())
+        self.tracer = tracer
+        self.errors = dict(errors or {})
+        self.static_errors = frozenset((404, 405, 429, 503))
+        self._error_codes = {}
+        self._error_bodies = {}
+        self._openapi = None
+        self.registry = {}
+        self.versions = tuple(versions or ())
+        self._version_views = {}
+        self._endpoint_versions = {}
+        self._dispatchers = {}
+        self._flask_app = None
+        self._reload_lock = threading.Lock()
 
         if app is not None:
             self.app = app
             self.init_app(app)
+        if openapi_url is not None:
+            self.add_resource(type('OpenAPISpec', (OpenAPISpec,), {'api': self}),
+                              openapi_url, endpoint='openapi')
 
     def init_app(self, app):
         """Initialize actions with the app or blueprint.
@@ -129,8 +2347,18 @@ class Api(object):
         :param app: The flask application object
         :type app: :class:`~flask.Flask`
         """
+        self._flask_app = app
+        if self.versions:
+            app.url_defaults(self._version_defaults)
+        if self.fast_routing:
+            url_prefix = self.blueprint_setup.url_prefix if self.blueprint_setup else None
+            RouteIndex.install(app).prefixes.add(self._make_url('', url_prefix))
         for resource, urls, kwargs in self.resources:
             self._register_view(app, resource, *urls, **kwargs)
+        if 'openapi' in self.registry:
+            self.openapi_body()
+        if self.blueprint_setup is None:
+            self._auto_warmup(self.endpoints)
 
     def _deferred_blueprint_init(self, setup_state):
         """Bind resources to the app as recorded in blueprint.
@@ -154,6 +2382,10 @@ class Api(object):
         if not setup_state.first_registration:
             raise ValueError('flask-RESTEasy blueprints can only be registered once.')
         self._init_app(setup_state.app)
+        # The url rules are added by the deferred functions after this one,
+        # warm up once they have all run.
+        setup_state.blueprint.deferred_functions.append(
+            lambda state: self._auto_warmup(self.endpoints))
 
     def resource(self, *urls, **kwargs):
         """Add a :class:`~flask_resteasy.Resource` class.
@@ -192,6 +2424,47 @@ class Api(object):
         :type endpoint: str
         :param decorators: add decorators to MethodView.decorators
         :type decorators: sequence
+        :param deferred: HTTP methods run in the background by
+            :attr:`executor`.  The request immediately gets a 202 with a
+            `Location` of the :class:`JobStatus` resource for the result.
+        :type deferred: sequence
+        :param cache: :class:`CachePolicy` for GET requests or a dict of
+            HTTP method to policy, replacing the Api's `cache_policy`.
+            False disables caching headers.
+        :type cache: :class:`CachePolicy` or dict
+        :param timeout: seconds the resource has to respond, or a dict of
+            HTTP method to seconds.  The earlier of it and the request's
+            :attr:`deadline_header` is the deadline, after which the client
+            gets a 504.  Methods with a timeout run on the
+            :attr:`timeout_executor`, coroutine methods are cancelled.
+            Methods decorated with :func:`bulk` stream their request and
+            response so cannot have one.  See :func:`current_deadline`.
+        :type timeout: float or dict
+        :param idempotent: HTTP methods whose requests with an
+            `Idempotency-Key` header are run once.  The response is kept in
+            :attr:`idempotency` and replayed for retries with the same key,
+            concurrent retries wait for the first.  Reusing a key for a
+            different body is a 422.
+        :type idempotent: sequence
+        :param response: :class:`ApiResponse` of this resource, replacing
+            the Api's, for example a :class:`NDJSONResponse` for exports
+        :type response: :class:`ApiResponse`
+        :param delta: give GET responses an ETag and answer clients
+            sending `A-IM: json-patch` with the `If-None-Match` of a
+            version still in :attr:`deltas` with a 226 JSON Patch, when
+            smaller than the body
+        :type delta: bool
+        :param schemas: JSON Schema of the request body by HTTP method,
+            see :func:`compile_schema`.  Invalid bodies get a 400 before
+            the resource is created.
+        :type schemas: dict
+        :param openapi: OpenAPI operation fields by HTTP method, added to
+            those of the document, see :meth:`Api.openapi`
+        :type openapi: dict
+        :param version: with `Api(versions=...)`, use this resource for
+            the endpoint in one version only, the urls may be omitted
+            when the endpoint is already registered
+        :type version: str
 
         Additional keyword arguments not specified above will be passed as-is
         to :meth:`flask.Flask.add_url_rule`.
@@ -211,10 +2484,17 @@ class Api(object):
         >>> Foo.url_for()
         '/foo'
         """
+        if kwargs.get('deferred') and self.job_resource is None:
+            self.job_resource = type('JobStatus', (JobStatus,), {'api': self})
+            self.add_resource(self.job_resource, self.jobs_url,
+                              endpoint='job_status')
+
         if self.app is not None:
+            endpoint = kwargs.get('endpoint') or resource.__name__.lower()
             self._register_view(self.app, resource, *urls, **kwargs)
+            self._auto_warmup((endpoint,))
         else:
-            self.resources.append((resource, urls, kwargs))
+            self.resources.append(_Registration.of(resource, urls, kwargs))
 
     def _register_view(self, app, resource, *urls, **kwargs):
         """Bind resources to the app.
@@ -246,11 +2526,18 @@ class Api(object):
 
         if not hasattr(resource, 'endpoint'):  # Don't replace existing endpoint
             resource.endpoint = endpoint
-        resource_func = self.output(resource.as_view(endpoint))
-
-        for decorator in chain(kwargs.pop('decorators', ()), self.decorators):
-            resource_func = decorator(resource_func)
-
+        version = kwargs.pop('version', None)
+        self._openapi = None
+        if self.versions:
+            return self._register_version(app, resource, endpoint, version, urls, kwargs)
+        if version is not None:
+            raise ValueError('Api has no versions, {!r} given.'.format(version))
+        self.registry[endpoint] = _Registration.of(resource, urls, kwargs)
+        resource_func = self._make_view(resource, endpoint, kwargs)
+        self._add_rules(app, urls, resource_func, kwargs)
+
+    def _add_rules(self, app, urls, resource_func, kwargs):
+        """Add the url rules of a view to the app or blueprint."""
         for url in urls:
             rule = self._make_url(url, self.blueprint.url_prefix if self.blueprint else None)
 
@@ -275,6 +2562,260 @@ class Api(object):
             # Add the url to the application or blueprint
             app.add_url_rule(rule, view_func=resource_func, **kwargs)
 
+    def _make_view(self, resource, endpoint, kwargs):
+        """Return the fully decorated view function of `resource`.
+
+        The options handled here are popped from `kwargs`, leaving those
+        for :meth:`flask.Flask.add_url_rule`.
+        """
+        deferred = frozenset(_.upper() for _ in kwargs.pop('deferred', ())) or ()
+        cache = self._cache_policies(kwargs.pop('cache', None))
+        timeout = kwargs.pop('timeout', None)
+        if timeout is not None and not isinstance(timeout, dict):
+            timeout = dict.fromkeys(resource.methods or ('GET',), timeout)
+        timeouts = dict((k.upper(), v) for k, v in (timeout or {}).items()) or None
+        streamed = sorted(method for method in timeouts or ()
+                          if getattr(getattr(resource, method.lower(), None), 'bulk', False))
+        if streamed:
+            raise ValueError('Bulk methods cannot have a timeout: {}.'.format(
+                ', '.join(streamed)))
+        idempotent = frozenset(_.upper() for _ in kwargs.pop('idempotent', ())) or ()
+        kwargs.pop('openapi', None)
+        validators = dict((method.upper(), compile_schema(schema))
+                          for method, schema in kwargs.pop('schemas', {}).items()) or None
+        resource_func = self.output(resource.as_view(endpoint), deferred, cache,
+                                    timeouts, idempotent,
+                                    kwargs.pop('response', None),
+                                    kwargs.pop('delta', False), validators)
+
+        tracer = self.tracer
+        for decorator in chain(kwargs.pop('decorators', ()), self.decorators):
+            resource_func = decorator(resource_func)
+            if tracer is not None:
+                resource_func = _Traced(tracer, resource_func, getattr(
+                    decorator, '__name__', type(decorator).__name__))
+        if self.handle_errors or self.slow_log is not None:
+            resource_func = _Guard(self, resource_func, endpoint)
+        if tracer is not None:
+            resource_func = _Traced(tracer, resource_func, endpoint, root=True)
+        return resource_func
+
+    @staticmethod
+    def _methods(resource, kwargs):
+        """HTTP methods the url rules of `resource` accept."""
+        methods = set(_.upper() for _ in kwargs.get('methods') or
+                      getattr(resource, 'methods', None) or ('GET',))
+        if 'GET' in methods:
+            methods.add('HEAD')
+        return methods
+
+    def _rule_endpoint(self, endpoint):
+        """Endpoint of the url rules in the app."""
+        return '%s.%s' % (self.blueprint.name, endpoint) if self.blueprint else endpoint
+
+    def _register_version(self, app, resource, endpoint, version, urls, kwargs):
+        """Bind `resource` to `endpoint` for one or every version.
+
+        Every version of an endpoint shares its url rules and a dispatching
+        view function, which picks the view of the requested version and
+        falls back to the one registered without a version.  Urls of an
+        override are only used when the endpoint has no rules yet, they
+        then only match that version.
+        """
+        if version is not None and version not in self.versions:
+            raise ValueError('Unknown version {!r}.'.format(version))
+        self.registry[endpoint if version is None else (endpoint, version)] = (
+            _Registration.of(resource, urls, kwargs))
+        views = self._version_views.setdefault(endpoint, {})
+        new = not views or (version is None and None not in views)
+        view = self._make_view(resource, endpoint, kwargs)
+        methods = self._methods(resource, kwargs)
+        views[version] = (view, methods)
+        if new:
+            dispatch = self._dispatchers.get(endpoint)
+            if dispatch is None:
+                dispatch = self._dispatchers[endpoint] = self._dispatcher(endpoint, views)
+            dispatch.methods |= methods
+            segment = '/<any(%s):api_version>' % ', '.join(
+                self.versions if version is None else (version,))
+            self._endpoint_versions[endpoint] = (
+                self.versions if version is None else
+                self._endpoint_versions.get(endpoint, ()) + (version,))
+            self._add_rules(app, [segment + _ for _ in urls], dispatch, kwargs)
+        else:
+            self._dispatchers[endpoint].methods |= methods
+            self._widen_rules(endpoint, methods)
+
+    def _dispatcher(self, endpoint, views):
+        """Return the view function dispatching to the requested version."""
+        def dispatch(*args, **kwargs):
+            version = flask.g.api_version = kwargs.pop('api_version')
+            view, methods = views.get(version) or views[None]
+            if flask.request.method not in methods:
+                raise MethodNotAllowed(sorted(methods))
+            return view(*args, **kwargs)
+
+        dispatch.__name__ = str(endpoint)
+        dispatch.methods = set()
+        return dispatch
+
+    def _widen_rules(self, endpoint, methods):
+        """Let the bound url rules of `endpoint` accept `methods` too."""
+        rules = []
+        if self._flask_app is not None:
+            rules = list(self._flask_app.url_map.iter_rules(self._rule_endpoint(endpoint)))
+        for rule in rules:
+            rule.methods = rule.methods | methods
+        return rules
+
+    def _version_defaults(self, endpoint, values):
+        """Default `api_version` for :func:`flask.url_for`.
+
+        The version of the current request, when the endpoint has it,
+        otherwise the latest version of the endpoint.
+        """
+        if self.blueprint:
+            prefix = self.blueprint.name + '.'
+            if not endpoint or not endpoint.startswith(prefix):
+                return
+            endpoint = endpoint[len(prefix):]
+        versions = self._endpoint_versions.get(endpoint)
+        if not versions or 'api_version' in values:
+            return
+        version = getattr(flask.g, 'api_version', None)
+        values['api_version'] = version if version in versions else versions[-1]
+
+    def replace_resource(self, endpoint, resource=None, decorators=None,
+                         version=None):
+        """Swap the resource class or decorators of an endpoint at runtime.
+
+        The new view function is built as :meth:`add_resource` would with
+        the original options and replaces the old one in the app's
+        `view_functions` in one assignment.  Requests already dispatched
+        finish with the old view, later ones get the new.  The url rules
+        are widened to both sets of methods during the swap, so no request
+        reaches a view lacking its method.  Caches and other state of the
+        Api and app are kept.
+
+        :param endpoint: endpoint given to :meth:`add_resource`
+        :param resource: new :class:`Resource` class, defaults to the current
+        :param decorators: new decorators for this resource, replacing the
+            ones given to :meth:`add_resource`, the Api's are still applied
+        :type decorators: sequence
+        :param version: replace the override of this version of a
+            versioned Api, a missing override is added
+        """
+        with self._reload_lock:
+            key = endpoint if version is None else (endpoint, version)
+            if key not in self.registry:
+                if version is None or endpoint not in self._version_views:
+                    raise ValueError('Endpoint {!r} is not registered.'.format(endpoint))
+                key = endpoint
+            if self._flask_app is None:
+                raise ValueError('Api is not bound to an app yet, use add_resource.')
+            current, urls, options = self.registry[key]
+            resource = resource or current
+            options = dict(options)
+            if decorators is not None:
+                options['decorators'] = decorators
+            if not hasattr(resource, 'endpoint'):
+                resource.endpoint = endpoint
+            kwargs = dict(options)
+            view = self._make_view(resource, endpoint, kwargs)
+            methods = self._methods(resource, kwargs)
+
+            if self.versions:
+                self._dispatchers[endpoint].methods |= methods
+                self._widen_rules(endpoint, methods)
+                self._version_views[endpoint][version] = (view, methods)
+            else:
+                rules = self._widen_rules(endpoint, methods)
+                self._flask_app.view_functions[self._rule_endpoint(endpoint)] = view
+                for rule in rules:
+                    rule.methods = methods | (rule.methods & set(['OPTIONS']))
+            self.registry[endpoint if version is None else (endpoint, version)] = (
+                _Registration.of(resource, urls, options))
+            self._openapi = None
+            return view
+
+    def openapi(self):
+        """Return the OpenAPI 3 document of the registered resources.
+
+        Paths come from the url rules as registered, operations from the
+        methods of each :class:`Resource` with the first line of their
+        docstring as summary and the rest as description.  The `openapi`
+        option of :meth:`add_resource` adds or overrides operation fields.
+        An endpoint whose versions differ is documented under the path of
+        each version, so every operation is only listed where it is served.
+        """
+        url_prefix = None
+        if self.blueprint is not None:
+            url_prefix = (self.blueprint_setup.url_prefix if self.blueprint_setup
+                          else self.blueprint.url_prefix)
+        paths = {}
+        endpoints = set(key[0] if isinstance(key, tuple) else key for key in self.registry)
+        for endpoint in sorted(endpoints):
+            if endpoint == 'openapi':
+                continue
+            base = self.registry.get(endpoint)
+            if not self.versions:
+                urls, variants = base.urls, [('', '', base)]
+            else:
+                versions = self._endpoint_versions.get(endpoint, self.versions)
+                urls = (base or self.registry[(endpoint, versions[0])]).urls
+                registrations = [self.registry.get((endpoint, _), base) for _ in versions]
+                if all(_ is registrations[0] for _ in registrations):
+                    variants = [('/<any(%s):api_version>' % ', '.join(versions), '',
+                                 registrations[0])]
+                else:
+                    variants = [('/' + version, version + '_', registration)
+                                for version, registration in zip(versions, registrations)]
+            for segment, prefix, registration in variants:
+                for url in urls:
+                    path, parameters = _openapi_path(self._make_url(segment + url, url_prefix))
+                    self._openapi_operations(paths.setdefault(path, {}), endpoint + '_' + prefix,
+                                             registration, parameters)
+        return {'openapi': '3.0.3', 'info': self.openapi_info, 'paths': paths}
+
+    @staticmethod
+    def _openapi_operations(item, operation_id, registration, parameters):
+        """Add the operations of a registered resource to a path `item`."""
+        resource, options = registration.resource, registration.options
+        deferred = set(_.upper() for _ in options.get('deferred', ()))
+        extra = dict((k.lower(), v) for k, v in options.get('openapi', {}).items())
+        schemas = dict((k.lower(), v) for k, v in options.get('schemas', {}).items())
+        for method in sorted(getattr(resource, 'methods', None) or ('GET',)):
+            method = method.lower()
+            if method in item:
+                continue
+            operation = {'operationId': operation_id + method,
+                         'responses': {'202' if method.upper() in deferred
+                                       else '200': {'description': 'OK'}}}
+            doc = getattr(getattr(resource, method, None), '__doc__', None)
+            if doc:
+                lines = doc.strip().split('\n', 1)
+                operation['summary'] = lines[0].strip()
+                if len(lines) > 1 and lines[1].strip():
+                    operation['description'] = lines[1].strip()
+            if parameters:
+                operation['parameters'] = parameters
+            if method in schemas:
+                operation['requestBody'] = {'required': True, 'content': {
+                    'application/json': {'schema': schemas[method]}}}
+            operation.update(extra.get(method, {}))
+            item[method] = operation
+
+    def openapi_body(self):
+        """Return the encoded :meth:`openapi` document and its ETag.
+
+        Both are kept until a resource is added or replaced.
+        """
+        cached = self._openapi
+        if cached is None:
+            body = dumps(self.openapi(), sort_keys=True).encode('utf-8')
+            cached = self._openapi = (body, hashlib.sha1(body).hexdigest())
+        return cached
+
     @staticmethod
     def _add_url_rule_patch(blueprint_setup, rule, endpoint=None, view_func=None, **options):
         """Patch BlueprintSetupState.add_url_rule for delayed creation.
@@ -303,21 +2844,522 @@ class Api(object):
         blueprint_setup.app.add_url_rule(rule, '%s.%s' % (blueprint_setup.blueprint.name, endpoint),
                                          view_func, defaults=defaults, **options)
 
-    def output(self, resource):
+    def _cache_policies(self, cache):
+        """Normalize the `cache` of :meth:`add_resource` to method: policy."""
+        if cache is None:
+            cache = self.cache_policy
+        if not cache:
+            return None
+        if isinstance(cache, CachePolicy):
+            cache = {'GET': cache}
+        policies = dict((method.upper(), policy)
+                        for method, policy in cache.items() if policy)
+        if 'GET' in policies:
+            policies.setdefault('HEAD', policies['GET'])
+        return policies
+
+    def output(self, resource, deferred=(), cache=None, timeouts=None,
+               idempotent=(), response=None, delta=False, validators=None):
         """Wrap a resource (as a flask view function).
 
         This is for cases where the resource does not directly return
         a response object. Now everything should be a Response object.
+        The wrapper is a :class:`_Dispatch` keeping the options, empty
+        ones are not kept.
 
         :param resource: The resource as a flask view function
+        :param deferred: HTTP methods handed to :meth:`defer`
+        :type deferred: set
+        :param cache: :class:`CachePolicy` by HTTP method
+        :type cache: dict
+        :param timeouts: seconds by HTTP method
+        :type timeouts: dict
+        :param idempotent: HTTP methods honoring `Idempotency-Key`
+        :type idempotent: set
+        :param response: responder replacing the Api's :attr:`responder`
+        :type response: :class:`ApiResponse`
+        :param delta: send JSON Patch deltas of GET responses
+        :type delta: bool
+        :param validators: request body validators by HTTP method, from
+            :func:`compile_schema`
+        :type validators: dict
         """
-        @wraps(resource)
-        def wrapper(*args, **kwargs):
-            rv = resource(*args, **kwargs)
-            rv = self.responder(rv)
+        cached = ()
+        if self.response_cache is not None or (
+                self.tenants is not None and self.tenants.cache_size):
+            cached = frozenset(method for method, policy in (cache or {}).items()
+                               if policy.ttl)
+        view_class = getattr(resource, 'view_class', None)
+        coroutines = ()
+        if isinstance(view_class, type):
+            coroutines = frozenset(
+                method for method in getattr(view_class, 'methods', None) or ()
+                if iscoroutinefunction(getattr(view_class, method.lower(), None))) or ()
+        return _Dispatch(self, resource, deferred, cache, cached, timeouts,
+                         coroutines, idempotent, response, delta, validators)
+
+    @staticmethod
+    def _validate(validator):
+        """Return the error of the request body or None when valid."""
+        data = flask.request.get_json(force=True, silent=True)
+        if data is None and flask.request.get_data() != b'null':
+            return 'body must be JSON'
+        return validator(data)
+
+    def _delta(self, response):
+        """Tag a full response and answer with a delta when it is smaller.
+
+        The body is kept in :attr:`deltas` under its ETag.  A client with
+        the current version gets a 304.  One asking for `json-patch` in
+        `A-IM` with the ETag of a kept version gets a 226 IM Used with the
+        patch from that version, RFC 3229 and RFC 6902.
+        """
+        if (not isinstance(response, ResponseBase) or response.status_code != 200
+                or response.is_streamed or 'Content-Encoding' in response.headers):
+            return response
+        request = flask.request
+        body = response.get_data()
+        etag = hashlib.sha1(body).hexdigest()
+        response.set_etag(etag)
+        held = request.if_none_match
+        if etag in held:
+            rv = flask.current_app.response_class(status=304)
+            for name in ('ETag', 'Cache-Control', 'Vary'):
+                if name in response.headers:
+                    rv.headers[name] = response.headers[name]
+            return rv
+        self.deltas.set(etag, body)
+        wanted = request.headers.get('A-IM', '')
+        if not held or 'json-patch' not in [_.strip() for _ in wanted.split(',')]:
+            return response
+        for base in held.as_set():
+            old = self.deltas.get(base)
+            if old is None:
+                continue
+            patch = dumps(json_patch(loads(old), loads(body)), separators=(',', ':'))
+            if len(patch) >= len(body):
+                break
+            rv = flask.current_app.response_class(
+                patch, 226, {'Content-Type': 'application/json-patch+json'})
+            rv.set_etag(etag)
+            rv.headers['IM'] = 'json-patch'
+            rv.headers['Delta-Base'] = '"%s"' % base
             return rv
+        return response
+
+    def _idempotent(self, key, view, args, kwargs, timeout=None):
+        """Run `view` once for an `Idempotency-Key` and replay its response.
+
+        Keys are scoped to the tenant, the caller given by
+        :attr:`idempotency_scope`, method and path.  Requests with a key seen
+        before get the stored response, or a 422 when their body differs.
+        Duplicates in this process wait for the first to finish; the ones
+        in other processes sharing the store get a 409 meanwhile, for at
+        most the resource's `timeout` or :attr:`idempotency_pending`
+        seconds so a worker dying mid-request does not block the key.
+        Responses over 499 are not kept so the request can be retried.
+        """
+        request = flask.request
+        scoped = '%s %s %s' % (request.method, request.path, key)
+        if self.idempotency_scope is not None:
+            scoped = '%s|%s' % (self.idempotency_scope(), scoped)
+        tenant = self._tenant()
+        if tenant is not None:
+            scoped = '%s|%s' % (tenant, scoped)
+        fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+        store = self.idempotency
+        lock = self._idempotency_locks.acquire(scoped)
+        try:
+            entry = store.get(scoped)
+            if entry is None:
+                store.set(scoped, (fingerprint, None),
+                          timeout if timeout is not None else self.idempotency_pending)
+                try:
+                    rv = view(*args, **kwargs)
+                except Exception:
+                    store.delete(scoped)
+                    raise
+                if (isinstance(rv, ResponseBase) and rv.status_code < 500
+                        and not rv.is_streamed):
+                    headers = [(k, v) for k, v in rv.headers
+                               if k not in ('Content-Length', 'Server-Timing', 'Set-Cookie')]
+                    store.set(scoped, (fingerprint, (rv.status_code, headers,
+                                                     rv.get_data())))
+                else:
+                    store.delete(scoped)
+                return rv
+        finally:
+            self._idempotency_locks.release(scoped, lock)
+        saved_fingerprint, saved = entry
+        if saved_fingerprint != fingerprint:
+            return self.responder.pack(
+                {'error': 'Idempotency-Key was used for a different request'}, 422)
+        if saved is None:
+            return self.responder.pack(
+                {'error': 'A request with this Idempotency-Key is in progress'},
+                409, {'Retry-After': '1'})
+        status, headers, body = saved
+        rv = flask.current_app.response_class(body, status, headers)
+        rv.headers['Idempotent-Replayed'] = 'true'
+        return rv
 
-        return wrapper
+    def cache_key(self, policy):
+        """Key of the current request in the :attr:`response_cache`.
+
+        :param policy: the policy of the request, its `vary` headers
+            are part of the key
+        :type policy: :class:`CachePolicy`
+        """
+        key = flask.request.url
+        tenant = self._tenant()
+        if tenant is not None:
+            key = '%s|%s' % (tenant, key)
+        if policy.vary_headers:
+            headers = flask.request.headers
+            key += '|' + '|'.join(headers.get(_, '') for _ in policy.vary_headers)
+        return key
+
+    def _cached(self, key, timing):
+        """Response for `key` from the :attr:`response_cache` or None."""
+        if timing is not None:
+            start = _perf_counter()
+        entry = self._cache_store().get(key)
+        if timing is not None:
+            timing.add('cache', _perf_counter() - start)
+        if entry is None:
+            return None
+        status, headers, body = entry
+        if isinstance(body, Variants):
+            rv = body.response(status, headers)
+        else:
+            rv = flask.current_app.response_class(body, status, headers)
+        if timing is not None:
+            self.responder.add_timing(rv, timing)
+        return rv
+
+    def _cache(self, key, response, ttl):
+        """Keep a plain 200 response in the :attr:`response_cache`.
+
+        With a precompressing responder the stored body is a
+        :class:`Variants` and the returned response is the variant the
+        request accepts.
+        """
+        if (not isinstance(response, ResponseBase) or response.status_code != 200
+                or response.is_streamed or 'Set-Cookie' in response.headers
+                or 'Content-Encoding' in response.headers):
+            return response
+        headers = [(k, v) for k, v in response.headers
+                   if k not in ('Content-Length', 'Server-Timing')]
+        body = response.get_data()
+        if self.responder.precompress:
+            body = Variants(body)
+            rv = body.response(200, headers)
+            if 'Server-Timing' in response.headers:
+                rv.headers['Server-Timing'] = response.headers['Server-Timing']
+            response = rv
+        self._cache_store().set(key, (200, headers, body), ttl)
+        return response
+
+    def _tenant(self):
+        """The tenant of the current request when the Api has :attr:`tenants`."""
+        return current_tenant() if self.tenants is not None else None
+
+    def _cache_store(self):
+        """The response cache of the current request's tenant."""
+        tenants = self.tenants
+        if tenants is not None and tenants.cache_size:
+            tenant = self._tenant()
+            if tenant is not None or self.response_cache is None:
+                return tenants.cache(tenant)
+        return self.response_cache
+
+    def memory_report(self):
+        """Return the bytes each registered resource takes, roughly.
+
+        For every key of :attr:`registry` the bytes of its registration
+        record, of the view functions made for it with their closures and
+        options, and of its url rules.  Objects shared by resources are
+        counted with the first one, classes, the app, the Api and its
+        responder are not counted.
+
+        :return: dict of 'resources', by registry key a dict of 'record',
+            'view', 'rules' and their 'total', and the 'total' of all
+        """
+        app = self._flask_app
+        seen = set([id(self), id(self.responder), id(self.tracer), id(_NO_OPTIONS),
+                    id(app)])
+        if app is not None:
+            seen.update((id(app.url_map), id(app.view_functions)))
+        resources = {}
+        for key in sorted(self.registry, key=str):
+            endpoint, version = key if isinstance(key, tuple) else (key, None)
+            views, rules = [], []
+            if self.versions:
+                views.append(self._version_views.get(endpoint, {}).get(version, (None,))[0])
+                if version is None:
+                    views.append(self._dispatchers.get(endpoint))
+            elif app is not None:
+                views.append(app.view_functions.get(self._rule_endpoint(endpoint)))
+            if app is not None and version is None:
+                try:
+                    rules = list(app.url_map.iter_rules(self._rule_endpoint(endpoint)))
+                except KeyError:
+                    pass
+            report = {'record': _footprint(self.registry[key], seen),
+                      'view': sum(_footprint(view, seen) for view in views),
+                      'rules': sum(_footprint(rule, seen) for rule in rules)}
+            report['total'] = sum(report.values())
+            resources[key] = report
+        return {'resources': resources,
+                'total': sum(_['total'] for _ in resources.values())}
+
+    def cache_memory(self):
+        """Return the bytes of cached bodies per encoding and the entries.
+
+        Bodies stored without :class:`Variants` count as 'identity'.  The
+        per tenant caches of :attr:`tenants` are included, stores without
+        an `items` method are skipped.
+        """
+        stores = [self.response_cache]
+        if self.tenants is not None:
+            with self.tenants._lock:
+                stores.extend(state.cache for state in self.tenants._tenants.values())
+        report = {'entries': 0, 'identity': 0}
+        for store in stores:
+            if not hasattr(store, 'items'):
+                continue
+            for key, (status, headers, body) in store.items():
+                report['entries'] += 1
+                sizes = body.memory() if isinstance(body, Variants) else {'identity': len(body)}
+                for name, size in sizes.items():
+                    report[name] = report.get(name, 0) + size
+        return report
+
+    def warmup(self, manifest=None):
+        """Run the requests of a warm-up manifest through the app.
+
+        An entry is an endpoint or a tuple of the endpoint, its url values
+        and request headers; values not in the url rule go in the query
+        string.  Each request is dispatched in a request context with the
+        app's before and after request functions, so response caches fill
+        and lazy imports, serializers and connections are ready before the
+        first client arrives.  Call it from the server's post fork hook to
+        warm every worker, timings are logged to `flask_resteasy.warmup`.
+
+        :param manifest: the entries, defaults to :attr:`warmup_manifest`
+        :type manifest: list
+        :return: a dict per entry with the endpoint, url, status and
+            seconds, the status is None when the request raised
+        """
+        app = self._flask_app
+        if app is None:
+            raise ValueError('Api is not bound to an app yet.')
+        logger = logging.getLogger('flask_resteasy.warmup')
+        results = []
+        started = _perf_counter()
+        for entry in self.warmup_manifest if manifest is None else manifest:
+            endpoint, values, headers = _warmup_entry(entry)
+            url, status, start = None, None, _perf_counter()
+            try:
+                with app.test_request_context(headers=headers):
+                    url = flask.url_for(self._rule_endpoint(endpoint), **values)
+                with app.test_request_context(url, headers=headers):
+                    try:
+                        rv = app.preprocess_request()
+                        if rv is None:
+                            rv = app.dispatch_request()
+                    except Exception as err:
+                        rv = app.handle_user_exception(err)
+                    response = app.process_response(app.make_response(rv))
+                    status = response.status_code
+                    response.close()
+            except Exception:
+                logger.exception('Warm-up of %s failed', url or endpoint)
+            seconds = _perf_counter() - start
+            logger.info('Warm-up GET %s %s in %.1f ms', url or endpoint, status,
+                        seconds * 1000)
+            results.append({'endpoint': endpoint, 'url': url, 'status': status,
+                            'seconds': seconds})
+        if results:
+            logger.info('Warmed %d urls in %.1f ms', len(results),
+                        (_perf_counter() - started) * 1000)
+        return results
+
+    def _auto_warmup(self, endpoints):
+        """Warm the manifest entries of newly registered `endpoints`."""
+        if self.warmup_manifest and self._flask_app is not None:
+            entries = [entry for entry in self.warmup_manifest
+                       if _warmup_entry(entry)[0] in endpoints]
+            if entries:
+                self.warmup(entries)
+
+    def _deadline(self, budget):
+        """Return the deadline of the request in epoch seconds or None.
+
+        :param budget: seconds the resource has, if limited
+        """
+        deadline = None
+        if self.deadline_header is not None:
+            value = flask.request.headers.get(self.deadline_header)
+            if value:
+                try:
+                    deadline = float(value)
+                except ValueError:
+                    pass
+        if budget is not None:
+            local = time.time() + budget
+            deadline = local if deadline is None else min(deadline, local)
+        if deadline is not None:
+            flask.g._resteasy_deadline = deadline
+        return deadline
+
+    def _call(self, view, args, kwargs, deadline, coroutine):
+        """Call `view` and give up at `deadline` with a 504 response.
+
+        Coroutines run in an event loop of their own and are cancelled.
+        Other views run on the :attr:`timeout_executor` with a copy of the request
+        context, what they store on :data:`flask.g` is copied back when they
+        return in time; a timed out call that already started keeps its
+        thread until it returns, see :func:`check_deadline`.
+        """
+        remaining = None if deadline is None else deadline - time.time()
+        if remaining is not None and remaining <= 0:
+            return self._timeout()
+        if coroutine:
+            try:
+                return _run_coroutine(view(*args, **kwargs), remaining)
+            except asyncio.TimeoutError:
+                return self._timeout()
+        state = {}
+
+        def run(*args, **kwargs):
+            try:
+                return view(*args, **kwargs)
+            finally:
+                state.update(flask.g.__dict__)
+
+        future = self.timeout_executor.submit(_copy_context(run), *args, **kwargs)
+        try:
+            rv = future.result(remaining)
+        except FutureTimeout:
+            future.cancel()
+            return self._timeout()
+        flask.g.__dict__.update(state)
+        return rv
+
+    def _timeout(self):
+        """The 504 Gateway Timeout response of a request past its deadline."""
+        return self.responder.pack({'error': 'Deadline exceeded'}, 504)
+
+    def _error_code(self, cls):
+        """(status, message) mapped to an exception class in :attr:`errors`."""
+        try:
+            return self._error_codes[cls]
+        except KeyError:
+            pass
+        mapped = None
+        for base in cls.__mro__:
+            if base in self.errors:
+                mapped = self.errors[base]
+                if not isinstance(mapped, tuple):
+                    mapped = (mapped, HTTP_STATUS_CODES.get(mapped, 'Error'))
+                break
+        self._error_codes[cls] = mapped
+        return mapped
+
+    def handle_error(self, error):
+        """Return the response of the Api's responder for an exception.
+
+        HTTP exceptions keep their status, description and headers such as
+        `Allow`.  Others are looked up by class in :attr:`errors` and are a
+        logged 500 Internal Server Error when not found.  The body is
+        `{'error': message}`, encoded once and reused for errors of
+        :attr:`static_errors` with their default message, so floods of
+        the same error cost no encoding.
+
+        Also usable for errors raised before a resource is reached::
+
+            app.register_error_handler(404, api.handle_error)
+        """
+        headers = []
+        if isinstance(error, HTTPException):
+            if error.response is not None:
+                return error.response
+            code, message = error.code, error.description
+            static = message == type(error).description
+            headers = [(k, v) for k, v in error.get_headers()
+                       if k.lower() != 'content-type']
+        else:
+            mapped = self._error_code(type(error))
+            if mapped is None:
+                flask.current_app.log_exception(sys.exc_info())
+                mapped = (500, HTTP_STATUS_CODES[500])
+            code, message = mapped
+            static = True
+        if not static or code not in self.static_errors:
+            return self.responder.pack({'error': message}, code, headers)
+        key = (code, message)
+        cached = self._error_bodies.get(key)
+        if cached is None:
+            rv = self.responder.pack({'error': message}, code)
+            cached = self._error_bodies[key] = (rv.get_data(), rv.headers['Content-Type'])
+        body, content_type = cached
+        rv = flask.current_app.response_class(body, code, headers)
+        rv.headers['Content-Type'] = content_type
+        return rv
+
+    @property
+    def executor(self):
+        """Executor running deferred resource methods."""
+        if self._executor is None:
+            if ThreadPoolExecutor is None:
+                raise RuntimeError('Deferred resources need an executor.')
+            self._executor = ThreadPoolExecutor(max_workers=4)
+        return self._executor
+
+    @property
+    def timeout_executor(self):
+        """Executor running resource methods that have a timeout.
+
+        Kept apart from :attr:`executor` so long deferred jobs never hold
+        the threads of requests waiting on their deadline.
+        """
+        if self._timeout_executor is None:
+            if ThreadPoolExecutor is None:
+                raise RuntimeError('Resources with a timeout need an executor.')
+            self._timeout_executor = ThreadPoolExecutor(max_workers=32)
+        return self._timeout_executor
+
+    def defer(self, view, *args, **kwargs):
+        """Run a view by the :attr:`executor` and respond with 202 Accepted.
+
+        The `Location` header points to the :class:`JobStatus` resource
+        where the result can be polled.  The work runs in a thread with a
+        copy of the request context, so process pools are not supported.
+
+        :param view: a flask view function
+        :return: :class:`~flask.Response`
+        """
+        job_id = uuid.uuid4().hex
+        self.jobs.set(job_id, (JOB_PENDING, None))
+        self.executor.submit(_copy_context(self._run_job), job_id, view,
+                             args, kwargs)
+        location = self.url_for(self.job_resource, job_id=job_id)
+        return self.responder.pack({'job': job_id, 'status': JOB_PENDING},
+                                   202, {'Location': location})
+
+    def _run_job(self, job_id, view, args, kwargs):
+        """Call the view and keep the unpacked result in :attr:`jobs`."""
+        try:
+            rv = view(*args, **kwargs)
+            if not isinstance(rv, ResponseBase):
+                rv = unpack(rv)
+        except Exception:
+            # logged in full, clients polling the job only learn it failed
+            flask.current_app.logger.exception('Deferred job %s failed', job_id)
+            self.jobs.set(job_id, (JOB_FAILED, HTTP_STATUS_CODES[500]))
+        else:
+            self.jobs.set(job_id, (JOB_DONE, rv))
 
     def _make_url(self, url_part, blueprint_prefix):
         """Create URL from blueprint_prefix, api prefix and resource url.
@@ -351,6 +3393,8 @@ class ApiResponse(object):
     """
 
     content_type = None
+    server_timing = False
+    precompress = False
 
     def __call__(self, rv):
         """Return json from given tuple.
@@ -369,6 +3413,259 @@ class ApiResponse(object):
         """
         return self((data, status_code, headers))
 
+    def apply_cache_policy(self, response, policy):
+        """Add the :class:`CachePolicy` headers to a successful response."""
+        if (policy is None or not isinstance(response, ResponseBase) or
+                not 200 <= response.status_code < 300 or
+                'Cache-Control' in response.headers):
+            return response
+        response.headers['Cache-Control'] = policy.cache_control
+        if policy.vary:
+            vary = response.headers.get('Vary')
+            response.headers['Vary'] = vary + ', ' + policy.vary if vary else policy.vary
+        return response
+
+    def freeze(self, data, status_code=200, headers={}, min_size=256):
+        """Encode and compress a static body once.
+
+        Return the :class:`FrozenResponse` from a resource instead of the
+        data, every request then gets a precompressed :class:`Variants`.
+        Needs an application context::
+
+            with app.app_context():
+                HELP = api.responder.freeze({'links': [...]})
+
+            class Help(Resource):
+                def get(self):
+                    return HELP
+        """
+        response = self((data, status_code, headers))
+        headers = [(k, v) for k, v in response.headers if k != 'Content-Length']
+        return FrozenResponse(response.status_code, headers,
+                              Variants(response.get_data(), min_size))
+
+    def start_timing(self):
+        """Return a new :class:`Timing` if this request gets one.
+
+        Set :attr:`server_timing` to True to time every request, or to a
+        callable without arguments deciding per request, for example only
+        for internal addresses.  It is off by default.
+        """
+        allowed = self.server_timing
+        if callable(allowed):
+            allowed = allowed()
+        if not allowed:
+            return None
+        timing = flask.g._resteasy_timing = Timing()
+        return timing
+
+    def add_timing(self, response, timing):
+        """Add the `Server-Timing` header to `response`."""
+        if isinstance(response, ResponseBase) and timing.phases:
+            response.headers['Server-Timing'] = timing.header()
+        return response
+
+
+_PLAIN_TYPES = (type(None), bool, int, float) + tuple(
+    set((str, type(u''), type(b''), type(2 ** 64))))
+
+
+def _isoformat(value):
+    return value.isoformat()
+
+
+class Serializer(object):
+    """Turn model objects into values any JSON encoder takes.
+
+    A converter is compiled the first time a class is seen and reused for
+    every later instance, so lists of thousands of objects are converted
+    in one pass without inspecting each object.  Handled out of the box:
+
+    - dataclasses, namedtuples and classes with `__slots__` become dicts
+      of their public fields
+    - dicts, lists, tuples and sets and their subclasses are walked
+    - datetimes, dates and times become ISO 8601 strings, Decimal and
+      UUID become strings
+
+    Anything else is left for the encoder.
+
+    :param converters: dict of class to a function returning a JSON ready
+        value, overriding the defaults, for example `{Decimal: float}`
+    """
+
+    def __init__(self, converters=None):
+        self._converters = dict.fromkeys(_PLAIN_TYPES)
+        self._converters.update({
+            dict: self._dict, list: self._list, tuple: self._list,
+            set: self._list, frozenset: self._list,
+            datetime.datetime: _isoformat, datetime.date: _isoformat,
+            datetime.time: _isoformat, Decimal: str, uuid.UUID: str,
+        })
+        self._converters.update(converters or {})
+        self._lock = threading.Lock()
+
+    def __call__(self, value):
+        """Return `value` with every model object converted."""
+        convert = self._converters.get(value.__class__, _missing)
+        if convert is _missing:
+            convert = self.compile(value.__class__)
+        return value if convert is None else convert(value)
+
+    def register(self, cls, convert):
+        """Use `convert` for instances of exactly `cls`."""
+        self._converters[cls] = convert
+
+    def compile(self, cls):
+        """Return the converter for `cls`, creating it if needed.
+
+        None is returned for values used as they are.
+        """
+        with self._lock:
+            if cls in self._converters:
+                return self._converters[cls]
+            fields = self._fields(cls)
+            if fields is not None:
+                convert = self._generate(cls, *fields)
+            else:
+                convert = next((self._converters[_] for _ in cls.__mro__[1:-1]
+                                if _ in self._converters), None)
+            self._converters[cls] = convert
+            return convert
+
+    @staticmethod
+    def _fields(cls):
+        """Return (names, how) for the attributes of a model class."""
+        if issubclass(cls, tuple) and hasattr(cls, '_fields'):
+            return cls._fields, 'unpack'
+        if dataclasses is not None and dataclasses.is_dataclass(cls):
+            return [_.name for _ in dataclasses.fields(cls)], 'attr'
+        slots = []
+        for base in cls.__mro__[:-1]:
+            names = base.__dict__.get('__slots__', ())
+            if isinstance(names, str):
+                names = (names,)
+            slots.extend(_ for _ in names
+                         if not _.startswith('_') and _ not in slots)
+        if slots and not issubclass(cls, _PLAIN_TYPES + (dict, list, tuple)):
+            return slots, 'getattr'
+        return None
+
+    def _generate(self, cls, names, how):
+        """Compile a function building the dict for instances of `cls`.
+
+        Each value is passed as is when its class is plain and through the
+        serializer otherwise.
+        """
+        lines = ['def convert(obj):']
+        if how == 'unpack' and names:
+            lines.append('    %s, = obj' % ', '.join('v%d' % i for i in range(len(names))))
+        for i, name in enumerate(names):
+            if how == 'attr':
+                lines.append('    v%d = obj.%s' % (i, name))
+            elif how == 'getattr':
+                lines.append('    v%d = getattr(obj, %r, None)' % (i, name))
+        items = ['%r: v%d if v%d.__class__ in plain else serialize(v%d)'
+                 % (name, i, i, i) for i, name in enumerate(names)]
+        lines.append('    return {%s}' % ', '.join(items))
+        namespace = {'plain': frozenset(_PLAIN_TYPES), 'serialize': self}
+        code = compile('\n'.join(lines), '<serializer %s>' % cls.__name__, 'exec')
+        exec(code, namespace)
+        return namespace['convert']
+
+    def _dict(self, value):
+        plain = _PLAIN_TYPES
+        return dict((k, v if v.__class__ in plain else self(v))
+                    for k, v in value.items())
+
+    def _list(self, values):
+        converters = self._converters
+        result = []
+        append = result.append
+        last = convert = None
+        for value in values:
+            cls = value.__class__
+            if cls is not last:
+                last = cls
+                convert = converters.get(cls, _missing)
+                if convert is _missing:
+                    convert = self.compile(cls)
+            append(value if convert is None else convert(value))
+        return result
+
+
+class Variants(object):
+    """A response body with its precompressed encodings.
+
+    The body is compressed once with gzip, and brotli when the `brotli`
+    package is installed.  Encodings not smaller than the body, and all of
+    them for bodies under `min_size` bytes, are dropped.  Serving a variant
+    only compares the request's `Accept-Encoding` qualities.
+    """
+
+    __slots__ = ('identity', 'gzip', 'br')
+
+    def __init__(self, body, min_size=256, level=6):
+        self.identity = body
+        self.gzip = self.br = None
+        if len(body) < min_size:
+            return
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        compressed = compressor.compress(body) + compressor.flush()
+        if len(compressed) < len(body):
+            self.gzip = compressed
+        if brotli is not None:
+            compressed = brotli.compress(body)
+            if len(compressed) < len(body):
+                self.br = compressed
+
+    def __getstate__(self):
+        return self.identity, self.gzip, self.br
+
+    def __setstate__(self, state):
+        self.identity, self.gzip, self.br = state
+
+    def choose(self, accept):
+        """Return (encoding, body) best matching `accept`.
+
+        :param accept: the request's :attr:`~werkzeug.wrappers.Request.accept_encodings`
+        """
+        encoding, body, best = 'identity', self.identity, 0
+        for name in ('br', 'gzip'):
+            data = getattr(self, name)
+            if data is not None and accept[name] > best:
+                encoding, body, best = name, data, accept[name]
+        return encoding, body
+
+    def memory(self):
+        """Return the bytes used by each variant."""
+        return dict((name, len(getattr(self, name))) for name in self.__slots__
+                    if getattr(self, name) is not None)
+
+    def response(self, status=200, headers=()):
+        """Return a response with the variant the request accepts."""
+        encoding, body = self.choose(flask.request.accept_encodings)
+        rv = flask.current_app.response_class(body, status, headers)
+        if self.gzip is not None or self.br is not None:
+            rv.vary.add('Accept-Encoding')
+            if encoding != 'identity':
+                rv.headers['Content-Encoding'] = encoding
+        return rv
+
+
+class FrozenResponse(object):
+    """A response encoded and compressed once, see :meth:`ApiResponse.freeze`."""
+
+    __slots__ = ('status', 'headers', 'variants')
+
+    def __init__(self, status, headers, variants):
+        self.status = status
+        self.headers = headers
+        self.variants = variants
+
+    def __call__(self):
+        """Return the response for the current request."""
+        return self.variants.response(self.status, self.headers)
+
 
 class JSONResponse(ApiResponse):
     """JSON response creator."""
@@ -376,17 +3673,32 @@ class JSONResponse(ApiResponse):
     autocorrect_location_header = False
     content_type = 'application/json'
 
-    def __init__(self, encoder=None, **kwargs):
+    def __init__(self, encoder=None, server_timing=False, serializer=None,
+                 precompress=False, **kwargs):
         """Create a JSON response maker.
 
         :param encoder: JSON encoder, defaults to meth:`json.dumps`
+        :param server_timing: see :meth:`ApiResponse.start_timing`
+        :param serializer: callable converting the data before encoding,
+            usually a :class:`Serializer`
+        :param precompress: keep :class:`Variants` of the bodies stored
+            in the :attr:`Api.response_cache`
         Any other arguments are passed directly to `encoder`
         """
+        self.server_timing = server_timing
+        self.precompress = precompress
+        self.serializer = serializer
         if encoder is None:
             encoder = dumps
         self.json_settings = kwargs
         self._encoder = encoder
 
+    def encode(self, data):
+        """Return `data` encoded by the encoder with the json settings."""
+        if self.serializer is not None:
+            data = self.serializer(data)
+        return self._encoder(data, **self.json_settings)
+
     def __call__(self, rv):
         """Return json response from given tuple.
 
@@ -396,8 +3708,322 @@ class JSONResponse(ApiResponse):
         """
         if isinstance(rv, ResponseBase):
             return rv
+        if isinstance(rv, FrozenResponse):
+            return rv()
         data, status, headers = unpack(rv)
-        resp = flask.make_response(self._encoder(data, **self.json_settings),
+        resp = flask.make_response(self.encode(data),
                                    status, {'Content-Type': self.content_type})
         resp.headers.extend(headers)
         return resp
+
+
+def _ndjson_body(records, encode, serializer, batch_size, flush_size):
+    """Yield JSON lines of `records` in chunks of about `flush_size` bytes.
+
+    Records are pulled `batch_size` at a time, only when the server asks
+    for more, and the source is closed when the response is.
+    """
+    iterator = iter(records)
+    pending, size = [], 0
+    try:
+        while True:
+            batch = list(islice(iterator, batch_size))
+            if not batch:
+                break
+            if serializer is not None:
+                batch = serializer(batch)
+            text = '\n'.join([encode(_) for _ in batch]) + '\n'
+            pending.append(text)
+            size += len(text)
+            if size >= flush_size:
+                yield ''.join(pending).encode('utf-8')
+                pending, size = [], 0
+        if pending:
+            yield ''.join(pending).encode('utf-8')
+    finally:
+        for source in (iterator, records):
+            close = getattr(source, 'close', None)
+            if close is not None:
+                close()
+
+
+class NDJSONResponse(ApiResponse):
+    """Stream an iterable of records as JSON lines.
+
+    For exports too big to encode at once.  The resource returns any
+    iterable, such as a generator or a database cursor, and memory stays
+    bounded by `batch_size` records and `flush_size` bytes whatever the
+    export size.  A client disconnecting closes the response, which stops
+    pulling from and closes the source.  The request context is kept for
+    the iteration.  Use it for one resource with `response=` of
+    :meth:`Api.add_resource`.
+    """
+
+    content_type = 'application/x-ndjson'
+
+    def __init__(self, encoder=None, batch_size=500, flush_size=65536,
+                 serializer=None, server_timing=False, **kwargs):
+        """Create an NDJSON response maker.
+
+        :param encoder: JSON encoder of one record, defaults to the app's
+            json encoder created once per response
+        :param batch_size: records pulled and encoded at once
+        :param flush_size: bytes gathered before they are sent
+        :param serializer: callable converting a batch, a list of
+            records, before encoding, usually a :class:`Serializer`
+        :param server_timing: see :meth:`ApiResponse.start_timing`
+        Any other arguments are passed directly to `encoder`
+        """
+        self._encoder = encoder
+        self.batch_size = batch_size
+        self.flush_size = flush_size
+        self.serializer = serializer
+        self.server_timing = server_timing
+        self.json_settings = kwargs
+
+    def record_encoder(self):
+        """Return a function encoding one record without newlines."""
+        if self._encoder is not None:
+            return partial(self._encoder, **self.json_settings)
+        app = flask.current_app
+        settings = dict(self.json_settings)
+        settings.setdefault('ensure_ascii', app.config.get('JSON_AS_ASCII', True))
+        settings.setdefault('sort_keys', app.config.get('JSON_SORT_KEYS', True))
+        settings.pop('indent', None)
+        return (getattr(app, 'json_encoder', None) or JSONEncoder)(**settings).encode
+
+    def encode(self, data):
+        """Return `data` encoded as a single line."""
+        return self.record_encoder()(data)
+
+    def __call__(self, rv):
+        """Return a streamed response of the records in `rv`.
+
+        :param rv: Return value from a view, with an iterable as data
+        :type rv: a tuple or :class:`~flask.Response`
+        :return: :class:`~flask.Response`
+        """
+        if isinstance(rv, ResponseBase):
+            return rv
+        records, status, headers = unpack(rv)
+        body = _ndjson_body(records, self.record_encoder(), self.serializer,
+                            self.batch_size, self.flush_size)
+        resp = flask.current_app.response_class(
+            flask.stream_with_context(body), status,
+            {'Content-Type': self.content_type})
+        resp.headers.extend(headers)
+        return resp
+
+
+NDJSON_TYPES = frozenset(('application/x-ndjson', 'application/jsonl',
+                          'application/json-lines'))
+
+
+def _iter_ndjson(stream):
+    """Yield `(item, error)` for each line of a JSON lines stream."""
+    decoder = JSONDecoder()
+    for line in stream:
+        line = line.decode('utf-8').strip()
+        if not line:
+            continue
+        try:
+            yield decoder.decode(line), None
+        except ValueError as err:
+            yield None, str(err)
+
+
+class _JSONStream(object):
+    """Decode JSON values from a byte stream a chunk at a time."""
+
+    number_chars = '0123456789.eE+-'
+
+    def __init__(self, stream, chunk_size):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.decoder = JSONDecoder()
+        self.buf, self.pos, self.eof = '', 0, False
+
+    def _fill(self):
+        """Read another chunk, return False once the stream is exhausted."""
+        if self.eof:
+            return False
+        chunk = self.stream.read(self.chunk_size)
+        self.eof = not chunk
+        self.buf = self.buf[self.pos:] + self.utf8.decode(chunk, self.eof)
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Return the next non-whitespace character, '' at the end."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def value(self):
+        """Decode the next value, reading until it is known complete."""
+        self.peek()
+        while True:
+            try:
+                item, end = self.decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                if not self._fill():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk
+            if not self.buf[end:].strip(self.number_chars) and self._fill():
+                continue
+            self.pos = end
+            return item
+
+
+def _iter_json_array(stream, chunk_size=65536):
+    """Yield `(item, error)` for each item of a JSON array stream.
+
+    Only the current chunk and item are held in memory.  Malformed input
+    ends the iteration with a single error.
+    """
+    reader = _JSONStream(stream, chunk_size)
+    try:
+        if reader.peek() != '[':
+            raise ValueError('Expecting a JSON array')
+        reader.pos += 1
+        if reader.peek() == ']':
+            reader.pos += 1
+        else:
+            while True:
+                yield reader.value(), None
+                char = reader.peek()
+                reader.pos += 1
+                if char == ']':
+                    break
+                if char != ',':
+                    raise ValueError("Expecting ',' delimiter")
+        if reader.peek() != '':
+            raise ValueError('Extra data after JSON array')
+    except ValueError as err:
+        yield None, str(err)
+
+
+def _bulk_results(handler, items, batch_size, validate):
+    """Yield a result dict per item, calling `handler` once per batch."""
+    pending, batch = [], []
+    index = -1
+    for index, (item, error) in enumerate(items):
+        if error is None and validate is not None:
+            try:
+                validate(item)
+            except (TypeError, ValueError) as err:
+                error = str(err)
+        if error is None:
+            batch.append(item)
+            pending.append((index, None))
+        else:
+            pending.append((index, error))
+        if len(batch) >= batch_size or len(pending) >= 2 * batch_size:
+            for result in _bulk_batch(handler, pending, batch):
+                yield result
+            pending, batch = [], []
+    for result in _bulk_batch(handler, pending, batch):
+        yield result
+
+
+def _bulk_batch(handler, pending, batch):
+    """Hand `batch` to `handler` and merge the results with `pending`."""
+    results, status, failure = [None] * len(batch), 200, None
+    if batch:
+        try:
+            rv = handler(batch)
+        except HTTPException as err:
+            status, failure = err.code, err.description
+        except Exception as err:
+            flask.current_app.logger.exception('Bulk batch failed')
+            status, failure = 500, str(err)
+        else:
+            if rv is not None:
+                results = list(rv)
+                if len(results) != len(batch):
+                    status, failure = 500, 'Batch result count mismatch'
+    results = iter(results)
+    for index, error in pending:
+        if error is not None:
+            yield {'index': index, 'status': 400, 'error': error}
+        elif failure is not None:
+            yield {'index': index, 'status': status, 'error': failure}
+        else:
+            yield {'index': index, 'status': status, 'result': next(results)}
+
+
+def _bulk_body(results, encode, ndjson):
+    """Stream encoded results as JSON lines or a JSON array."""
+    if ndjson:
+        for result in results:
+            yield encode(result) + '\n'
+        return
+    yield '['
+    separator = ''
+    for result in results:
+        yield separator + encode(result)
+        separator = ','
+    yield ']'
+
+
+def bulk(batch_size=100, validate=None, response=None):
+    """Decorate a :class:`Resource` method to write collections in batches.
+
+    The request body is a JSON array, or JSON lines with an NDJSON content
+    type, read incrementally.  Each item is checked by `validate`, which
+    raises ValueError or TypeError for bad items.  Valid items are given
+    to the method in lists of up to `batch_size`, so it can do multi-row
+    inserts.  It returns one result per item, or None.  The response
+    streams a result per item in the same format as the request::
+
+        {"index": 0, "status": 200, "result": ...}
+        {"index": 1, "status": 400, "error": "..."}
+
+    A failing batch reports its error for each of its items and the
+    remaining batches are still processed.
+
+    :param batch_size: items given to the method at a time
+    :type batch_size: int
+    :param validate: called with each item before it is batched
+    :type validate: callable
+    :param response: encodes each result, default JSONResponse()
+    :type response: :class:`JSONResponse`
+
+    Example::
+
+        class Users(Resource):
+            @bulk(batch_size=500, validate=check_user)
+            def post(self, users):
+                return db.insert_many(users)
+    """
+    responder = response if response is not None else JSONResponse()
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            request = flask.request
+            ndjson = request.mimetype in NDJSON_TYPES
+            # the body is already read when hashed for an Idempotency-Key
+            data = getattr(request, '_cached_data', None)
+            stream = request.stream if data is None else io.BytesIO(data)
+            items = _iter_ndjson(stream) if ndjson else _iter_json_array(stream)
+            handler = partial(_call_batch, func, self, args, kwargs)
+            results = _bulk_results(handler, items, batch_size, validate)
+            body = _bulk_body(results, responder.encode, ndjson)
+            mimetype = request.mimetype if ndjson else responder.content_type
+            return flask.Response(flask.stream_with_context(body),
+                                  mimetype=mimetype)
+        wrapper.bulk = True
+        return wrapper
+    return decorator
+
+
+def _call_batch(func, resource, args, kwargs, batch):
+    """Call the resource method `func` with a batch."""
+    return func(resource, batch, *args, **kwargs)
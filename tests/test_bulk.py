@@ -0,0 +1,130 @@
+"""Testing bulk collection writes."""
+import io
+import pytest
+from flask import Flask, abort
+from flask.json import loads, dumps
+from flask_resteasy import Api, Resource, bulk, _iter_json_array
+
+
+def check(item):
+    """Items must be dicts with a name."""
+    if 'name' not in item:
+        raise ValueError('name is required')
+
+
+def make_app(batch_size=2, **kwargs):
+    """App with a bulk resource recording its batches."""
+    app = Flask(__name__)
+    api = Api(app)
+    batches = []
+
+    @api.resource('/users/<group>', **kwargs)
+    class Users(Resource):
+        @bulk(batch_size=batch_size, validate=check)
+        def post(self, users, group):
+            batches.append([_['name'] for _ in users])
+            if any(_['name'] == 'boom' for _ in users):
+                abort(409)
+            return [{'id': _['name'], 'group': group} for _ in users]
+
+        @bulk()
+        def patch(self, users, group):
+            return None
+    return app, batches
+
+
+def items(data, chunk_size=3):
+    """Parse a JSON array from bytes in tiny chunks."""
+    return list(_iter_json_array(io.BytesIO(data.encode()), chunk_size))
+
+
+class TestJSONArrayStream(object):
+    """Incremental JSON array parsing."""
+
+    @pytest.mark.parametrize('data', [
+        '[]', ' [ ] ', '[1]', '[1, 22, 333]', '[{"a": [1, 2]}, "x,]", null]',
+        '[12345678901234567890, -1.5e3, true]', '[\n"\\u00e9l\\u00e8ve"\n]',
+    ])
+    def test_valid(self, data):
+        """Items match json.loads whatever the chunking."""
+        expected = loads(data)
+        for size in (1, 2, 5, 1024):
+            assert [_ for _, err in items(data, size)] == expected
+            assert all(err is None for _, err in items(data, size))
+
+    @pytest.mark.parametrize('data', [
+        '', '{}', '[1', '[1,', '[1 2]', '[1] x', '[tru]',
+    ])
+    def test_invalid(self, data):
+        """Malformed input ends with an error."""
+        result = items(data)
+        assert result[-1][0] is None
+        assert result[-1][1]
+
+
+class TestBulk(object):
+    """The bulk decorator."""
+
+    def test_json_array(self):
+        """Items are batched and reported in order."""
+        app, batches = make_app()
+        body = [{'name': 'a'}, {'x': 1}, {'name': 'b'}, {'name': 'c'}]
+        with app.test_client() as c:
+            rv = c.post('/users/g1', data=dumps(body),
+                        content_type='application/json')
+            assert rv.status_code == 200
+            assert rv.mimetype == 'application/json'
+            results = loads(rv.data)
+        assert batches == [['a', 'b'], ['c']]
+        assert results == [
+            {'index': 0, 'status': 200, 'result': {'id': 'a', 'group': 'g1'}},
+            {'index': 1, 'status': 400, 'error': 'name is required'},
+            {'index': 2, 'status': 200, 'result': {'id': 'b', 'group': 'g1'}},
+            {'index': 3, 'status': 200, 'result': {'id': 'c', 'group': 'g1'}},
+        ]
+
+    def test_ndjson(self):
+        """JSON lines in, JSON lines out, failures are per batch."""
+        app, batches = make_app()
+        body = '{"name": "a"}\n{"name": "boom"}\n\nnot json\n{"name": "c"}\n'
+        with app.test_client() as c:
+            rv = c.post('/users/g2', data=body,
+                        content_type='application/x-ndjson')
+            assert rv.mimetype == 'application/x-ndjson'
+            lines = [loads(_) for _ in rv.data.splitlines()]
+        assert [_['status'] for _ in lines] == [409, 409, 400, 200]
+        assert [_['index'] for _ in lines] == [0, 1, 2, 3]
+        assert batches == [['a', 'boom'], ['c']]
+
+    def test_malformed_and_none(self):
+        """A broken array reports where it stopped, None results are fine."""
+        app, batches = make_app()
+        with app.test_client() as c:
+            rv = c.patch('/users/g', data='[{"name": "a"}, oops]')
+            results = loads(rv.data)
+            assert results[0] == {'index': 0, 'status': 200, 'result': None}
+            assert results[1]['status'] == 400
+
+    def test_idempotent(self):
+        """Hashing the body for an Idempotency-Key leaves it to read."""
+        app, batches = make_app(idempotent=['post'])
+        with app.test_client() as c:
+            rv = c.post('/users/g', data=dumps([{'name': 'a'}, {'name': 'b'}]),
+                        headers={'Idempotency-Key': 'k1'})
+            assert [_['status'] for _ in loads(rv.data)] == [200, 200]
+        assert batches == [['a', 'b']]
+
+    def test_timeout(self):
+        """Bulk methods cannot run on the timeout executor."""
+        class Items(Resource):
+            @bulk()
+            def post(self, items):
+                return None
+
+            def get(self):
+                return []
+
+        api = Api(Flask(__name__))
+        with pytest.raises(ValueError):
+            api.add_resource(Items, '/items', timeout=1)
+        api.add_resource(Items, '/items', timeout={'get': 1})
@@ -0,0 +1,364 @@
+"""Testing response caching."""
+import gzip
+import io
+import os
+import pickle
+import time
+import pytest
+import flask_resteasy
+from flask import Flask, request
+from flask.json import loads
+from flask_resteasy import (Api, CachePolicy, JSONResponse, LocalStore,
+                            MMapStore, Resource, Tenants, Variants, current_tenant,
+                            set_cache_policy)
+
+MINUTE = CachePolicy(max_age=60, vary=['Accept-Language'])
+
+
+def make_app(**kwargs):
+    """App with resources using various cache policies."""
+    app = Flask(__name__)
+    api = Api(app, **kwargs)
+
+    @api.resource('/item/<int:code>', cache=MINUTE)
+    class Item(Resource):
+        def get(self, code):
+            if code == 1:
+                return 'own', 200, {'Cache-Control': 'no-cache'}
+            if code == 2:
+                set_cache_policy(CachePolicy(max_age=5, public=False))
+            if code == 3:
+                set_cache_policy(None)
+            return 'item', code if code > 99 else 200, {'Vary': 'Accept'}
+
+        def put(self, code):
+            return 'put'
+
+    @api.resource('/default')
+    class Default(Resource):
+        def get(self):
+            return 'default'
+
+        def post(self):
+            return 'created', 201
+
+    @api.resource('/none', cache=False)
+    class NoCache(Resource):
+        def get(self):
+            return 'none'
+
+    @api.resource('/posted', cache={'post': CachePolicy(no_store=True)})
+    class Posted(Resource):
+        def get(self):
+            return 'get'
+
+        def post(self):
+            return 'post'
+    return app
+
+
+class TestCachePolicy(object):
+    """Declared cache policies."""
+
+    def test_header_values(self):
+        """Directives are built once in a fixed order."""
+        policy = CachePolicy(max_age=60, s_maxage=600, stale_while_revalidate=30,
+                             stale_if_error=86400, must_revalidate=True)
+        assert policy.cache_control == ('public, max-age=60, s-maxage=600, '
+                                        'stale-while-revalidate=30, '
+                                        'stale-if-error=86400, must-revalidate')
+        assert CachePolicy(public=False, no_cache=True, immutable=True).cache_control \
+            == 'private, no-cache, immutable'
+        assert CachePolicy(no_store=True, max_age=5).cache_control == 'no-store'
+        assert CachePolicy(vary=('Accept', 'Cookie')).vary == 'Accept, Cookie'
+
+    def test_resource_policy(self):
+        """Only successful GET and HEAD responses get the policy."""
+        app = make_app()
+        with app.test_client() as c:
+            rv = c.get('/item/0')
+            assert rv.headers['Cache-Control'] == 'public, max-age=60'
+            assert rv.headers['Vary'] == 'Accept, Accept-Language'
+            assert c.head('/item/0').headers['Cache-Control'] == 'public, max-age=60'
+            assert 'Cache-Control' not in c.put('/item/0').headers
+            assert 'Cache-Control' not in c.get('/item/404').headers
+            assert 'Cache-Control' not in c.get('/default').headers
+
+    def test_view_overrides(self):
+        """Views set their own headers or policy."""
+        app = make_app()
+        with app.test_client() as c:
+            assert c.get('/item/1').headers['Cache-Control'] == 'no-cache'
+            rv = c.get('/item/2')
+            assert rv.headers['Cache-Control'] == 'private, max-age=5'
+            assert rv.headers['Vary'] == 'Accept'
+            assert 'Cache-Control' not in c.get('/item/3').headers
+            assert loads(c.get('/item/3').data) == 'item'
+
+    def test_api_default(self):
+        """The Api default covers GET unless a resource says otherwise."""
+        app = make_app(cache_policy=CachePolicy(max_age=1))
+        with app.test_client() as c:
+            assert c.get('/default').headers['Cache-Control'] == 'public, max-age=1'
+            assert 'Cache-Control' not in c.post('/default').headers
+            assert 'Cache-Control' not in c.get('/none').headers
+            assert c.get('/item/0').headers['Cache-Control'] == 'public, max-age=60'
+            assert 'Cache-Control' not in c.get('/posted').headers
+            assert c.post('/posted').headers['Cache-Control'] == 'no-store'
+
+
+def counting_app(store, policy=MINUTE):
+    """App with a response cache counting the view calls."""
+    app = Flask(__name__)
+    api = Api(app, response_cache=store)
+    calls = []
+
+    @api.resource('/count/<int:n>', cache=policy)
+    class Count(Resource):
+        def get(self, n):
+            calls.append(n)
+            if n == 0:
+                return 'missing', 404
+            if n == 1:
+                set_cache_policy(None)
+            return {'n': n, 'calls': len(calls)}
+    return app, calls
+
+
+class TestResponseCache(object):
+    """Caching encoded responses in a store."""
+
+    def test_hits(self):
+        """Hits are served without calling the resource."""
+        app, calls = counting_app(LocalStore())
+        with app.test_client() as c:
+            first = c.get('/count/5')
+            second = c.get('/count/5')
+            assert calls == [5]
+            assert second.data == first.data
+            assert second.headers['Cache-Control'] == 'public, max-age=60'
+            assert second.headers['Content-Type'] == 'application/json'
+            c.get('/count/5?page=2')
+            c.get('/count/5', headers={'Accept-Language': 'fr'})
+            c.head('/count/5')
+            assert calls == [5, 5, 5]
+
+    def test_not_cached(self):
+        """Errors, overridden and private responses are not kept."""
+        app, calls = counting_app(LocalStore())
+        with app.test_client() as c:
+            for _ in range(2):
+                c.get('/count/0')
+                c.get('/count/1')
+            assert calls == [0, 1, 0, 1]
+        app, calls = counting_app(LocalStore(), CachePolicy(max_age=60, public=False))
+        with app.test_client() as c:
+            c.get('/count/5')
+            c.get('/count/5')
+            assert calls == [5, 5]
+
+    def test_expiry(self):
+        """s-maxage limits the time kept."""
+        app, calls = counting_app(LocalStore(), CachePolicy(max_age=60, s_maxage=0))
+        with app.test_client() as c:
+            c.get('/count/5')
+            time.sleep(0.01)
+            c.get('/count/5')
+            assert calls == [5, 5]
+
+    def test_cache_timing(self):
+        """The lookup is reported as the cache phase."""
+        app = Flask(__name__)
+        api = Api(app, response_cache=LocalStore(),
+                  response=JSONResponse(server_timing=True))
+
+        @api.resource('/t', cache=MINUTE)
+        class T(Resource):
+            def get(self):
+                return 't'
+        with app.test_client() as c:
+            assert 'view;' in c.get('/t').headers['Server-Timing']
+            timing = c.get('/t').headers['Server-Timing']
+            assert timing.startswith('cache;dur=')
+            assert 'view' not in timing
+
+    def test_mmap_store(self, tmpdir):
+        """Responses can be shared through an MMapStore."""
+        store = MMapStore(str(tmpdir.join('cache')), slots=16, slot_size=1024)
+        app, calls = counting_app(store)
+        with app.test_client() as c:
+            first = c.get('/count/5')
+            assert c.get('/count/5').data == first.data
+        assert calls == [5]
+        assert len(store) == 1
+
+
+class TestMMapStore(object):
+    """The memory mapped store."""
+
+    def test_get_set_delete(self, tmpdir):
+        """Bytes and other values round trip."""
+        store = MMapStore(str(tmpdir.join('s')), slots=8, slot_size=256, ways=2)
+        assert store.get('a') is None
+        assert store.set('a', b'bytes')
+        assert store.set('b', (200, [('X', 'y')], b'body'))
+        assert store.get('a') == b'bytes'
+        assert store.get('b') == (200, [('X', 'y')], b'body')
+        assert store.set('a', b'new')
+        assert store.get('a') == b'new'
+        assert sorted(_[0] for _ in store.items()) == ['a', 'b']
+        store.delete('a')
+        assert store.get('a', 'gone') == 'gone'
+        assert not store.set('big', b'x' * 300)
+        assert store.get('big') is None
+        store.close()
+
+    def test_responses_unpickled(self, tmpdir, monkeypatch):
+        """Cached responses are read back without pickle."""
+        store = MMapStore(str(tmpdir.join('s')), slots=8, slot_size=256, ways=2)
+        store.set('a', (200, [('X', 'y'), ('Vary', 'A, B')], b'body'))
+        store.set('b', (204, [], b''))
+        store.set('c', (200, [('X', u'\u2603')], b'snow'))
+        monkeypatch.setattr(flask_resteasy.pickle, 'loads', None)
+        assert store.get('a') == (200, [('X', 'y'), ('Vary', 'A, B')], b'body')
+        assert store.get('b') == (204, [], b'')
+        with pytest.raises(TypeError):
+            store.get('c')
+        store.close()
+
+    def test_ttl_and_eviction(self, tmpdir):
+        """Expired and least recently used entries make room."""
+        store = MMapStore(str(tmpdir.join('s')), slots=2, slot_size=128, ways=2)
+        store.set('a', b'A', ttl=0.01)
+        time.sleep(0.02)
+        assert store.get('a') is None
+        store.set('b', b'B')
+        store.set('c', b'C')
+        time.sleep(0.01)
+        store.get('b')
+        store.set('d', b'D')
+        assert store.get('b') == b'B'
+        assert store.get('c') is None
+        assert store.get('d') == b'D'
+
+    def test_layout(self, tmpdir):
+        """Existing files must have the same layout."""
+        path = str(tmpdir.join('s'))
+        MMapStore(path, slots=8, slot_size=128).close()
+        with pytest.raises(ValueError):
+            MMapStore(path, slots=16, slot_size=128)
+        with pytest.raises(ValueError):
+            MMapStore(path, slots=6, ways=4)
+
+    @pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+    def test_shared_between_processes(self, tmpdir):
+        """Entries written by one process are read by another."""
+        path = str(tmpdir.join('s'))
+        store = MMapStore(path, slots=64, slot_size=256)
+        pid = os.fork()
+        if pid == 0:
+            child = MMapStore(path, slots=64, slot_size=256)
+            for i in range(50):
+                child.set('k%d' % i, b'v%d' % i)
+            os._exit(0)
+        os.waitpid(pid, 0)
+        found = [store.get('k%d' % i) for i in range(50)]
+        assert found.count(None) < 10
+        assert all(v == b'v%d' % i for i, v in enumerate(found) if v)
+
+
+class TestVariants(object):
+    """Precompressed response bodies."""
+
+    BODY = b'{"items": [' + b', '.join([b'"item"'] * 200) + b']}'
+
+    def test_choose(self):
+        """The accepted variant with the best quality is served."""
+        app = Flask(__name__)
+        variants = Variants(self.BODY)
+        assert gzip.GzipFile(fileobj=io.BytesIO(variants.gzip)).read() == self.BODY
+        assert variants.memory()['identity'] == len(self.BODY)
+        assert variants.memory()['gzip'] < len(self.BODY)
+        for accept, expected in [('', 'identity'), ('gzip', 'gzip'),
+                                 ('gzip;q=0, deflate', 'identity'),
+                                 ('*', 'br' if variants.br else 'gzip')]:
+            with app.test_request_context('/', headers={'Accept-Encoding': accept}):
+                encoding, body = variants.choose(request.accept_encodings)
+                assert encoding == expected
+                rv = variants.response(200, [('X-A', 'b')])
+                assert rv.headers['Vary'] == 'Accept-Encoding'
+                assert rv.headers.get('Content-Encoding') == (
+                    None if expected == 'identity' else expected)
+                assert rv.headers['X-A'] == 'b'
+
+    def test_small(self):
+        """Small bodies are not compressed."""
+        variants = Variants(b'{}')
+        assert variants.memory() == {'identity': 2}
+        assert pickle.loads(pickle.dumps(variants)).memory() == {'identity': 2}
+        app = Flask(__name__)
+        with app.test_request_context('/', headers={'Accept-Encoding': 'gzip'}):
+            assert 'Vary' not in variants.response().headers
+
+    def test_cached(self):
+        """Cached bodies are stored and served compressed."""
+        app = Flask(__name__)
+        api = Api(app, response_cache=LocalStore(),
+                  response=JSONResponse(precompress=True))
+        calls = []
+
+        @api.resource('/big', cache=MINUTE)
+        class Big(Resource):
+            def get(self):
+                calls.append(1)
+                return {'items': ['item'] * 200}
+        gz = {'Accept-Encoding': 'gzip'}
+        with app.test_client() as c:
+            first = c.get('/big', headers=gz)
+            assert first.headers['Content-Encoding'] == 'gzip'
+            assert first.headers['Vary'] == 'Accept-Language, Accept-Encoding'
+            second = c.get('/big', headers=gz)
+            assert second.data == first.data
+            plain = c.get('/big')
+            assert 'Content-Encoding' not in plain.headers
+            assert gzip.GzipFile(fileobj=io.BytesIO(first.data)).read() == plain.data
+        assert calls == [1]
+        report = api.cache_memory()
+        assert report['entries'] == 1
+        assert report['identity'] == len(plain.data)
+        assert report['gzip'] < report['identity']
+
+    def test_memory_without_store(self):
+        """Without a response cache only the tenants' caches count."""
+        assert Api(Flask(__name__)).cache_memory() == {'entries': 0, 'identity': 0}
+        app = Flask(__name__)
+        api = Api(app, tenants=Tenants(header='X-Tenant', cache_size=8))
+
+        @api.resource('/tenant', cache=MINUTE)
+        class Tenant(Resource):
+            def get(self):
+                return {'tenant': current_tenant()}
+        with app.test_client() as c:
+            sizes = [len(c.get('/tenant', headers={'X-Tenant': name}).data)
+                     for name in ('a', 'bb')]
+        assert api.cache_memory() == {'entries': 2, 'identity': sum(sizes)}
+
+    def test_frozen(self):
+        """Static responses are encoded and compressed once."""
+        app = Flask(__name__)
+        api = Api(app)
+        with app.app_context():
+            frozen = api.responder.freeze({'items': ['item'] * 200}, 200,
+                                          {'X-Static': '1'})
+
+        @api.resource('/help')
+        class Help(Resource):
+            def get(self):
+                return frozen
+        with app.test_client() as c:
+            rv = c.get('/help', headers={'Accept-Encoding': 'gzip'})
+            assert rv.headers['Content-Encoding'] == 'gzip'
+            assert rv.headers['X-Static'] == '1'
+            assert rv.headers['Content-Type'] == 'application/json'
+            rv = c.get('/help')
+            assert loads(rv.data) == {'items': ['item'] * 200}
@@ -0,0 +1,142 @@
+"""Testing request deadlines."""
+import sys
+import threading
+import time
+import pytest
+from flask import Flask, g
+from flask.json import loads
+from flask_resteasy import (Api, CachePolicy, Resource, check_deadline,
+                            current_deadline, deadline_remaining,
+                            set_cache_policy)
+
+events = []
+
+
+class Nap(Resource):
+    def get(self, seconds):
+        events.append(('start', deadline_remaining()))
+        time.sleep(seconds)
+        check_deadline()
+        events.append('done')
+        return {'slept': seconds}
+
+    def post(self, seconds):
+        return {'deadline': current_deadline()}
+
+    def put(self, seconds):
+        set_cache_policy(CachePolicy(no_store=True))
+        g.thread = threading.current_thread().name
+        return {'thread': g.thread}
+
+
+AsyncNap = None
+if sys.version_info >= (3, 5):
+    # async def is a syntax error before python 3.5
+    exec("""
+import asyncio
+
+
+class AsyncNap(Resource):
+    async def get(self, seconds):
+        try:
+            await asyncio.sleep(seconds)
+        except asyncio.CancelledError:
+            events.append('cancelled')
+            raise
+        return {'slept': seconds, 'remaining': deadline_remaining() is not None}
+""")
+
+
+def make_app(**kwargs):
+    app = Flask(__name__)
+    api = Api(app, **kwargs)
+    api.add_resource(Nap, '/nap/<float:seconds>', timeout={'get': 0.1, 'put': 1},
+                     cache={'put': CachePolicy(max_age=60)})
+    if AsyncNap is not None:
+        api.add_resource(AsyncNap, '/async/<float:seconds>', timeout=0.1)
+    return app, api
+
+
+class TestDeadline(object):
+    """Timeouts and the deadline header."""
+
+    def setup_method(self, method):
+        del events[:]
+
+    def test_in_time(self):
+        """Requests in time are answered by the resource."""
+        app, api = make_app()
+        with app.test_client() as c:
+            rv = c.get('/nap/0.0')
+            assert loads(rv.data) == {'slept': 0.0}
+        assert 0 < events[0][1] <= 0.1
+        with app.test_client() as c:
+            assert loads(c.post('/nap/0.0').data) == {'deadline': None}
+
+    def test_timeout(self):
+        """A 504 is sent once the budget is spent."""
+        app, api = make_app()
+        with app.test_client() as c:
+            start = time.time()
+            rv = c.get('/nap/0.4')
+            assert time.time() - start < 0.3
+            assert rv.status_code == 504
+            assert loads(rv.data) == {'error': 'Deadline exceeded'}
+        api.timeout_executor.shutdown()
+        assert 'done' not in events
+
+    def test_header(self):
+        """The client's deadline is honored when earlier."""
+        app, api = make_app(deadline_header='X-Request-Deadline')
+        with app.test_client() as c:
+            rv = c.post('/nap/0.0', headers={'X-Request-Deadline': '123.5'})
+            assert rv.status_code == 504
+            deadline = time.time() + 5
+            rv = c.post('/nap/0.0', headers={'X-Request-Deadline': str(deadline)})
+            assert abs(loads(rv.data)['deadline'] - deadline) < 1e-3
+            rv = c.post('/nap/0.0', headers={'X-Request-Deadline': 'soon'})
+            assert loads(rv.data) == {'deadline': None}
+        app, api = make_app()
+        with app.test_client() as c:
+            rv = c.post('/nap/0.0', headers={'X-Request-Deadline': '123.5'})
+            assert rv.status_code == 200
+
+    def test_header_runs_inline(self):
+        """A client deadline alone does not move the view to the executor."""
+        app, api = make_app(deadline_header='X-Request-Deadline')
+        with app.test_client() as c:
+            rv = c.post('/nap/0.0', headers={'X-Request-Deadline': str(time.time() + 5)})
+            assert rv.status_code == 200
+        assert api._timeout_executor is None
+
+    def test_busy_jobs(self):
+        """Deferred jobs filling the executor do not delay timed views."""
+        app, api = make_app()
+        release = threading.Event()
+        for _ in range(4):
+            api.executor.submit(release.wait, 5)
+        try:
+            with app.test_client() as c:
+                assert c.get('/nap/0.0').status_code == 200
+        finally:
+            release.set()
+
+    def test_g_copied_back(self):
+        """What a view on the executor stores on g is kept."""
+        app, api = make_app()
+        with app.test_client() as c:
+            rv = c.put('/nap/0.0')
+            assert rv.headers['Cache-Control'] == 'no-store'
+            assert g.thread == loads(rv.data)['thread']
+            assert g.thread != threading.current_thread().name
+
+    @pytest.mark.skipif(AsyncNap is None, reason='needs python 3.5')
+    def test_async(self):
+        """Coroutine resources are awaited and cancelled on timeout."""
+        app, api = make_app()
+        with app.test_client() as c:
+            assert loads(c.get('/async/0.0').data) == {'slept': 0.0,
+                                                       'remaining': True}
+            rv = c.get('/async/1.0')
+            assert rv.status_code == 504
+        assert events == ['cancelled']
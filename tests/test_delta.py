@@ -0,0 +1,128 @@
+"""Testing JSON Patch delta responses."""
+import copy
+import pytest
+from flask import Flask
+from flask.json import loads
+from flask_resteasy import Api, LocalStore, Resource, json_patch
+
+
+def apply_patch(doc, patch):
+    """Minimal RFC 6902 add, remove and replace."""
+    doc = copy.deepcopy(doc)
+    for op in patch:
+        keys = [_.replace('~1', '/').replace('~0', '~')
+                for _ in op['path'].split('/')[1:]]
+        if not keys:
+            doc = op['value']
+            continue
+        parent = doc
+        for key in keys[:-1]:
+            parent = parent[int(key) if isinstance(parent, list) else key]
+        key = int(keys[-1]) if isinstance(parent, list) else keys[-1]
+        if op['op'] == 'remove':
+            del parent[key]
+        elif op['op'] == 'add' and isinstance(parent, list):
+            parent.insert(key, op['value'])
+        else:
+            parent[key] = op['value']
+    return doc
+
+
+class TestJSONPatch(object):
+    """The json_patch diff."""
+
+    @pytest.mark.parametrize('old, new', [
+        ({'a': 1}, {'a': 1}),
+        ({'a': 1, 'b/c': [1, 2]}, {'a': 2, 'b/c': [1, 2, 3], 'd~': None}),
+        ([1, 2, 3, 4, 5], [1, 9, 5]),
+        ([1, 2], [0, 1, 2, 3]),
+        ([{'x': [1]}, 2], [{'x': [1, 2]}]),
+        ({'a': 1}, [1]),
+        (1, True),
+        ('x', 'y'),
+    ])
+    def test_roundtrip(self, old, new):
+        """Applying the patch to old gives new."""
+        patch = json_patch(old, new)
+        assert apply_patch(old, patch) == new
+        if old == new and type(old) is type(new):
+            assert patch == []
+        else:
+            assert patch
+
+    def test_minimal(self):
+        """Single changes in big documents are single operations."""
+        old = {'items': list(range(100)), 'name': 'x'}
+        new = {'items': list(range(100)) + [100], 'name': 'x'}
+        assert json_patch(old, new) == [
+            {'op': 'add', 'path': '/items/100', 'value': 100}]
+
+
+def make_app(**kwargs):
+    app = Flask(__name__)
+    api = Api(app, **kwargs)
+    doc = {'items': [{'id': i, 'name': 'item %d' % i} for i in range(200)]}
+
+    @api.resource('/doc', delta=True)
+    class Doc(Resource):
+        def get(self):
+            return doc
+
+        def put(self):
+            doc['items'][5]['name'] = 'changed'
+            return doc
+    return app, doc
+
+
+class TestDelta(object):
+    """Delta responses."""
+
+    def test_patch(self):
+        """A client holding a kept version gets the patch."""
+        app, doc = make_app()
+        with app.test_client() as c:
+            first = c.get('/doc')
+            etag = first.headers['ETag']
+            old = loads(first.data)
+            assert c.get('/doc', headers={'If-None-Match': etag}).status_code == 304
+            assert c.put('/doc').headers.get('ETag') is None
+            headers = {'If-None-Match': etag, 'A-IM': 'feed, json-patch'}
+            rv = c.get('/doc', headers=headers)
+            assert rv.status_code == 226
+            assert rv.mimetype == 'application/json-patch+json'
+            assert rv.headers['IM'] == 'json-patch'
+            assert rv.headers['Delta-Base'] == etag
+            assert apply_patch(old, loads(rv.data)) == doc
+            full = c.get('/doc')
+            assert rv.headers['ETag'] == full.headers['ETag'] != etag
+            assert len(rv.data) < len(full.data)
+
+    def test_full(self):
+        """Unknown versions and big patches get the full body."""
+        app, doc = make_app()
+        with app.test_client() as c:
+            rv = c.get('/doc', headers={'If-None-Match': '"nope"', 'A-IM': 'json-patch'})
+            assert rv.status_code == 200
+            etag = rv.headers['ETag']
+            doc['items'] = ['replaced']
+            rv = c.get('/doc', headers={'If-None-Match': etag})
+            assert rv.status_code == 200
+            doc['items'] = list(range(300))
+            rv = c.get('/doc', headers={'If-None-Match': etag, 'A-IM': 'json-patch'})
+            assert rv.status_code == 200
+            assert loads(rv.data) == doc
+
+    def test_bounded(self):
+        """Kept versions are limited by their total size."""
+        deltas = LocalStore(maxbytes=10000)
+        app, doc = make_app(deltas=deltas)
+        with app.test_client() as c:
+            for i in range(5):
+                doc['items'][0]['name'] = 'version %d' % i
+                size = len(c.get('/doc').data)
+        assert len(deltas) == 10000 // size
+        assert deltas.nbytes == len(deltas) * size
+        for key, body in deltas.items():
+            deltas.delete(key)
+        assert deltas.nbytes == 0
+        assert Api(Flask(__name__)).deltas.maxbytes
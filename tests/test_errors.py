@@ -0,0 +1,91 @@
+"""Testing Api error handling."""
+import pytest
+from flask import Flask, abort, make_response
+from flask.json import loads
+from flask_resteasy import Api, Resource
+
+
+class Missing(KeyError):
+    pass
+
+
+class Items(Resource):
+    def get(self, how):
+        if how == 'abort':
+            abort(404)
+        if how == 'message':
+            abort(400, 'bad item')
+        if how == 'busy':
+            abort(503)
+        if how == 'missing':
+            raise Missing(how)
+        if how == 'value':
+            raise ValueError('secret detail')
+        if how == 'response':
+            abort(make_response('teapot', 418))
+        return {'how': how}
+
+
+def make_app(testing=False):
+    app = Flask(__name__)
+    app.testing = testing
+    api = Api(app, handle_errors=True,
+              errors={KeyError: 404, LookupError: (409, 'conflict')})
+    api.add_resource(Items, '/items/<how>')
+    app.register_error_handler(404, api.handle_error)
+    app.register_error_handler(405, api.handle_error)
+    return app, api
+
+
+class TestErrors(object):
+    """handle_errors."""
+
+    def test_http_errors(self):
+        """HTTP exceptions are encoded by the responder."""
+        app, api = make_app()
+        with app.test_client() as c:
+            rv = c.get('/items/abort')
+            assert rv.status_code == 404
+            assert rv.mimetype == 'application/json'
+            assert 'not found' in loads(rv.data)['error']
+            rv = c.get('/items/message')
+            assert loads(rv.data) == {'error': 'bad item'}
+            assert c.get('/items/busy').status_code == 503
+            rv = c.get('/items/response')
+            assert (rv.status_code, rv.data) == (418, b'teapot')
+
+    def test_mapped(self):
+        """Exceptions are mapped by class, unknown ones are a 500."""
+        app, api = make_app()
+        with app.test_client() as c:
+            rv = c.get('/items/missing')
+            assert rv.status_code == 404
+            assert loads(rv.data) == {'error': 'Not Found'}
+            rv = c.get('/items/value')
+            assert rv.status_code == 500
+            assert b'secret' not in rv.data
+        api.errors[Missing] = (410, 'gone')
+        api._error_codes.clear()
+        with app.test_client() as c:
+            assert c.get('/items/missing').status_code == 410
+
+    def test_propagate(self):
+        """Unexpected exceptions are raised when testing."""
+        app, api = make_app(testing=True)
+        with app.test_client() as c:
+            with pytest.raises(ValueError):
+                c.get('/items/value')
+            assert c.get('/items/missing').status_code == 404
+
+    def test_cached_bodies(self):
+        """Static errors are encoded once, routing errors included."""
+        app, api = make_app()
+        with app.test_client() as c:
+            first = c.get('/items/abort')
+            assert c.get('/nowhere').data == first.data
+            rv = c.post('/items/x')
+            assert rv.status_code == 405
+            assert 'GET' in rv.headers['Allow']
+            assert rv.mimetype == 'application/json'
+            c.get('/items/message')
+        assert sorted(code for code, message in api._error_bodies) == [404, 405]
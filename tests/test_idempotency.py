@@ -0,0 +1,125 @@
+"""Testing idempotency keys."""
+import hashlib
+import threading
+import time
+from flask import Flask, abort, request
+from flask.json import loads, dumps
+from flask_resteasy import Api, LocalStore, Resource
+
+
+def make_app(**kwargs):
+    app = Flask(__name__)
+    api = Api(app, **kwargs)
+    calls = []
+
+    @api.resource('/orders', idempotent=['post'])
+    class Orders(Resource):
+        def post(self):
+            data = request.get_json(force=True)
+            calls.append(data)
+            time.sleep(data.get('sleep', 0))
+            if data.get('fail'):
+                abort(503)
+            return {'order': len(calls)}, 201, {'X-Order': str(len(calls)),
+                                                'Set-Cookie': 'cart=%d' % len(calls)}
+
+        def put(self):
+            calls.append('put')
+            return {'order': len(calls)}
+    return app, api, calls
+
+
+def post(client, body, key='k1'):
+    headers = {'Idempotency-Key': key} if key else {}
+    return client.post('/orders', data=dumps(body), headers=headers)
+
+
+class TestIdempotency(object):
+    """Idempotency-Key handling."""
+
+    def test_replay(self):
+        """Retries get the stored response without calling the resource."""
+        app, api, calls = make_app()
+        with app.test_client() as c:
+            first = post(c, {'item': 1})
+            again = post(c, {'item': 1})
+            assert first.status_code == again.status_code == 201
+            assert again.data == first.data
+            assert again.headers['X-Order'] == '1'
+            assert 'Set-Cookie' in first.headers
+            assert 'Set-Cookie' not in again.headers
+            assert again.headers['Idempotent-Replayed'] == 'true'
+            assert 'Idempotent-Replayed' not in first.headers
+            assert loads(post(c, {'item': 1}, key='k2').data) == {'order': 2}
+            post(c, {'item': 1}, key=None)
+            post(c, {'item': 1}, key=None)
+            c.put('/orders', headers={'Idempotency-Key': 'k1'})
+            c.put('/orders', headers={'Idempotency-Key': 'k1'})
+        assert len(calls) == 6
+
+    def test_scope(self):
+        """The same key from another caller is a new request."""
+        app, api, calls = make_app(
+            idempotency_scope=lambda: request.headers.get('X-User'))
+        with app.test_client() as c:
+            for user in ('alice', 'bob', 'alice'):
+                c.post('/orders', data=dumps({'item': 1}),
+                       headers={'Idempotency-Key': 'k1', 'X-User': user})
+        assert len(calls) == 2
+        assert sorted(key for key, value in api.idempotency.items()) == [
+            'alice|POST /orders k1', 'bob|POST /orders k1']
+
+    def test_mismatch_and_errors(self):
+        """Different bodies are refused, server errors are not kept."""
+        app, api, calls = make_app()
+        with app.test_client() as c:
+            post(c, {'item': 1})
+            rv = post(c, {'item': 2})
+            assert rv.status_code == 422
+            assert 'different' in loads(rv.data)['error']
+            assert post(c, {'fail': True}, key='f').status_code == 503
+            assert post(c, {'fail': True}, key='f').status_code == 503
+        assert len(calls) == 3
+
+    def test_concurrent(self):
+        """Concurrent duplicates run the resource once."""
+        app, api, calls = make_app()
+        results = []
+
+        def client():
+            with app.test_client() as c:
+                results.append(post(c, {'sleep': 0.1}, key='same'))
+        threads = [threading.Thread(target=client) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(calls) == 1
+        assert set(_.data for _ in results) == set([results[0].data])
+        assert api._idempotency_locks._locks == {}
+
+    def test_in_progress_elsewhere(self):
+        """A pending key in a shared store is a conflict."""
+        store = LocalStore()
+        app, api, calls = make_app(idempotency=store)
+        store.set('POST /orders k1', (hashlib.sha256(b'{}').hexdigest(), None))
+        with app.test_client() as c:
+            rv = post(c, {})
+            assert rv.status_code == 409
+            assert rv.headers['Retry-After'] == '1'
+        assert calls == []
+
+    def test_pending_expires(self):
+        """The in-progress marker outlives a dead worker only briefly."""
+        ttls = []
+
+        class Store(LocalStore):
+            def set(self, key, value, ttl=None):
+                ttls.append((value[1] is None, ttl))
+                LocalStore.set(self, key, value, ttl)
+
+        app, api, calls = make_app(idempotency=Store())
+        api.idempotency_pending = 5
+        with app.test_client() as c:
+            post(c, {})
+        assert ttls == [(True, 5), (False, None)]
@@ -0,0 +1,148 @@
+"""Testing deferred resources."""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Blueprint, g, request
+from flask.json import loads
+from flask_resteasy import Api, LocalStore, Resource
+
+
+class InlineExecutor(object):
+    """Run submitted work immediately."""
+
+    def submit(self, func, *args, **kwargs):
+        func(*args, **kwargs)
+
+
+def poll(client, url, tries=100):
+    """Poll the job url until it is no longer pending."""
+    for _ in range(tries):
+        rv = client.get(url)
+        if rv.status_code != 202:
+            return rv
+        time.sleep(0.01)
+    return rv
+
+
+class TestLocalStore(object):
+    """LocalStore behaviour."""
+
+    def test_get_set_delete(self):
+        """Basic store operations."""
+        store = LocalStore()
+        assert store.get('a') is None
+        assert store.get('a', 1) == 1
+        store.set('a', 'A')
+        assert store.get('a') == 'A'
+        store.delete('a')
+        assert store.get('a') is None
+
+    def test_ttl(self):
+        """Expired entries are gone."""
+        store = LocalStore(ttl=0.01)
+        store.set('a', 'A')
+        store.set('b', 'B', ttl=60)
+        time.sleep(0.02)
+        assert store.get('a') is None
+        assert store.get('b') == 'B'
+        assert store.items() == [('b', 'B')]
+
+    def test_maxsize(self):
+        """Least recently used entries are evicted."""
+        store = LocalStore(maxsize=2)
+        store.set('a', 'A')
+        store.set('b', 'B')
+        store.get('a')
+        store.set('c', 'C')
+        assert len(store) == 2
+        assert store.get('b') is None
+        assert store.get('a') == 'A'
+
+
+class TestDeferred(object):
+    """Deferred resource methods."""
+
+    def test_deferred(self):
+        """POST returns 202 and the job status gives the result."""
+        app = Flask(__name__)
+        api = Api(app, executor=InlineExecutor())
+
+        @api.resource('/work', deferred=['post'])
+        class Work(Resource):
+            def get(self):
+                return 'now'
+
+            def post(self):
+                return {'got': request.get_json()}, 201, {'X-Job': 'yes'}
+
+        assert 'job_status' in api.endpoints
+        with app.test_client() as c:
+            assert loads(c.get('/work').data) == 'now'
+            rv = c.post('/work', data='[1, 2]',
+                        content_type='application/json')
+            assert rv.status_code == 202
+            job = loads(rv.data)
+            assert job['status'] == 'pending'
+            assert rv.headers['Location'].endswith('/jobs/' + job['job'])
+
+            rv = c.get(rv.headers['Location'])
+            assert rv.status_code == 201
+            assert rv.headers['X-Job'] == 'yes'
+            assert loads(rv.data) == {'got': [1, 2]}
+
+    def test_thread_pool(self):
+        """Work runs in another thread with a copy of the request."""
+        app = Flask(__name__)
+        api = Api(app, executor=ThreadPoolExecutor(1))
+
+        @app.before_request
+        def user():
+            g.user = 'dave'
+
+        @api.resource('/work/<int:n>', deferred=['POST'])
+        class Work(Resource):
+            def post(self, n):
+                time.sleep(0.02)
+                return {'n': n, 'user': g.user, 'body': request.data.decode()}
+
+        with app.test_client() as c:
+            rv = c.post('/work/7', data='abc')
+            assert rv.status_code == 202
+            rv = poll(c, rv.headers['Location'])
+            assert rv.status_code == 200
+            assert loads(rv.data) == {'n': 7, 'user': 'dave', 'body': 'abc'}
+
+    def test_failed_and_unknown(self):
+        """Failed jobs report 500 and unknown jobs 404."""
+        app = Flask(__name__)
+        api = Api(app, executor=InlineExecutor(), jobs_url='/status/<job_id>')
+
+        @api.resource('/fail', deferred=['post'])
+        class Fail(Resource):
+            def post(self):
+                raise RuntimeError('boom')
+
+        with app.test_client() as c:
+            rv = c.post('/fail')
+            assert '/status/' in rv.headers['Location']
+            rv = c.get(rv.headers['Location'])
+            assert rv.status_code == 500
+            assert loads(rv.data)['error'] == 'Internal Server Error'
+            assert c.get('/status/nope').status_code == 404
+
+    def test_blueprint(self):
+        """Job status is registered on the blueprint."""
+        bp = Blueprint('bp', __name__)
+        api = Api(bp, prefix='/api', executor=InlineExecutor())
+
+        @api.resource('/work', deferred=['post'])
+        class Work(Resource):
+            def post(self):
+                return 'done'
+
+        app = Flask(__name__)
+        app.register_blueprint(bp, url_prefix='/bp')
+        with app.test_client() as c:
+            rv = c.post('/bp/api/work')
+            assert rv.status_code == 202
+            assert '/bp/api/jobs/' in rv.headers['Location']
+            assert loads(c.get(rv.headers['Location']).data) == 'done'
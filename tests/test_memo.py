@@ -0,0 +1,96 @@
+"""Testing request scoped memoization."""
+import logging
+from functools import wraps
+from flask import Flask, g
+from flask.json import loads
+from flask_resteasy import (Api, Resource, SlowRequestLog, current_memo,
+                            memoize)
+from .test_timing import Records
+
+lookups = []
+
+
+@memoize
+def load_user(user_id, detail=False):
+    """Pretend to hit the database."""
+    lookups.append(user_id)
+    if user_id == 'bad':
+        raise KeyError(user_id)
+    return {'id': user_id, 'detail': detail}
+
+
+def authenticate(func):
+    """Decorator loading the same user as the resource."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        g.user = load_user(kwargs['user_id'])
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def make_app(**kwargs):
+    app = Flask(__name__)
+    api = Api(app, decorators=[authenticate], **kwargs)
+
+    @api.resource('/users/<user_id>')
+    class User(Resource):
+        def get(self, user_id):
+            user = load_user(user_id)
+            load_user(user_id, detail=True)
+            load_user(user_id, detail=True)
+            return {'same': user is g.user, 'memo': current_memo().stats()}
+    return app
+
+
+class TestMemoize(object):
+    """The memoize decorator."""
+
+    def setup_method(self, method):
+        del lookups[:]
+
+    def test_shared_per_request(self):
+        """Decorators and resources share one lookup per request."""
+        app = make_app()
+        with app.test_client() as c:
+            data = loads(c.get('/users/1').data)
+            assert data == {'same': True,
+                            'memo': {'hits': 2, 'misses': 2, 'size': 2}}
+            c.get('/users/1')
+        assert lookups == ['1', '1', '1', '1']
+
+    def test_cleared_between_requests(self):
+        """Requests sharing an application context do not share results."""
+        app = make_app()
+        with app.app_context():
+            with app.test_client() as c:
+                c.get('/users/2')
+                c.get('/users/2')
+        assert lookups == ['2', '2', '2', '2']
+
+    def test_uncached_calls(self):
+        """Outside requests, unhashable arguments and errors are not cached."""
+        assert load_user('x') == {'id': 'x', 'detail': False}
+        load_user('x')
+        app = Flask(__name__)
+        with app.test_request_context('/'):
+            for _ in range(2):
+                try:
+                    load_user('bad')
+                except KeyError:
+                    pass
+            load_user(['unhashable'])
+            assert load_user('y', detail=['unhashable'])['detail'] == ['unhashable']
+            assert current_memo().stats() == {'hits': 0, 'misses': 4, 'size': 0}
+        assert lookups == ['x', 'x', 'bad', 'bad', ['unhashable'], 'y']
+
+    def test_slow_log(self):
+        """The counters are part of slow request records."""
+        logger = logging.getLogger('test.memo')
+        logger.propagate = False
+        handler = Records()
+        logger.handlers = [handler]
+        app = make_app(slow_log=SlowRequestLog(threshold=0, logger=logger))
+        with app.test_client() as c:
+            c.get('/users/3')
+        memo = handler.records[0].resteasy['memo']
+        assert memo == {'hits': 2, 'misses': 2, 'size': 2}
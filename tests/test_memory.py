@@ -0,0 +1,108 @@
+"""Testing the memory taken by registered resources."""
+import gc
+from functools import wraps
+import pytest
+try:
+    import tracemalloc
+except ImportError:  # python2
+    tracemalloc = None
+from flask import Flask
+from flask.json import loads
+from flask_resteasy import Api, CachePolicy, Resource
+
+
+def passthrough(func):
+    """A decorator as apps write them."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def resource_class(i):
+    return type('Thing%d' % i, (Resource,), {
+        'get': lambda self, thing_id: {'id': thing_id},
+        'post': lambda self, thing_id: ({'id': thing_id}, 201)})
+
+
+class TestMemory(object):
+    """Registration structures and the memory report."""
+
+    def test_view_attributes(self):
+        """Dispatch objects expose the view's attributes without copying them."""
+        app = Flask(__name__)
+        api = Api(app, decorators=[passthrough], handle_errors=True)
+        Thing = resource_class(0)
+        api.add_resource(Thing, '/things/<int:thing_id>', endpoint='thing')
+        view = app.view_functions['thing']
+        assert view.view_class is Thing
+        assert view.__name__ == 'thing'
+        assert set(view.methods) == set(['GET', 'POST'])
+        with app.test_client() as c:
+            assert loads(c.get('/things/3').data) == {'id': 3}
+            assert c.post('/things/3').status_code == 201
+        assert api.registry['thing'].options == {}
+        assert api.registry['thing'].urls == ('/things/<int:thing_id>',)
+
+    def test_view_metadata(self):
+        """Name, docstring, module and wrapped view are those of the resource."""
+        class Documented(Resource):
+            """Documented resource."""
+            def get(self):
+                return {}
+
+        app = Flask(__name__)
+        api = Api(app, handle_errors=True)
+        api.add_resource(Documented, '/documented', decorators=[passthrough])
+        view = app.view_functions['documented']
+        assert view.__doc__ == 'Documented resource.'
+        assert view.__module__ == __name__
+        assert view.__name__ == 'documented'
+        assert view.__qualname__ == view.__wrapped__.__qualname__
+        wrapper = view.__wrapped__
+        assert wrapper.__doc__ == 'Documented resource.'
+        assert wrapper.__wrapped__.__doc__ == 'Documented resource.'
+        assert wrapper.__wrapped__.__wrapped__.view_class is Documented
+        assert type(view).__doc__.startswith('The outermost view function')
+        assert type(view).__module__ == 'flask_resteasy'
+
+    def test_report(self):
+        """Every resource is reported, its options count with its view."""
+        app = Flask(__name__)
+        api = Api(app)
+        api.add_resource(resource_class(1), '/plain/<int:thing_id>', endpoint='plain')
+        api.add_resource(resource_class(2), '/cached/<int:thing_id>', endpoint='cached',
+                         cache={'get': CachePolicy(max_age=60)},
+                         decorators=[passthrough])
+        report = api.memory_report()
+        assert sorted(report['resources']) == ['cached', 'plain']
+        plain, cached = report['resources']['plain'], report['resources']['cached']
+        for entry in (plain, cached):
+            assert entry['view'] > 0 and entry['rules'] > 0
+            assert entry['total'] == entry['record'] + entry['view'] + entry['rules']
+        assert cached['record'] > plain['record']
+        assert cached['view'] > plain['view']
+        assert report['total'] == plain['total'] + cached['total']
+
+    @pytest.mark.skipif(tracemalloc is None, reason='needs tracemalloc')
+    def test_at_scale(self):
+        """A thousand resources take a few kB each, most of it url rules."""
+        classes = [resource_class(i) for i in range(1000)]
+        app = Flask(__name__)
+        api = Api(app, decorators=[passthrough])
+        gc.collect()
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            for i, cls in enumerate(classes):
+                api.add_resource(cls, '/things%d/<int:thing_id>' % i)
+            gc.collect()
+            per_resource = (tracemalloc.get_traced_memory()[0] - before) / 1000.0
+        finally:
+            tracemalloc.stop()
+        assert per_resource < 7000
+        report = api.memory_report()
+        assert len(report['resources']) == 1000
+        views = [_['view'] for _ in report['resources'].values()]
+        assert max(views) < 2000
+        assert report['total'] / 1000.0 < per_resource
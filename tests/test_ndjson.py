@@ -0,0 +1,85 @@
+"""Testing streamed JSON lines responses."""
+from collections import namedtuple
+from flask import Flask
+from flask.json import loads
+from flask_resteasy import Api, NDJSONResponse, Resource, Serializer
+
+Row = namedtuple('Row', 'id name')
+
+
+class Source(object):
+    """Records source counting what was pulled and if it was closed."""
+
+    def __init__(self, count):
+        self.count = count
+        self.pulled = 0
+        self.closed = False
+
+    def __iter__(self):
+        for i in range(self.count):
+            self.pulled += 1
+            yield Row(i, 'row %d' % i)
+
+    def close(self):
+        self.closed = True
+
+
+def make_app(source, **kwargs):
+    app = Flask(__name__)
+    api = Api(app)
+
+    @api.resource('/export', response=NDJSONResponse(serializer=Serializer(), **kwargs))
+    class Export(Resource):
+        def get(self):
+            return source, 200, {'X-Export': 'rows'}
+
+    @api.resource('/plain')
+    class Plain(Resource):
+        def get(self):
+            return {'plain': True}
+    return app
+
+
+class TestNDJSONResponse(object):
+    """NDJSONResponse."""
+
+    def test_export(self):
+        """All records are sent as lines, other resources keep JSON."""
+        source = Source(1000)
+        app = make_app(source, batch_size=64, flush_size=1024)
+        with app.test_client() as c:
+            rv = c.get('/export')
+            assert rv.mimetype == 'application/x-ndjson'
+            assert rv.headers['X-Export'] == 'rows'
+            assert rv.is_streamed
+            lines = rv.data.decode().splitlines()
+            assert len(lines) == 1000
+            assert loads(lines[-1]) == {'id': 999, 'name': 'row 999'}
+            assert loads(c.get('/plain').data) == {'plain': True}
+        assert source.closed
+
+    def test_chunks(self):
+        """Chunks are flushed at the byte threshold, pulled on demand."""
+        source = Source(10000)
+        app = make_app(source, batch_size=10, flush_size=500)
+        with app.test_request_context('/export'):
+            rv = app.full_dispatch_request()
+            chunks = iter(rv.response)
+            first = next(chunks)
+            assert 500 <= len(first) < 1000
+            assert source.pulled <= 20
+            next(chunks)
+            rv.close()
+        assert source.pulled <= 40
+        assert source.closed
+
+    def test_encoder(self):
+        """Custom encoders and empty exports."""
+        source = Source(0)
+        app = make_app(source, encoder=lambda obj, **kw: 'x')
+        with app.test_client() as c:
+            assert c.get('/export').data == b''
+        source = Source(2)
+        app = make_app(source, encoder=lambda obj, **kw: 'x')
+        with app.test_client() as c:
+            assert c.get('/export').data == b'x\nx\n'
@@ -0,0 +1,110 @@
+"""Testing the OpenAPI document."""
+from flask import Blueprint, Flask
+from flask.json import loads
+from flask_resteasy import Api, Resource
+
+
+class Item(Resource):
+    def get(self, item_id):
+        """Fetch an item.
+
+        Items are looked up by id.
+        """
+        return {'id': item_id}
+
+    def delete(self, item_id):
+        return '', 204
+
+
+class Report(Resource):
+    def post(self, kind):
+        return {'kind': kind}
+
+
+def make_api(app, **kwargs):
+    api = Api(app, openapi_url='/openapi.json',
+              openapi_info={'title': 'Items', 'version': '2'}, **kwargs)
+    api.add_resource(Item, '/items/<int:item_id>', endpoint='item',
+                     openapi={'GET': {'tags': ['items']}})
+    api.add_resource(Report, '/reports/<any(daily, weekly):kind>',
+                     deferred=['post'])
+    return api
+
+
+class TestOpenAPI(object):
+    """Building and serving the document."""
+
+    def test_document(self):
+        """Paths, parameters and operations come from the registry."""
+        app = Flask(__name__)
+        api = make_api(app)
+        spec = api.openapi()
+        assert spec['info'] == {'title': 'Items', 'version': '2'}
+        assert sorted(spec['paths']) == ['/items/{item_id}', '/jobs/{job_id}',
+                                         '/reports/{kind}']
+        get = spec['paths']['/items/{item_id}']['get']
+        assert get['operationId'] == 'item_get'
+        assert get['summary'] == 'Fetch an item.'
+        assert get['description'] == 'Items are looked up by id.'
+        assert get['tags'] == ['items']
+        assert get['parameters'] == [{'name': 'item_id', 'in': 'path',
+                                      'required': True,
+                                      'schema': {'type': 'integer'}}]
+        assert 'summary' not in spec['paths']['/items/{item_id}']['delete']
+        post = spec['paths']['/reports/{kind}']['post']
+        assert post['responses'] == {'202': {'description': 'OK'}}
+        assert post['parameters'][0]['schema'] == {
+            'type': 'string', 'enum': ['daily', 'weekly']}
+
+    def test_served(self):
+        """The encoded document is cached and sent with an ETag."""
+        app = Flask(__name__)
+        api = make_api(app)
+        with app.test_client() as c:
+            rv = c.get('/openapi.json')
+            assert rv.status_code == 200
+            assert loads(rv.data) == loads(api.openapi_body()[0])
+            etag = rv.headers['ETag']
+            assert c.get('/openapi.json',
+                         headers={'If-None-Match': etag}).status_code == 304
+            body = api.openapi_body()
+            assert api.openapi_body() is body
+            api.add_resource(Report, '/more/<kind>', endpoint='more')
+            assert api.openapi_body() is not body
+            assert c.get('/openapi.json').headers['ETag'] != etag
+
+    def test_blueprint_versions(self):
+        """Blueprint prefixes and versions are part of the paths."""
+        blueprint = Blueprint('bp', __name__)
+        api = make_api(blueprint, prefix='/api', versions=('v1', 'v2'))
+        api.add_resource(Report, '/new/<kind>', endpoint='new', version='v2')
+        app = Flask(__name__)
+        app.register_blueprint(blueprint, url_prefix='/bp')
+        assert api._openapi is not None
+        spec = api.openapi()
+        assert '/bp/api/{api_version}/items/{item_id}' in spec['paths']
+        new = spec['paths']['/bp/api/{api_version}/new/{kind}']['post']
+        assert new['parameters'][0]['schema']['enum'] == ['v2']
+        with app.test_client() as c:
+            assert c.get('/bp/api/v1/openapi.json').status_code == 200
+
+    def test_version_overrides(self):
+        """Operations of an override are only listed for its version."""
+        class ItemV2(Item):
+            def put(self, item_id):
+                return {'id': item_id}
+
+        app = Flask(__name__)
+        api = make_api(app, versions=('v1', 'v2', 'v3'))
+        api.add_resource(ItemV2, '/items/<int:item_id>', endpoint='item', version='v2')
+        paths = api.openapi()['paths']
+        assert '/{api_version}/items/{item_id}' not in paths
+        assert sorted(paths['/v1/items/{item_id}']) == ['delete', 'get']
+        assert sorted(paths['/v3/items/{item_id}']) == ['delete', 'get']
+        assert sorted(paths['/v2/items/{item_id}']) == ['delete', 'get', 'put']
+        assert paths['/v2/items/{item_id}']['put']['operationId'] == 'item_v2_put'
+        assert paths['/{api_version}/reports/{kind}']['post']['parameters'][0][
+            'schema']['enum'] == ['v1', 'v2', 'v3']
+        with app.test_client() as c:
+            assert c.put('/v1/items/1').status_code == 405
+            assert c.put('/v2/items/1').status_code == 200
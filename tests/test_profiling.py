@@ -0,0 +1,163 @@
+"""Testing the sampled profiler."""
+import marshal
+import os
+import threading
+import time
+import pytest
+from flask import Flask
+from flask.json import loads, dumps
+from flask_resteasy import Api, Profiler, Resource
+
+
+def busy_work():
+    """Something for the profiler to find."""
+    time.sleep(0.03)
+    return sum(range(1000))
+
+
+def make_app():
+    """App with a profiled resource and the profiler admin resource."""
+    app = Flask(__name__)
+    api = Api(app)
+
+    @api.resource('/work')
+    class Work(Resource):
+        def get(self):
+            return busy_work()
+
+    api.add_resource(api.profiler.resource(), '/_profile',
+                     '/_profile/<endpoint>', endpoint='profile')
+    return app, api
+
+
+class TestProfiler(object):
+    """Profiler behaviour."""
+
+    def test_enable_errors(self):
+        """Bad settings are refused."""
+        profiler = Profiler()
+        with pytest.raises(ValueError):
+            profiler.enable('foo', mode='magic')
+        with pytest.raises(ValueError):
+            profiler.enable('foo', every=0)
+
+    def test_call_sampling(self):
+        """One in every N calls is profiled."""
+        profiler = Profiler()
+        assert profiler.call('foo', busy_work) == 499500
+        profiler.enable('foo', every=3)
+        for _ in range(7):
+            profiler.call('foo', busy_work)
+        assert profiler.status()['foo'] == {'every': 3, 'mode': 'cprofile',
+                                            'seen': 7, 'samples': 2}
+        assert 'busy_work' in profiler.text('foo')
+        stats = marshal.loads(profiler.dump('foo'))
+        assert any(_[2] == 'busy_work' for _ in stats)
+        profiler.disable('foo')
+        profiler.call('foo', busy_work)
+        assert 'foo' not in profiler.status()
+        assert 'foo' in profiler.stats
+        profiler.clear('foo')
+        assert profiler.text('foo') == ''
+
+    def test_stack_sampler(self):
+        """Stack sampling collects collapsed stacks."""
+        profiler = Profiler(interval=0.001)
+        profiler.enable('foo', mode='sample')
+        profiler.call('foo', busy_work)
+        collapsed = profiler.collapsed('foo')
+        assert 'busy_work' in collapsed
+        stack, count = collapsed.splitlines()[0].rsplit(' ', 1)
+        assert int(count) > 0
+
+
+class TestProfilerResource(object):
+    """Controlling the profiler through the api."""
+
+    def test_admin(self):
+        """Toggle profiling and fetch results at runtime."""
+        app, api = make_app()
+        with app.test_client() as c:
+            assert loads(c.get('/_profile').data) == {}
+            rv = c.put('/_profile/work', data=dumps({'every': 2}))
+            assert loads(rv.data)['every'] == 2
+            for _ in range(4):
+                assert c.get('/work').status_code == 200
+            assert loads(c.get('/_profile').data)['work']['samples'] == 2
+
+            rv = c.get('/_profile/work')
+            assert rv.mimetype == 'text/plain'
+            assert b'busy_work' in rv.data
+            rv = c.get('/_profile/work?format=pstats')
+            assert rv.mimetype == 'application/octet-stream'
+            assert marshal.loads(rv.data)
+            assert c.get('/_profile/work?format=nope').status_code == 400
+
+            assert c.delete('/_profile/work').status_code == 204
+            assert loads(c.get('/_profile').data) == {}
+            assert 'work' not in api.profiler.stats
+
+    def test_admin_sample(self):
+        """Collapsed stacks through the api."""
+        app, api = make_app()
+        with app.test_client() as c:
+            c.put('/_profile/work', data=dumps({'mode': 'sample'}))
+            c.get('/work')
+            rv = c.get('/_profile/work?format=collapsed')
+            assert b'busy_work' in rv.data
+            assert c.put('/_profile/work',
+                         data=dumps({'mode': 'x'})).status_code == 400
+
+
+class TestConcurrentProfiling(object):
+    """Only one cProfile runs at a time."""
+
+    def test_busy(self):
+        """Calls sampled while a profile runs are run unprofiled."""
+        profiler = Profiler()
+        profiler.enable('foo')
+        started, release, results = threading.Event(), threading.Event(), []
+
+        def slow():
+            started.set()
+            release.wait(5)
+            return 'slow'
+
+        thread = threading.Thread(target=lambda: results.append(
+            profiler.call('foo', slow)))
+        thread.start()
+        started.wait(5)
+        assert profiler.call('foo', busy_work) == 499500
+        release.set()
+        thread.join()
+        assert results == ['slow']
+        assert profiler.status()['foo']['seen'] == 2
+        assert profiler.status()['foo']['samples'] == 1
+        assert 'busy_work' not in profiler.text('foo')
+
+    @pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+    def test_sampler_after_fork(self):
+        """Forking while sampling leaves the child a working sampler."""
+        profiler = Profiler(interval=0.001)
+        profiler.enable('foo', mode='sample')
+        started, release = threading.Event(), threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+
+        thread = threading.Thread(target=profiler.call, args=('foo', slow))
+        thread.start()
+        started.wait(5)
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                profiler.clear('foo')
+                profiler.call('foo', busy_work)
+                code = 0 if 'busy_work' in profiler.collapsed('foo') else 1
+            finally:
+                os._exit(code)
+        release.set()
+        thread.join()
+        assert os.waitpid(pid, 0)[1] == 0
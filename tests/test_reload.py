@@ -0,0 +1,98 @@
+"""Testing hot reload of resources."""
+import threading
+from functools import wraps
+import pytest
+from flask import Blueprint, Flask
+from flask.json import loads
+from flask_resteasy import Api, LocalStore, Resource, CachePolicy
+
+
+def tag(name):
+    """Decorator adding a header naming it."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            rv = func(*args, **kwargs)
+            rv.headers.add('X-Tag', name)
+            return rv
+        return wrapper
+    return decorator
+
+
+class Old(Resource):
+    def get(self, item_id):
+        return {'version': 1, 'id': item_id}
+
+
+class New(Resource):
+    def get(self, item_id):
+        return {'version': 2, 'id': item_id}
+
+    def post(self, item_id):
+        return {'created': item_id}, 201
+
+
+class TestReplaceResource(object):
+    """Swapping the view of an endpoint."""
+
+    def test_resource(self):
+        """New classes get their methods, options are kept."""
+        app = Flask(__name__)
+        api = Api(app, response_cache=LocalStore())
+        api.add_resource(Old, '/items/<int:item_id>', endpoint='item',
+                         decorators=[tag('a')], cache=CachePolicy(max_age=0))
+        with app.test_client() as c:
+            assert loads(c.get('/items/1').data)['version'] == 1
+            assert c.post('/items/1').status_code == 405
+            api.replace_resource('item', New)
+            rv = c.get('/items/1')
+            assert loads(rv.data)['version'] == 2
+            assert rv.headers['X-Tag'] == 'a'
+            assert rv.headers['Cache-Control'] == 'public, max-age=0'
+            assert c.post('/items/1').status_code == 201
+            assert 'POST' in c.open('/items/1', method='OPTIONS').headers['Allow']
+            api.replace_resource('item', Old)
+            assert c.post('/items/1').status_code == 405
+            assert api.registry['item'][0] is Old
+
+    def test_decorators(self):
+        """Decorators can be replaced for a blueprint resource."""
+        blueprint = Blueprint('bp', __name__)
+        api = Api(blueprint, decorators=[tag('api')])
+        api.add_resource(Old, '/items/<int:item_id>', endpoint='item',
+                         decorators=[tag('a')])
+        with pytest.raises(ValueError):
+            api.replace_resource('item', New)
+        app = Flask(__name__)
+        app.register_blueprint(blueprint, url_prefix='/bp')
+        with app.test_client() as c:
+            assert c.get('/bp/items/1').headers.getlist('X-Tag') == ['a', 'api']
+            api.replace_resource('item', decorators=[tag('b'), tag('c')])
+            rv = c.get('/bp/items/1')
+            assert rv.headers.getlist('X-Tag') == ['b', 'c', 'api']
+            assert loads(rv.data)['version'] == 1
+        with pytest.raises(ValueError):
+            api.replace_resource('nope', New)
+
+    def test_in_flight(self):
+        """Requests already dispatched finish with the old view."""
+        app = Flask(__name__)
+        api = Api(app)
+        started, release = threading.Event(), threading.Event()
+
+        class Slow(Resource):
+            def get(self, item_id):
+                started.set()
+                release.wait(5)
+                return {'version': 1, 'id': item_id}
+        api.add_resource(Slow, '/items/<int:item_id>', endpoint='item')
+        results = []
+        thread = threading.Thread(target=lambda: results.append(
+            loads(app.test_client().get('/items/1').data)))
+        thread.start()
+        assert started.wait(5)
+        api.replace_resource('item', New)
+        assert loads(app.test_client().get('/items/2').data)['version'] == 2
+        release.set()
+        thread.join()
+        assert results == [{'version': 1, 'id': 1}]
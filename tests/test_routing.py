@@ -0,0 +1,97 @@
+"""Testing the route index."""
+from flask import Flask, Blueprint, request
+from flask.json import loads
+from flask_resteasy import Api, Resource, RouteIndex
+
+
+def make_app(n=20, **kwargs):
+    """App with an Api of `n` parameterized resources and a plain route."""
+    app = Flask(__name__, static_folder=None)
+    api = Api(app, prefix='/api', fast_routing=True, **kwargs)
+    for i in range(n):
+        class Item(Resource):
+            idx = i
+
+            def get(self, item_id):
+                return {'idx': self.idx, 'id': item_id}
+
+            def put(self, item_id):
+                return {'put': item_id}
+        api.add_resource(Item, '/r%d/<int:item_id>' % i,
+                         '/r%d/<int:item_id>/alias' % i, endpoint='r%d' % i)
+
+    @app.route('/plain/<name>')
+    def plain(name):
+        return name
+
+    @app.route('/api/folder/')
+    def folder():
+        return 'folder'
+    return app, api
+
+
+class TestRouteIndex(object):
+    """Matching through the RouteIndex."""
+
+    def test_install_once(self):
+        """The index is shared by every Api on an app."""
+        app, api = make_app(2)
+        index = RouteIndex.install(app)
+        assert index is app.extensions[RouteIndex.extension]
+        Api(app, prefix='/other', fast_routing=True)
+        assert RouteIndex.install(app) is index
+        assert index.prefixes == {'/api', '/other'}
+
+    def test_candidates(self):
+        """Only rules along the path are tried."""
+        app, api = make_app(50)
+        index = RouteIndex.install(app)
+        rules = index.candidates('/api/r7/3')
+        assert [_.endpoint for _ in rules] == ['r7', 'r7']
+        assert len(index.candidates('/plain/x')) == 1
+
+    def test_matching(self):
+        """Responses match the regular werkzeug routing."""
+        app, api = make_app()
+        with app.test_client() as c:
+            rv = c.get('/api/r7/3')
+            assert rv.status_code == 200
+            assert request.endpoint == 'r7'
+            assert loads(rv.data) == {'idx': 7, 'id': 3}
+            assert loads(c.get('/api/r19/4/alias').data) == {'idx': 19, 'id': 4}
+            assert loads(c.put('/api/r0/1').data) == {'put': 1}
+            assert c.get('/plain/bob').data == b'bob'
+            assert c.get('/api/r7/abc').status_code == 404
+            assert c.get('/api/nope').status_code == 404
+            assert c.post('/api/r7/3').status_code == 405
+            assert c.get('/api/folder').status_code in (301, 308)
+
+    def test_new_rules(self):
+        """Rules added after the first match are found."""
+        app, api = make_app(3)
+        with app.test_client() as c:
+            assert c.get('/api/late').status_code == 404
+
+            @api.resource('/late')
+            class Late(Resource):
+                def get(self):
+                    return 'late'
+            assert loads(c.get('/api/late').data) == 'late'
+
+    def test_blueprint(self):
+        """The blueprint prefix is part of the indexed prefix."""
+        bp = Blueprint('bp', __name__)
+        api = Api(bp, prefix='/api', fast_routing=True)
+
+        @api.resource('/foo/<name>')
+        class Foo(Resource):
+            def get(self, name):
+                return name
+
+        app = Flask(__name__, static_folder=None)
+        app.register_blueprint(bp, url_prefix='/bp')
+        assert RouteIndex.install(app).prefixes == {'/bp/api'}
+        with app.test_client() as c:
+            rv = c.get('/bp/api/foo/bar')
+            assert request.endpoint == 'bp.foo'
+            assert loads(rv.data) == 'bar'
@@ -0,0 +1,94 @@
+"""Testing compiled request validation."""
+import pytest
+from flask import Flask, request
+from flask.json import loads, dumps
+from flask_resteasy import Api, Resource, compile_schema
+
+USER = {
+    'type': 'object',
+    'required': ['name'],
+    'additionalProperties': False,
+    'properties': {
+        'name': {'type': 'string', 'minLength': 1, 'maxLength': 10,
+                 'pattern': '^[a-z]+$'},
+        'age': {'type': 'integer', 'minimum': 0, 'maximum': 150},
+        'role': {'enum': ['admin', 'user']},
+        'tags': {'type': 'array', 'maxItems': 2, 'items': {'type': 'string'}},
+        'score': {'type': ['number', 'null']},
+    },
+}
+
+
+class TestCompileSchema(object):
+    """compile_schema validators."""
+
+    @pytest.mark.parametrize('value, error', [
+        ({'name': 'bob'}, None),
+        ({'name': 'bob', 'age': 3, 'role': 'user', 'tags': ['a'], 'score': None}, None),
+        ({'name': 'bob', 'score': 1.5}, None),
+        ([], 'body must be object'),
+        ({}, '/name is required'),
+        ({'name': ''}, '/name must be at least 1 characters'),
+        ({'name': 'B'}, '/name must match ^[a-z]+$'),
+        ({'name': 'b', 'age': True}, '/age must be integer'),
+        ({'name': 'b', 'age': 1.5}, '/age must be integer'),
+        ({'name': 'b', 'age': 200}, '/age must be at most 150'),
+        ({'name': 'b', 'role': 'root'}, '/role must be one of ["admin", "user"]'),
+        ({'name': 'b', 'tags': ['a', 1]}, '/tags/1 must be string'),
+        ({'name': 'b', 'tags': ['a'] * 3}, '/tags must be at most 2 items'),
+        ({'name': 'b', 'score': 'x'}, '/score must be number or null'),
+        ({'name': 'b', 'admin': True}, '/admin is not allowed'),
+    ])
+    def test_validate(self, value, error):
+        """The first error is reported with its path."""
+        assert compile_schema(USER)(value) == error
+
+    def test_unsupported(self):
+        """Unknown keywords are refused at compile time."""
+        with pytest.raises(ValueError):
+            compile_schema({'type': 'object', 'oneOf': []})
+
+    @pytest.mark.parametrize('schema', [
+        {'type': 'object', 'additionalProperties': {'type': 'string'}},
+        {'items': {'type': 'date'}},
+        {'type': ['string', 'uuid']},
+    ])
+    def test_unsupported_values(self, schema):
+        """Schemas of additionalProperties and unknown types are refused."""
+        with pytest.raises(ValueError):
+            compile_schema(schema)
+
+
+class TestValidation(object):
+    """Validation in the dispatch wrapper."""
+
+    def test_request(self):
+        """Invalid bodies get a 400 before the resource is created."""
+        app = Flask(__name__)
+        api = Api(app)
+        created = []
+
+        @api.resource('/users', schemas={'post': USER})
+        class Users(Resource):
+            def __init__(self):
+                created.append(self)
+
+            def post(self):
+                return request.get_json(), 201
+
+            def put(self):
+                return 'not validated'
+
+        with app.test_client() as c:
+            rv = c.post('/users', data=dumps({'name': 'ann'}))
+            assert rv.status_code == 201
+            rv = c.post('/users', data=dumps({'name': 7}))
+            assert rv.status_code == 400
+            assert rv.mimetype == 'application/json'
+            assert loads(rv.data) == {'error': '/name must be string'}
+            rv = c.post('/users', data='{nope')
+            assert loads(rv.data) == {'error': 'body must be JSON'}
+            assert c.put('/users', data='{nope').status_code == 200
+        assert len(created) == 2
+        body = api.openapi()['paths']['/users']['post']['requestBody']
+        assert body['content']['application/json']['schema'] == USER
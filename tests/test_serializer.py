@@ -0,0 +1,95 @@
+"""Testing the compiled serializer."""
+import datetime
+import uuid
+from collections import namedtuple, OrderedDict
+from decimal import Decimal
+import pytest
+from flask import Flask
+from flask.json import loads
+from flask_resteasy import Api, JSONResponse, Resource, Serializer
+
+try:
+    import dataclasses
+except ImportError:
+    dataclasses = None
+
+Point = namedtuple('Point', 'x y')
+Empty = namedtuple('Empty', '')
+
+
+class Slotted(object):
+    __slots__ = ('name', 'when', '_secret')
+
+    def __init__(self, name, when=None):
+        self.name = name
+        self.when = when
+        self._secret = 'hidden'
+
+
+class MoreSlots(Slotted):
+    __slots__ = 'price'
+
+    def __init__(self, name, price):
+        Slotted.__init__(self, name)
+        self.price = price
+
+
+class Opaque(object):
+    """Not a model class, left for the encoder."""
+
+
+class TestSerializer(object):
+    """Converting model objects."""
+
+    def test_models(self):
+        """Model classes become dicts of their public fields."""
+        serialize = Serializer()
+        when = datetime.datetime(2015, 3, 1, 12, 30)
+        assert serialize(Point(1, 2)) == {'x': 1, 'y': 2}
+        assert serialize(Empty()) == {}
+        assert serialize(Slotted('a', when)) == {
+            'name': 'a', 'when': '2015-03-01T12:30:00'}
+        assert serialize(MoreSlots('b', Decimal('1.10'))) == {
+            'name': 'b', 'when': None, 'price': '1.10'}
+        item = Slotted('unset')
+        del item.when
+        assert serialize(item) == {'name': 'unset', 'when': None}
+
+    @pytest.mark.skipif(dataclasses is None, reason='needs dataclasses')
+    def test_dataclass(self):
+        """Dataclasses become dicts of their fields."""
+        Item = dataclasses.make_dataclass('Item', ['id', 'tags'])
+        serialize = Serializer()
+        assert serialize([Item(uuid.UUID(int=1), {'a'})]) == [
+            {'id': '00000000-0000-0000-0000-000000000001', 'tags': ['a']}]
+
+    def test_nested(self):
+        """Containers and their subclasses are walked."""
+        serialize = Serializer()
+        data = OrderedDict(points=(Point(1, Point(2, 3)), Point(4, 5)),
+                           day=datetime.date(2015, 1, 2), n=[1, 'a', None])
+        assert serialize(data) == {
+            'points': [{'x': 1, 'y': {'x': 2, 'y': 3}}, {'x': 4, 'y': 5}],
+            'day': '2015-01-02', 'n': [1, 'a', None]}
+        opaque = Opaque()
+        assert serialize([opaque])[0] is opaque
+
+    def test_converters(self):
+        """Converters can be overridden and registered."""
+        serialize = Serializer({Decimal: float})
+        serialize.register(Opaque, lambda _: 'opaque')
+        assert serialize([Decimal('1.5'), Opaque()]) == [1.5, 'opaque']
+
+    def test_response(self):
+        """JSONResponse passes data through the serializer."""
+        app = Flask(__name__)
+        api = Api(app, response=JSONResponse(serializer=Serializer()))
+
+        @api.resource('/points')
+        class Points(Resource):
+            def get(self):
+                return [Point(i, i * 2) for i in range(3)], 200
+
+        with app.test_client() as c:
+            assert loads(c.get('/points').data) == [
+                {'x': 0, 'y': 0}, {'x': 1, 'y': 2}, {'x': 2, 'y': 4}]
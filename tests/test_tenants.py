@@ -0,0 +1,179 @@
+"""Testing tenant partitioning."""
+import threading
+import time
+from flask import Flask, abort, g, request
+from flask.json import loads
+from flask_resteasy import (Api, CachePolicy, LocalStore, Resource, Tenants,
+                            current_tenant)
+
+
+def make_app(tenants, **kwargs):
+    app = Flask(__name__)
+    api = Api(app, tenants=tenants, **kwargs)
+    calls = []
+
+    @api.resource('/items', cache={'get': CachePolicy(max_age=60)})
+    class Items(Resource):
+        def get(self):
+            calls.append(current_tenant())
+            if request.args.get('fail'):
+                abort(500)
+            time.sleep(float(request.args.get('sleep', 0)))
+            return {'tenant': current_tenant(), 'call': len(calls)}
+
+    @api.resource('/t/<tenant>/items')
+    class TenantItems(Resource):
+        def get(self, tenant):
+            return {'tenant': current_tenant()}
+    return app, api, calls
+
+
+def get(client, tenant=None, **args):
+    headers = {'X-Tenant': tenant} if tenant else {}
+    return client.get('/items', query_string=args, headers=headers)
+
+
+class TestResolve(object):
+    """Where the tenant comes from."""
+
+    def test_header_and_view_arg(self):
+        """The url variable wins over the header."""
+        app, api, calls = make_app(Tenants(view_arg='tenant', header='X-Tenant'))
+        with app.test_client() as c:
+            assert loads(get(c, 'acme').data)['tenant'] == 'acme'
+            rv = c.get('/t/zed/items', headers={'X-Tenant': 'acme'})
+            assert loads(rv.data) == {'tenant': 'zed'}
+            assert loads(get(c).data)['tenant'] is None
+        assert sorted(api.tenants.metrics()) == ['acme', 'zed']
+
+    def test_subdomain(self):
+        """The subdomain below SERVER_NAME, or the last two labels."""
+        tenants = Tenants(subdomain=True)
+        app = Flask(__name__)
+        with app.test_request_context('/', base_url='http://acme.example.com:8080'):
+            assert tenants.resolve({}) == 'acme'
+        with app.test_request_context('/', base_url='http://example.com'):
+            assert tenants.resolve({}) is None
+        app.config['SERVER_NAME'] = 'api.example.com'
+        with app.test_request_context('/', base_url='http://a.b.api.example.com'):
+            assert tenants.resolve({}) == 'a.b'
+
+
+class TestPartition(object):
+    """Caches, limits and metrics per tenant."""
+
+    def test_cache(self):
+        """Tenants never see each other's cached responses."""
+        app, api, calls = make_app(Tenants(header='X-Tenant'),
+                                   response_cache=LocalStore())
+        with app.test_client() as c:
+            assert loads(get(c, 'a').data) == {'tenant': 'a', 'call': 1}
+            assert loads(get(c, 'b').data) == {'tenant': 'b', 'call': 2}
+            assert loads(get(c, 'a').data) == {'tenant': 'a', 'call': 1}
+        assert calls == ['a', 'b']
+
+    def test_cache_size(self):
+        """A tenant filling its own cache does not evict another's."""
+        app, api, calls = make_app(Tenants(header='X-Tenant', cache_size=2))
+        with app.test_client() as c:
+            get(c, 'quiet')
+            for i in range(5):
+                get(c, 'noisy', page=i)
+            assert loads(get(c, 'quiet').data)['call'] == 1
+        assert len(api.tenants.cache('noisy')) == 2
+        assert len(api.tenants.cache('quiet')) == 1
+
+    def test_quota(self):
+        """Requests over the quota get a 429 until the window ends."""
+        tenants = Tenants(header='X-Tenant', quota=(2, 60), quotas={'big': (5, 60)})
+        app, api, calls = make_app(tenants)
+        with app.test_client() as c:
+            assert [get(c, 'a').status_code for _ in range(3)] == [200, 200, 429]
+            rv = get(c, 'a')
+            assert loads(rv.data) == {'error': 'Too many requests for tenant'}
+            assert 0 < int(rv.headers['Retry-After']) <= 60
+            assert [get(c, 'big').status_code for _ in range(5)] == [200] * 5
+            assert get(c).status_code == 200
+        metrics = tenants.metrics()
+        assert metrics['a']['requests'] == 2
+        assert metrics['a']['rejected'] == 2
+        assert calls.count('a') == 2
+        tenants._tenants['a'].window[0] -= 60
+        with app.test_client() as c:
+            assert get(c, 'a').status_code == 200
+
+    def test_concurrency(self):
+        """A busy tenant is limited while others go through."""
+        tenants = Tenants(header='X-Tenant', max_concurrent=1)
+        app, api, calls = make_app(tenants)
+        slow = threading.Thread(target=lambda: get(app.test_client(), 'a', sleep=0.2))
+        slow.start()
+        time.sleep(0.05)
+        with app.test_client() as c:
+            assert get(c, 'a').status_code == 429
+            assert get(c, 'b').status_code == 200
+        slow.join()
+        metrics = tenants.metrics()
+        assert metrics['a']['active'] == 0
+        assert metrics['a']['rejected'] == 1
+        assert metrics['a']['seconds'] >= 0.2
+
+    def test_allow(self):
+        """Unknown tenants are refused and keep no state."""
+        for allow in (['a'], lambda tenant: tenant == 'a'):
+            app, api, calls = make_app(Tenants(header='X-Tenant', allow=allow))
+            with app.test_client() as c:
+                assert get(c, 'a').status_code == 200
+                rv = get(c, 'b')
+                assert rv.status_code == 400
+                assert loads(rv.data) == {'error': 'Unknown tenant'}
+            assert calls == ['a']
+            assert list(api.tenants._tenants) == ['a']
+
+    def test_max_tenants(self):
+        """The state of the least recently seen idle tenants is dropped."""
+        tenants = Tenants(header='X-Tenant', cache_size=2, max_tenants=3)
+        app, api, calls = make_app(tenants)
+        with app.test_client() as c:
+            for name in ['a', 'b', 'c', 'a', 'd', 'e']:
+                get(c, name)
+            for i in range(100):
+                get(c, 'x%d' % i)
+        assert len(tenants._tenants) == 3
+        assert sorted(tenants.metrics()) == ['x97', 'x98', 'x99']
+
+    def test_errors(self):
+        """Server errors are counted per tenant."""
+        app, api, calls = make_app(Tenants(header='X-Tenant'))
+        with app.test_client() as c:
+            assert get(c, 'a', fail=1).status_code == 500
+            get(c, 'a')
+        assert api.tenants.metrics()['a'] == {
+            'requests': 2, 'rejected': 0, 'errors': 1, 'active': 0,
+            'seconds': api.tenants.metrics()['a']['seconds']}
+
+    def test_app_tenant_untouched(self):
+        """An app's own g.tenant is neither used nor replaced."""
+        def set_tenant(func):
+            def wrapper(*args, **kwargs):
+                g.tenant = object()
+                return func(*args, **kwargs)
+            return wrapper
+
+        for tenants in (None, Tenants(header='X-Tenant')):
+            app = Flask(__name__)
+            api = Api(app, tenants=tenants, response_cache=LocalStore(),
+                      decorators=[set_tenant])
+            calls = []
+
+            @api.resource('/own', cache={'get': CachePolicy(max_age=60)})
+            class Own(Resource):
+                def get(self):
+                    calls.append(g.tenant)
+                    return {'tenant': current_tenant()}
+            with app.test_client() as c:
+                c.get('/own', headers={'X-Tenant': 'a'})
+                assert loads(c.get('/own', headers={'X-Tenant': 'a'}).data) == {
+                    'tenant': 'a' if tenants else None}
+            assert len(calls) == 1
+            assert not isinstance(calls[0], str)
@@ -0,0 +1,145 @@
+"""Testing request timing."""
+import logging
+import time
+from functools import wraps
+from flask import Flask, request
+from flask_resteasy import (Api, JSONResponse, Resource, SlowRequestLog,
+                            Timing, current_timing, timing_phase)
+
+
+class Records(logging.Handler):
+    """Keep the records logged."""
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def sleepy(seconds):
+    """Decorator sleeping before the view."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            time.sleep(seconds)
+            return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def slow_app(**kwargs):
+    """App with a slow log and a resource sleeping as asked."""
+    logger = logging.getLogger('test.slow')
+    logger.propagate = False
+    handler = Records()
+    logger.handlers = [handler]
+    app = Flask(__name__)
+    api = Api(app, slow_log=SlowRequestLog(logger=logger, **kwargs))
+
+    @api.resource('/nap/<float:seconds>', decorators=[sleepy(0.02)])
+    class Nap(Resource):
+        def get(self, seconds):
+            time.sleep(seconds)
+            return {'slept': seconds}
+    return app, handler.records
+
+
+class TestSlowRequestLog(object):
+    """Slow request logging."""
+
+    def test_fast_requests(self):
+        """Nothing is logged under the threshold."""
+        app, records = slow_app(threshold=0.5)
+        with app.test_client() as c:
+            assert c.get('/nap/0.0').status_code == 200
+        assert records == []
+
+    def test_slow_request(self):
+        """Slow requests are logged with their phases."""
+        app, records = slow_app(threshold=0.01)
+        with app.test_client() as c:
+            rv = c.get('/nap/0.03')
+            assert rv.status_code == 200
+        assert len(records) == 1
+        record = records[0]
+        assert record.levelno == logging.WARNING
+        assert record.getMessage().startswith('Slow request GET /nap/0.03 ')
+        info = record.resteasy
+        assert info['endpoint'] == 'nap'
+        assert info['status'] == 200
+        assert info['size'] == len(rv.data)
+        assert info['threshold'] == 0.01
+        assert info['view'] >= 0.03
+        assert info['decorators'] >= 0.02
+        assert info['encode'] >= 0
+        assert abs(info['total'] - info['view'] - info['encode'] -
+                   info['decorators']) < 1e-6
+
+    def test_endpoint_threshold(self):
+        """Thresholds per endpoint override the default."""
+        app, records = slow_app(threshold=0.01, thresholds={'nap': 1.0})
+        with app.test_client() as c:
+            c.get('/nap/0.02')
+        assert records == []
+
+
+def timing_app(server_timing):
+    """App with server timing and a resource timing its own phases."""
+    app = Flask(__name__)
+    api = Api(app, response=JSONResponse(server_timing=server_timing))
+
+    @api.resource('/db')
+    class Db(Resource):
+        def get(self):
+            with timing_phase('db'):
+                time.sleep(0.01)
+            with timing_phase('db'):
+                pass
+            return 'ok'
+    return app
+
+
+class TestServerTiming(object):
+    """Server-Timing header."""
+
+    def test_header(self):
+        """Phases are summed by name."""
+        timing = Timing()
+        timing.add('db', 0.001)
+        timing.add('view', 0.0125)
+        timing.add('db', 0.002)
+        assert timing.header() == 'db;dur=3.0, view;dur=12.5'
+
+    def test_disabled(self):
+        """No header and phases are no-ops by default."""
+        app = timing_app(False)
+        with app.test_client() as c:
+            rv = c.get('/db')
+            assert rv.status_code == 200
+            assert 'Server-Timing' not in rv.headers
+        with app.test_request_context('/'):
+            assert current_timing() is None
+            with timing_phase('db') as phase:
+                assert phase.timing is None
+        assert current_timing() is None
+
+    def test_enabled(self):
+        """View, encode and custom phases are reported."""
+        app = timing_app(True)
+        with app.test_client() as c:
+            rv = c.get('/db')
+            header = rv.headers['Server-Timing']
+            phases = dict(_.split(';dur=') for _ in header.split(', '))
+            assert sorted(phases) == ['db', 'encode', 'view']
+            assert float(phases['db']) >= 10
+            assert float(phases['view']) >= float(phases['db'])
+
+    def test_predicate(self):
+        """A callable decides per request."""
+        app = timing_app(lambda: 'X-Timing' in request.headers)
+        with app.test_client() as c:
+            assert 'Server-Timing' not in c.get('/db').headers
+            rv = c.get('/db', headers={'X-Timing': '1'})
+            assert 'db;dur=' in rv.headers['Server-Timing']
@@ -0,0 +1,196 @@
+"""Testing request tracing."""
+import io
+import os
+import time
+import pytest
+from functools import wraps
+from flask import Flask, abort
+from flask.json import loads
+from flask_resteasy import (Api, FileExporter, Resource, Tracer, current_span,
+                            trace_headers)
+
+TRACE = '0af7651916cd43dd8448eb211c80319c'
+PARENT = 'b7ad6b7169203331'
+
+
+class Collect(object):
+    """Exporter keeping the batches."""
+
+    def __init__(self):
+        self.batches = []
+
+    def export(self, spans):
+        self.batches.append(spans)
+
+    @property
+    def spans(self):
+        return [span for batch in self.batches for span in batch]
+
+
+def auth(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def audit(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def make_app(**kwargs):
+    app = Flask(__name__)
+    exporter = Collect()
+    tracer = Tracer(exporter, service='things', interval=60, **kwargs)
+    api = Api(app, decorators=[auth], tracer=tracer)
+    seen = {}
+
+    @api.resource('/things/<int:thing_id>', decorators=[audit])
+    class Thing(Resource):
+        def get(self, thing_id):
+            if thing_id == 0:
+                abort(404)
+            seen['headers'] = trace_headers()
+            seen['span'] = current_span()
+            return {'id': thing_id}
+    return app, tracer, exporter, seen
+
+
+def exported(path, count=5):
+    """Wait up to a second for `count` spans in the file at `path`."""
+    for _ in range(100):
+        if os.path.exists(path):
+            with open(path) as lines:
+                if len(lines.readlines()) == count:
+                    return True
+        time.sleep(0.01)
+    return False
+
+
+class TestTracing(object):
+    """Spans around requests, decorators and phases."""
+
+    def test_spans(self):
+        """A tree of spans joins the incoming trace."""
+        app, tracer, exporter, seen = make_app()
+        with app.test_client() as c:
+            rv = c.get('/things/1', headers={
+                'traceparent': '00-%s-%s-01' % (TRACE, PARENT),
+                'tracestate': 'vendor=1'})
+            assert rv.status_code == 200
+        assert tracer.flush() == 5
+        spans = dict((span['name'], span) for span in exporter.spans)
+        assert sorted(spans) == ['audit', 'auth', 'encode', 'thing', 'view']
+        assert all(span['traceId'] == TRACE for span in spans.values())
+        root = spans['thing']
+        assert root['parentId'] == PARENT
+        assert root['kind'] == 'SERVER'
+        assert root['localEndpoint'] == {'serviceName': 'things'}
+        assert root['tags'] == {'http.method': 'GET', 'http.path': '/things/1',
+                                'http.status_code': '200'}
+        assert spans['auth']['parentId'] == root['id']
+        assert spans['audit']['parentId'] == spans['auth']['id']
+        assert spans['view']['parentId'] == spans['audit']['id']
+        assert spans['encode']['parentId'] == spans['audit']['id']
+        assert spans['view']['timestamp'] >= root['timestamp']
+        assert root['duration'] >= spans['view']['duration']
+        assert abs(root['timestamp'] / 1e6 - time.time()) < 60
+        assert seen['headers'] == {
+            'traceparent': '00-%s-%s-01' % (TRACE, spans['audit']['id']),
+            'tracestate': 'vendor=1'}
+
+    def test_new_and_unsampled(self):
+        """A trace starts without context, none is kept when unsampled."""
+        app, tracer, exporter, seen = make_app()
+        with app.test_client() as c:
+            c.get('/things/1')
+            assert c.get('/things/0').status_code == 404
+            c.get('/things/1', headers={'traceparent': '00-%s-%s-00' % (TRACE, PARENT)})
+        assert seen['headers']['traceparent'].startswith('00-%s-' % TRACE)
+        assert seen['headers']['traceparent'].endswith('-00')
+        tracer.flush()
+        roots = [span for span in exporter.spans if span['name'] == 'thing']
+        assert len(roots) == 2
+        assert roots[0]['traceId'] != roots[1]['traceId'] != TRACE
+        assert roots[1]['tags']['http.status_code'] == '404'
+        assert current_span() is None
+        assert trace_headers() == {}
+
+    def test_ring_buffer(self):
+        """The oldest spans are dropped when the buffer is full."""
+        app, tracer, exporter, seen = make_app(capacity=3)
+        with app.test_client() as c:
+            c.get('/things/1')
+        assert len(tracer.spans) == 3
+        assert tracer.dropped == 2
+        tracer.flush()
+        assert [span['name'] for span in exporter.spans] == ['audit', 'auth', 'thing']
+
+    def test_background_flush(self):
+        """Spans are exported by the background thread."""
+        app, tracer, exporter, seen = make_app()
+        tracer.interval = 0.01
+        with app.test_client() as c:
+            c.get('/things/1')
+        for _ in range(100):
+            if len(exporter.spans) == 5:
+                break
+            time.sleep(0.01)
+        assert len(exporter.spans) == 5
+        tracer.close()
+        assert not tracer._thread.is_alive()
+
+    @pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+    def test_fork(self, tmpdir):
+        """A forked worker starts its own export thread."""
+        path = str(tmpdir.join('spans.jsonl'))
+        app, tracer, exporter, seen = make_app()
+        tracer.exporter = FileExporter(path)
+        tracer.interval = 0.01
+        with app.test_client() as c:
+            c.get('/things/1')
+        assert exported(path)
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                open(path, 'w').close()
+                with app.test_client() as c:
+                    c.get('/things/2')
+                code = 0 if exported(path) else 1
+            finally:
+                os._exit(code)
+        assert os.waitpid(pid, 0)[1] == 0
+        tracer.close()
+
+    def test_untraced(self):
+        """Without a tracer nothing is wrapped."""
+        app = Flask(__name__)
+        api = Api(app, decorators=[auth])
+
+        @api.resource('/plain')
+        class Plain(Resource):
+            def get(self):
+                return trace_headers()
+        with app.test_client() as c:
+            assert loads(c.get('/plain').data) == {}
+        assert app.view_functions['plain'].__wrapped__.__class__.__name__ == '_Dispatch'
+
+
+class TestFileExporter(object):
+    """JSON lines exporter."""
+
+    def test_stream_and_path(self, tmpdir):
+        """One span per line, files are appended to."""
+        spans = [{'traceId': TRACE, 'name': 'a'}, {'traceId': TRACE, 'name': 'b'}]
+        stream = io.StringIO()
+        FileExporter(stream=stream).export(spans)
+        assert [loads(_) for _ in stream.getvalue().splitlines()] == spans
+        path = str(tmpdir.join('spans.jsonl'))
+        FileExporter(path).export(spans[:1])
+        FileExporter(path).export(spans[1:])
+        with open(path) as lines:
+            assert [loads(_) for _ in lines] == spans
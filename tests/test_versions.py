@@ -0,0 +1,95 @@
+"""Testing versions sharing one registry."""
+import pytest
+from flask import Blueprint, Flask, g, url_for
+from flask.json import loads
+from flask_resteasy import Api, Resource
+
+
+class Item(Resource):
+    def get(self, item_id):
+        return {'id': item_id, 'version': g.api_version,
+                'self': url_for('item', item_id=item_id)}
+
+
+class ItemV3(Resource):
+    def get(self, item_id):
+        return {'id': str(item_id), 'v3': True}
+
+    def delete(self, item_id):
+        return '', 204
+
+
+class Search(Resource):
+    def get(self):
+        return {'search': g.api_version}
+
+
+def make_app():
+    app = Flask(__name__)
+    api = Api(app, prefix='/api', versions=('v1', 'v2', 'v3'))
+    api.add_resource(Item, '/items/<int:item_id>', endpoint='item')
+    api.add_resource(ItemV3, endpoint='item', version='v3')
+    api.add_resource(Search, '/search', version='v3')
+    return app, api
+
+
+class TestVersions(object):
+    """Api(versions=...)."""
+
+    def test_shared_rules(self):
+        """One rule and dispatching view per endpoint serve every version."""
+        app, api = make_app()
+        assert len(list(app.url_map.iter_rules('item'))) == 1
+        assert api.registry[('item', 'v3')][0] is ItemV3
+        with app.test_client() as c:
+            for version in ('v1', 'v2'):
+                data = loads(c.get('/api/%s/items/5' % version).data)
+                assert data == {'id': 5, 'version': version,
+                                'self': '/api/%s/items/5' % version}
+            assert loads(c.get('/api/v3/items/5').data) == {'id': '5', 'v3': True}
+            assert c.get('/api/v4/items/5').status_code == 404
+            assert c.delete('/api/v3/items/5').status_code == 204
+            rv = c.delete('/api/v1/items/5')
+            assert rv.status_code == 405
+            assert 'DELETE' not in rv.headers['Allow']
+
+    def test_version_only(self):
+        """Resources added for one version only match it."""
+        app, api = make_app()
+        with app.test_client() as c:
+            assert loads(c.get('/api/v3/search').data) == {'search': 'v3'}
+            assert c.get('/api/v2/search').status_code == 404
+        with app.test_request_context('/'):
+            assert url_for('search') == '/api/v3/search'
+            assert url_for('item', item_id=1) == '/api/v3/items/1'
+            assert api.url_for(Item, item_id=1, api_version='v1') == '/api/v1/items/1'
+
+    def test_errors(self):
+        """Unknown versions and versions without versioned Api."""
+        app, api = make_app()
+        with pytest.raises(ValueError):
+            api.add_resource(ItemV3, endpoint='item', version='v9')
+        with pytest.raises(ValueError):
+            Api(Flask(__name__)).add_resource(Item, '/i', version='v1')
+
+    def test_replace(self):
+        """Hot reload of a version override."""
+        app, api = make_app()
+        api.replace_resource('item', Search, version='v2')
+        api.replace_resource('item', Item, version='v3')
+        with app.test_client() as c:
+            assert loads(c.get('/api/v3/items/5').data)['version'] == 'v3'
+            assert loads(c.get('/api/v1/items/5').data)['version'] == 'v1'
+
+    def test_blueprint(self):
+        """Versions under a blueprint."""
+        blueprint = Blueprint('bp', __name__)
+        api = Api(blueprint, versions=('v1', 'v2'))
+        api.add_resource(Search, '/search')
+        app = Flask(__name__)
+        app.register_blueprint(blueprint, url_prefix='/bp')
+        with app.test_client() as c:
+            assert loads(c.get('/bp/v1/search').data) == {'search': 'v1'}
+            assert loads(c.get('/bp/v2/search').data) == {'search': 'v2'}
+        with app.test_request_context('/'):
+            assert url_for('bp.search') == '/bp/v2/search'
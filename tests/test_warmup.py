@@ -0,0 +1,78 @@
+"""Testing the warm-up manifest."""
+import logging
+from flask import Blueprint, Flask, abort, g, request
+from flask_resteasy import Api, CachePolicy, LocalStore, Resource
+from .test_timing import Records
+
+
+def resources(api, calls):
+    """Register a cached item and a failing resource on `api`."""
+    @api.resource('/items/<int:item_id>', cache={'get': CachePolicy(max_age=60)})
+    class Item(Resource):
+        def get(self, item_id):
+            calls.append((item_id, request.args.get('full'),
+                          request.headers.get('X-Warm'), g.get('seen')))
+            return {'id': item_id}
+
+    @api.resource('/broken')
+    class Broken(Resource):
+        def get(self):
+            calls.append('broken')
+            abort(503)
+
+
+class TestWarmup(object):
+    """Pre-executing endpoints."""
+
+    def test_manual(self):
+        """Entries go through the request hooks and fill the cache."""
+        app = Flask(__name__)
+        app.before_request(lambda: setattr(g, 'seen', True))
+        api = Api(app, response_cache=LocalStore())
+        calls = []
+        resources(api, calls)
+        logger = logging.getLogger('flask_resteasy.warmup')
+        handler = Records()
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        try:
+            results = api.warmup(['item', ('item', {'item_id': 2, 'full': 1},
+                                           {'X-Warm': 'yes'}), 'broken'])
+        finally:
+            logger.removeHandler(handler)
+        assert [(_['url'], _['status']) for _ in results] == [
+            (None, None), ('/items/2?full=1', 200), ('/broken', 503)]
+        assert all(_['seconds'] >= 0 for _ in results)
+        assert calls == [(2, '1', 'yes', True), 'broken']
+        messages = [_.getMessage() for _ in handler.records]
+        assert messages[0].startswith('Warm-up of item failed')
+        assert messages[2].startswith('Warm-up GET /items/2?full=1 200 in ')
+        assert messages[-1].startswith('Warmed 3 urls in ')
+        with app.test_client() as c:
+            assert c.get('/items/2?full=1').status_code == 200
+        assert len(calls) == 2
+
+    def test_automatic(self):
+        """The Api's manifest runs once its endpoints are registered."""
+        app = Flask(__name__)
+        calls = []
+        api = Api(app, warmup=[('item', {'item_id': 1})])
+        resources(api, calls)
+        assert calls == [(1, None, None, None)]
+
+        blueprint = Blueprint('bp', __name__)
+        api = Api(blueprint, warmup=[('item', {'item_id': 3})])
+        resources(api, calls)
+        assert len(calls) == 1
+        app.register_blueprint(blueprint, url_prefix='/bp')
+        assert calls[-1] == (3, None, None, None)
+
+    def test_unbound(self):
+        """Warming needs an app."""
+        api = Api(Blueprint('bp', __name__))
+        try:
+            api.warmup(['item'])
+        except ValueError:
+            pass
+        else:
+            assert False